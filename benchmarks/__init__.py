@@ -0,0 +1 @@
+# Benchmarks hors ligne du scraper et du serveur (python -m benchmarks)
@@ -0,0 +1,112 @@
+# python -m benchmarks : lance les benchmarks et compare à une référence
+#
+#   python -m benchmarks --output benchmarks/results/main.json
+#   python -m benchmarks --baseline benchmarks/results/main.json
+#
+# Le code de sortie vaut 1 si une mesure régresse de plus de --threshold
+# par rapport à la référence.
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+from . import suite
+
+BENCHMARKS = ('crawl', 'parse', 'pipelines', 'server')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=suite.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata():
+    import scrapy
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'scrapy': scrapy.__version__,
+        'platform': platform.platform(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Affiche l'écart à la référence et retourne les mesures en régression"""
+    regressions = []
+    print(f"\n{'mesure':<42} {'référence':>12} {'actuel':>12} {'écart':>8}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous['value']:
+            print(f"{name:<42} {'-':>12} {current['value']:>12} {'':>8}")
+            continue
+        change = (current['value'] - previous['value']) / previous['value']
+        worse = change < -threshold if current['better'] == 'higher' else change > threshold
+        if worse:
+            regressions.append(name)
+        flag = '  RÉGRESSION' if worse else ''
+        print(f"{name:<42} {previous['value']:>12} {current['value']:>12} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Benchmarks hors ligne du scraper et du serveur")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS, help="Benchmarks à lancer")
+    parser.add_argument('--quick', action='store_true', help="Tailles réduites, pour vérifier rapidement")
+    parser.add_argument('--fixture', default='benchwiki', help="Fixture rejouée par les crawls (benchmarks/fixtures/<nom>)")
+    parser.add_argument('--characters', type=int, help="Personnages par crawl (défaut : 500, 100 avec --quick)")
+    parser.add_argument('--sizes', help="Tailles des wikis synthétiques du serveur (ex: 1000,10000)")
+    parser.add_argument('--output', help="Fichier JSON où écrire les résultats")
+    parser.add_argument('--baseline', help="Résultats de référence (JSON) à comparer")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Écart toléré avant de signaler une régression (défaut : 0.1)")
+    args = parser.parse_args(argv)
+
+    characters = args.characters or (100 if args.quick else 500)
+    if args.sizes:
+        sizes = tuple(int(size) for size in args.sizes.split(','))
+    else:
+        sizes = (1000, 10000) if args.quick else (1000, 10000, 100000)
+    repeat = 10 if args.quick else 30
+
+    runs = {
+        'crawl': lambda: suite.bench_crawl(characters, fixture=args.fixture),
+        'parse': lambda: suite.bench_parse(characters, fixture=args.fixture),
+        'pipelines': lambda: suite.bench_pipelines(characters, fixture=args.fixture),
+        'server': lambda: suite.bench_server(sizes, repeat),
+    }
+    results = {}
+    for name in BENCHMARKS:
+        if name in args.only:
+            print(f"Benchmark {name}...", file=sys.stderr)
+            results.update(runs[name]())
+
+    report = {'meta': dict(metadata(), fixture=args.fixture), 'results': results}
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+
+    if not args.baseline:
+        for name, current in results.items():
+            print(f"{name:<42} {current['value']:>12} {current['unit']}")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} régression(s) au-delà de {args.threshold:.0%} : {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
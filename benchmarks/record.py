@@ -0,0 +1,148 @@
+# Enregistre les pages d'un vrai wiki Fandom sous forme de fixture
+#
+#   python -m benchmarks.record https://naruto.fandom.com/ --name naruto --pages 3
+#
+# La page d'accueil, une page de la catégorie et quelques pages de
+# personnages sont téléchargées puis transformées en modèles : le nom, le
+# titre de page et l'image de chaque personnage sont remplacés par
+# @@NAME@@, @@SLUG@@ et @@IMAGE@@, la liste des membres de la catégorie
+# par <!--MEMBERS--> et le lien vers la page suivante par <!--NEXT-->.
+# standin.py rejoue ensuite ces modèles pour autant de personnages que
+# voulu.
+
+import argparse
+import json
+import os
+import re
+import sys
+from urllib.parse import unquote, urlencode, urljoin, urlsplit
+from urllib.request import Request, urlopen
+
+import lxml.html
+
+from .standin import FIXTURES_DIR
+
+USER_AGENT = 'Mozilla/5.0 (compatible; FandomScraper benchmarks)'
+MEMBER_XPATH = '//li[contains(@class, "category-page__member")]'
+NEXT_XPATH = '//a[contains(@class, "category-page__pagination-next")]'
+
+
+def fetch(url, timeout=30):
+    with urlopen(Request(url, headers={'User-Agent': USER_AGENT}), timeout=timeout) as response:
+        return response.read().decode('utf-8')
+
+
+def image_base(url):
+    """URL d'image sans redimensionnement ni paramètres, comme FandomSpider.clean_image_url"""
+    if url.startswith('//'):
+        url = 'https:' + url
+    url = re.sub(r'/revision/latest.*$', '', url)
+    return url.split('?')[0]
+
+
+def tokenize(html, name, slug, image, site):
+    """Remplace ce qui est propre à un personnage par les jetons des modèles"""
+    if image:
+        html = html.replace(image, '@@IMAGE@@')
+    # Liens absolus vers le wiki enregistré rendus relatifs (le stand-in sert tous les hôtes)
+    html = html.replace(site, '')
+    html = html.replace(f'/wiki/{slug}"', '/wiki/@@SLUG@@"')
+    return html.replace(name, '@@NAME@@')
+
+
+def member_image(member):
+    for attribute in ('data-src', 'src'):
+        for value in member.xpath(f'.//img/@{attribute}'):
+            if not value.startswith('data:'):
+                return image_base(value)
+    return None
+
+
+def record(fandom_url, name, pages=3, category='Characters', fixtures_dir=FIXTURES_DIR):
+    """Télécharge les pages de `fandom_url` et écrit la fixture fixtures/<name>/"""
+    parts = urlsplit(fandom_url)
+    site = f'{parts.scheme}://{parts.netloc}'
+    directory = os.path.join(fixtures_dir, name)
+    os.makedirs(directory, exist_ok=True)
+
+    def write(filename, content):
+        with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+            f.write(content)
+        return filename
+
+    main = fetch(fandom_url)
+    category_url = urljoin(site, f'/wiki/Category:{category}')
+    category_page = lxml.html.fromstring(fetch(category_url))
+    members = category_page.xpath(MEMBER_XPATH)
+    if not members:
+        raise RuntimeError(f"Aucun membre trouvé dans {category_url}")
+
+    # Modèle d'un membre de la catégorie, puis page de catégorie sans ses membres
+    first = members[0]
+    link = first.xpath('.//a[contains(@class, "category-page__member-link")]')[0]
+    member = tokenize(lxml.html.tostring(first, encoding='unicode'), link.text_content().strip(),
+                      link.get('href').rsplit('/', 1)[-1], member_image(first), site)
+    parent = first.getparent()
+    for element in members:
+        element.getparent().remove(element)
+    parent.append(lxml.html.HtmlComment('MEMBERS'))
+    next_link = category_page.xpath(NEXT_XPATH)
+    next_html = '<a href="@@NEXT@@" class="category-page__pagination-next">Next page</a>'
+    if next_link:
+        next_link[0].set('href', '@@NEXT@@')
+        next_html = lxml.html.tostring(next_link[0], encoding='unicode', with_tail=False)
+        next_link[0].addprevious(lxml.html.HtmlComment('NEXT'))
+        next_link[0].getparent().remove(next_link[0])
+
+    characters = []
+    first_title = None
+    for index, element in enumerate(members[:pages]):
+        link = element.xpath('.//a[contains(@class, "category-page__member-link")]')[0]
+        title = link.text_content().strip()
+        slug = link.get('href').rsplit('/', 1)[-1]
+        first_title = first_title or title
+        print(f"Personnage {index + 1}/{min(pages, len(members))} : {title}", file=sys.stderr)
+        html = fetch(urljoin(site, link.get('href')))
+        page = lxml.html.fromstring(html)
+        images = page.xpath('//img[contains(@class, "pi-image-thumbnail")]/@src')
+        image = image_base(images[0]) if images else member_image(element)
+        characters.append(write(f'character_{index}.html', tokenize(html, title, unquote(slug), image, site)))
+
+    api_url = f'{site}/api.php?' + urlencode({
+        'action': 'query', 'format': 'json', 'formatversion': 2, 'prop': 'revisions',
+        'rvprop': 'content', 'rvslots': 'main', 'titles': first_title,
+    })
+    api_pages = json.loads(fetch(api_url)).get('query', {}).get('pages', [])
+    wikitext = api_pages[0]['revisions'][0]['slots']['main']['content'] if api_pages else ''
+
+    manifest = {
+        'wiki': parts.netloc.split('.')[0],
+        'source': fandom_url,
+        'main': write('main.html', main.replace(site, '')),
+        'category': write('category.html', lxml.html.tostring(category_page, encoding='unicode', doctype='<!DOCTYPE html>').replace(site, '')),
+        'member': write('member.html', member),
+        'next': write('next.html', next_html),
+        'characters': characters,
+        'api_content': write('api_content.wikitext', wikitext.replace(first_title, '@@NAME@@')),
+        'category_page_size': max(len(members), 1),
+    }
+    with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+    return directory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.record', description="Enregistre une fixture depuis un wiki Fandom")
+    parser.add_argument('fandom_url')
+    parser.add_argument('--name', help="Nom de la fixture (défaut : le nom du wiki)")
+    parser.add_argument('--pages', type=int, default=3, help="Nombre de pages de personnages à enregistrer")
+    parser.add_argument('--category', default='Characters')
+    parser.add_argument('--fixtures-dir', default=FIXTURES_DIR)
+    args = parser.parse_args(argv)
+    name = args.name or urlsplit(args.fandom_url).netloc.split('.')[0]
+    print(record(args.fandom_url, name, args.pages, args.category, args.fixtures_dir))
+
+
+if __name__ == '__main__':
+    main()
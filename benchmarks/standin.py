@@ -0,0 +1,235 @@
+# Serveur local qui rejoue les fixtures d'un wiki Fandom
+#
+# Il répond aussi comme un proxy HTTP : les crawls de benchmark gardent
+# leurs vraies URLs (http://<wiki>.fandom.com/...) et passent par
+# http_proxy, sans toucher au DNS. Les pages de catégorie, les pages de
+# personnages et les réponses de api.php sont produites à partir des
+# modèles de la fixture pour autant de personnages que demandé.
+
+import json
+import os
+import struct
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+CATEGORY_PATH = '/wiki/Category:Characters'
+
+
+def png(width, height):
+    """Image PNG unie, servie pour toutes les images des personnages"""
+    raw = b''.join(b'\x00' + b'\x80\x40\x20' * width for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b''))
+
+
+class Fixture:
+    """Modèles d'une fixture (voir fixtures/<wiki>/manifest.json)"""
+
+    def __init__(self, name='benchwiki', fixtures_dir=FIXTURES_DIR):
+        self.directory = os.path.join(fixtures_dir, name)
+        with open(os.path.join(self.directory, 'manifest.json'), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.wiki = self.manifest['wiki']
+        self.main = self._read(self.manifest['main'])
+        self.category = self._read(self.manifest['category'])
+        self.member = self._read(self.manifest['member'])
+        self.next = self._read(self.manifest['next'])
+        self.characters = [self._read(name) for name in self.manifest['characters']]
+        self.api_content = self._read(self.manifest['api_content'])
+        self.category_page_size = self.manifest.get('category_page_size', 200)
+
+    def _read(self, name):
+        with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    @staticmethod
+    def name(index):
+        return f'Character {index}'
+
+    @staticmethod
+    def slug(index):
+        return f'Character_{index}'
+
+    @staticmethod
+    def render(template, index, image_url):
+        return (template.replace('@@NAME@@', Fixture.name(index))
+                .replace('@@SLUG@@', Fixture.slug(index))
+                .replace('@@INDEX@@', str(index))
+                .replace('@@IMAGE@@', image_url))
+
+    def character_page(self, index, image_url):
+        return self.render(self.characters[index % len(self.characters)], index, image_url)
+
+    def category_page(self, start, count, image_url, path=CATEGORY_PATH):
+        stop = min(count, start + self.category_page_size)
+        members = ''.join(self.render(self.member, i, image_url(i)) for i in range(start, stop))
+        page = self.category.replace('<!--MEMBERS-->', members)
+        if stop < count:
+            page = page.replace('<!--NEXT-->', self.next.replace('@@NEXT@@', f'{path}?from={stop}'))
+        return page
+
+
+class StandIn:
+    """Serveur de fixtures dans un thread, utilisable comme serveur ou comme proxy HTTP"""
+
+    def __init__(self, fixture=None, characters=500, host='127.0.0.1', port=0, broken_images=0,
+                 category_path=CATEGORY_PATH, etags=False):
+        self.fixture = fixture or Fixture()
+        self.characters = characters
+        # Une image sur `broken_images` répond 404 (0 : toutes les images sont servies)
+        self.broken_images = broken_images
+        # Chemin de la catégorie des personnages, liée depuis la page d'accueil ; un autre
+        # chemin que CATEGORY_PATH fait répondre 404 à la catégorie standard
+        self.category_path = category_path
+        # ETag sur les réponses 200, et 304 quand If-None-Match correspond (recrawl incrémental)
+        self.etags = etags
+        self.image = png(64, 80)
+        self.counts = {}
+        # Nombre de requêtes reçues par chemin (avec la query string)
+        self.paths = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def wiki_url(self):
+        return f'http://{self.fixture.wiki}.fandom.com/'
+
+    def image_url(self, index):
+        return f'{self.url}/images/{index}.png'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='standin', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, kind, path=None):
+        with self.lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+            if path is not None:
+                self.paths[path] = self.paths.get(path, 0) + 1
+
+    def respond(self, path, query, host):
+        """(statut, type, corps) pour un chemin de la fixture"""
+        fixture = self.fixture
+        if path == '/robots.txt':
+            return 404, 'text/plain', b''
+        if path in ('/', '/wiki/', '/wiki/Bench_Wiki', '/wiki/Main_Page'):
+            main = fixture.main.replace(f'href="{CATEGORY_PATH}"', f'href="{quote(self.category_path)}"')
+            return 200, 'text/html; charset=utf-8', main.encode('utf-8')
+        if path == self.category_path:
+            start = int(query.get('from', 0))
+            page = fixture.category_page(start, self.characters, self.image_url, self.category_path)
+            return 200, 'text/html; charset=utf-8', page.encode('utf-8')
+        if path.startswith('/wiki/Character_'):
+            index = int(path.rsplit('_', 1)[1])
+            if index >= self.characters:
+                return 404, 'text/html; charset=utf-8', b'<html><body>Not found</body></html>'
+            page = fixture.character_page(index, self.image_url(index))
+            return 200, 'text/html; charset=utf-8', page.encode('utf-8')
+        if path.startswith('/images/'):
+            index = int(path.split('/')[2].split('.')[0])
+            if self.broken_images and index % self.broken_images == 0:
+                return 404, 'text/html; charset=utf-8', b'<html><body>Not found</body></html>'
+            return 200, 'image/png', self.image
+        if path.endswith('/api.php'):
+            return 200, 'application/json; charset=utf-8', json.dumps(self.api(query, host)).encode('utf-8')
+        return 404, 'text/html; charset=utf-8', b'<html><body>Not found</body></html>'
+
+    def api(self, query, host):
+        """Réponses de api.php (formatversion=2) pour categorymembers et les lots de pages"""
+        if query.get('list') == 'categorymembers':
+            start = int(query.get('cmcontinue', 0))
+            stop = min(self.characters, start + int(query.get('cmlimit', 500)))
+            data = {'query': {'categorymembers': [
+                {'pageid': i + 1, 'ns': 0, 'title': Fixture.name(i)} for i in range(start, stop)
+            ]}}
+            if stop < self.characters:
+                data['continue'] = {'cmcontinue': str(stop), 'continue': '-||'}
+            return data
+
+        pages = []
+        for title in query.get('titles', '').split('|'):
+            index = int(title.rsplit(' ', 1)[1])
+            page = {
+                'pageid': index + 1,
+                'ns': 0,
+                'title': title,
+                'lastrevid': 100000 + index,
+                'fullurl': f'http://{host}/wiki/{quote(Fixture.slug(index))}',
+                'original': {'source': f'{self.image_url(index)}/revision/latest?cb=20230101', 'width': 64, 'height': 80},
+            }
+            if 'revisions' in query.get('prop', ''):
+                page['revisions'] = [{'slots': {'main': {
+                    'contentmodel': 'wikitext',
+                    'content': Fixture.render(self.fixture.api_content, index, self.image_url(index)),
+                }}}]
+            pages.append(page)
+        return {'batchcomplete': True, 'query': {'pages': pages}}
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # En-têtes et corps sont écrits séparément : sans TCP_NODELAY, chaque
+            # réponse en keep-alive attendrait l'ACK retardé du client (~40 ms)
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                # En proxy, la ligne de requête contient l'URL complète
+                parts = urlsplit(self.path)
+                host = parts.netloc or self.headers.get('Host', '')
+                query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+                path = unquote(parts.path)
+                try:
+                    status, content_type, body = standin.respond(path, query, host)
+                except (KeyError, ValueError, IndexError):
+                    status, content_type, body = 400, 'text/plain', b'bad request'
+                etag = f'"{zlib.crc32(body):08x}"' if standin.etags and status == 200 else None
+                if etag and self.headers.get('If-None-Match') == etag:
+                    status, body = 304, b''
+                standin.count(f'{status} {path.split("/")[1] if "/" in path else path}',
+                              f'{path}?{parts.query}' if parts.query else path)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                if etag:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sert une fixture de wiki Fandom en local")
+    parser.add_argument('--fixture', default='benchwiki')
+    parser.add_argument('--characters', type=int, default=500)
+    parser.add_argument('--port', type=int, default=8900)
+    args = parser.parse_args()
+    standin = StandIn(Fixture(args.fixture), args.characters, port=args.port)
+    print(f"{standin.url} (proxy pour {standin.wiki_url})")
+    standin.server.serve_forever()
@@ -0,0 +1,313 @@
+# Benchmarks du scraper et du serveur, sans réseau
+#
+# Chaque benchmark retourne un dictionnaire {nom: résultat}, où un résultat
+# est {"value": ..., "unit": ..., "better": "higher" | "lower"}. Les crawls
+# passent par le serveur de fixtures (standin.py) ; les mesures du serveur
+# portent sur des wikis synthétiques écrits dans un dossier temporaire.
+
+import asyncio
+import contextlib
+import gc
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+from .standin import CATEGORY_PATH, Fixture, StandIn
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRAPER_DIR = os.path.join(BASE_DIR, 'scraper')
+
+# Réglages communs aux crawls : pas de cache, pas de délai de politesse
+CRAWL_SETTINGS = {
+    'HTTPCACHE_ENABLED': False,
+    'DOWNLOAD_DELAY': 0,
+    'ADAPTIVE_THROTTLE_ENABLED': False,
+    'ROBOTSTXT_OBEY': False,
+    'LOG_LEVEL': 'ERROR',
+}
+
+
+def result(value, unit, better):
+    return {'value': round(value, 3), 'unit': unit, 'better': better}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _scraper_path():
+    if SCRAPER_DIR not in sys.path:
+        sys.path.insert(0, SCRAPER_DIR)
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'scraper.settings')
+
+
+def _install_reactor():
+    """Reactor asyncio de Scrapy, installé une seule fois pour les benchmarks en processus"""
+    if 'twisted.internet.reactor' not in sys.modules:
+        from scrapy.utils.reactor import install_reactor
+        install_reactor('twisted.internet.asyncioreactor.AsyncioSelectorReactor')
+
+
+def _crawler(settings=None, **spider_kwargs):
+    """Crawler et spider du projet, sans moteur, pour appeler callbacks et pipelines directement"""
+    _scraper_path()
+    _install_reactor()
+    from scrapy.utils.project import get_project_settings
+    from scrapy.utils.test import get_crawler
+    from scraper.spiders.fandom_spider import FandomSpider
+
+    project_settings = get_project_settings().copy_to_dict()
+    project_settings.update(CRAWL_SETTINGS)
+    project_settings.update(settings or {})
+    crawler = get_crawler(FandomSpider, project_settings)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        spider = FandomSpider.from_crawler(crawler, **spider_kwargs)
+    crawler.spider = spider
+    crawler.stats.open_spider()
+    return crawler, spider
+
+
+def bench_crawl(characters=500, modes=('html', 'api'), fixture='benchwiki'):
+    """Crawl complet (`scrapy crawl`) contre le serveur de fixtures, utilisé comme proxy HTTP"""
+    results = {}
+    standin = StandIn(Fixture(fixture), characters=characters).start()
+    try:
+        for mode in modes:
+            with tempfile.TemporaryDirectory(prefix='bench-crawl-') as data_dir:
+                command = [
+                    sys.executable, '-m', 'scrapy', 'crawl', 'fandom',
+                    '-a', f'fandom_url={standin.wiki_url}',
+                    '-a', f'mode={mode}',
+                    '-a', f'character_limit={characters}',
+                    '-a', f'data_dir={data_dir}',
+                ]
+                for name, value in CRAWL_SETTINGS.items():
+                    command += ['-s', f'{name}={int(value) if isinstance(value, bool) else value}']
+                env = dict(os.environ, http_proxy=standin.url, HTTP_PROXY=standin.url)
+                start = perf_counter()
+                subprocess.run(command, cwd=SCRAPER_DIR, env=env, check=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                wall = perf_counter() - start
+
+                with open(os.path.join(data_dir, f'{standin.fixture.wiki}_stats.json'), 'r', encoding='utf-8') as f:
+                    stats = json.load(f)['stats']
+                with open(os.path.join(data_dir, f'{standin.fixture.wiki}_characters.json'), 'r', encoding='utf-8') as f:
+                    scraped = len(json.load(f))
+                if scraped < characters:
+                    raise RuntimeError(f"Crawl {mode} incomplet : {scraped}/{characters} personnages")
+
+                prefix = f'crawl/{mode}'
+                results[f'{prefix}/wall_seconds'] = result(wall, 's', 'lower')
+                results[f'{prefix}/items_per_second'] = result(stats.get('items_per_second', 0), 'items/s', 'higher')
+                results[f'{prefix}/requests'] = result(stats.get('downloader/request_count', 0), 'requests', 'lower')
+                if stats.get('memusage/max'):
+                    results[f'{prefix}/memory_max_mb'] = result(stats['memusage/max'] / 1024 / 1024, 'MB', 'lower')
+                callback_seconds = sum(v for k, v in stats.items()
+                                       if k.startswith('timing/callback/') and k.endswith('/seconds'))
+                results[f'{prefix}/callback_ms_per_item'] = result(1000 * callback_seconds / scraped, 'ms', 'lower')
+    finally:
+        standin.stop()
+    return results
+
+
+def bench_parse(pages=300, fixture='benchwiki'):
+    """Temps des callbacks du spider sur les pages de la fixture, en µs par page"""
+    from scrapy.http import HtmlResponse, Request, TextResponse
+
+    fixture = Fixture(fixture)
+    standin = StandIn(fixture, characters=pages)
+    standin.server.server_close()
+    wiki_url = standin.wiki_url
+    with tempfile.TemporaryDirectory(prefix='bench-parse-') as data_dir:
+        crawler, spider = _crawler(fandom_url=wiki_url, data_dir=data_dir, character_limit=10 ** 9)
+        meta = {'wiki': fixture.wiki}
+
+        def timed(build, callback, count, rounds=5):
+            # Meilleur de plusieurs passes ; les réponses sont construites hors chronométrage
+            # et le parsing HTML a lieu dans le callback
+            best = None
+            for _ in range(rounds):
+                responses = [build(i) for i in range(count)]
+                gc.collect()
+                gc.disable()
+                try:
+                    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                        start = perf_counter()
+                        for response in responses:
+                            for _ in callback(response):
+                                pass
+                        elapsed = perf_counter() - start
+                finally:
+                    gc.enable()
+                best = elapsed if best is None else min(best, elapsed)
+            return 1e6 * best / count
+
+        def character_page(i):
+            url = f'{wiki_url}wiki/{Fixture.slug(i)}'
+            request = Request(url, meta=meta)
+            return HtmlResponse(url, body=fixture.character_page(i, standin.image_url(i)).encode('utf-8'),
+                                encoding='utf-8', request=request)
+
+        def category_page(i):
+            url = f'{wiki_url}{CATEGORY_PATH.lstrip("/")}'
+            body = fixture.category_page(0, fixture.category_page_size, standin.image_url)
+            return HtmlResponse(url, body=body.encode('utf-8'), encoding='utf-8', request=Request(url, meta=meta))
+
+        def api_batch(i):
+            titles = [Fixture.name(n) for n in range(i * 50, i * 50 + 50)]
+            query = {'titles': '|'.join(titles), 'prop': 'pageimages|info|revisions'}
+            url = f'{wiki_url}api.php'
+            body = json.dumps(standin.api(query, f'{fixture.wiki}.fandom.com')).encode('utf-8')
+            request = Request(url, meta=dict(meta, with_content=True))
+            return TextResponse(url, body=body, encoding='utf-8', request=request)
+
+        results = {
+            'parse/character_page_us': result(
+                timed(character_page, lambda r: spider.parse_character_page(r, {'name': 'x', 'url': r.url}), pages),
+                'µs', 'lower'),
+            'parse/category_page_us': result(
+                timed(category_page, spider.parse_character_list, max(5, pages // 20)), 'µs', 'lower'),
+            'parse/api_batch_us': result(
+                timed(api_batch, spider.parse_api_pages, max(5, pages // 50)), 'µs', 'lower'),
+        }
+        crawler.stats.close_spider()
+    return results
+
+
+def bench_pipelines(items=500, concurrency=100, fixture='benchwiki'):
+    """Débit des pipelines du projet (ITEM_PIPELINES), images validées contre le serveur de fixtures"""
+    _scraper_path()
+    from scrapy.utils.misc import load_object
+    from scraper.items import CharacterItem
+
+    standin = StandIn(Fixture(fixture), characters=items).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix='bench-pipelines-') as data_dir:
+            crawler, spider = _crawler(fandom_url=standin.wiki_url, data_dir=data_dir, character_limit=items)
+            manager = load_object(crawler.settings['ITEM_PROCESSOR']).from_crawler(crawler)
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def process(i):
+                item = CharacterItem(
+                    name=f'  {Fixture.name(i)} ',
+                    url=f'{standin.wiki_url}wiki/{Fixture.slug(i)}',
+                    image_url=standin.image_url(i),
+                    type='Human', role='Knight-commander', origin='Northreach', wiki=standin.fixture.wiki,
+                )
+                async with semaphore:
+                    try:
+                        await manager.process_item_async(item)
+                    except Exception:
+                        return 0
+                return 1
+
+            async def run():
+                await manager.open_spider_async()
+                start = perf_counter()
+                kept = sum(await asyncio.gather(*(process(i) for i in range(items))))
+                await manager.close_spider_async()
+                return kept, perf_counter() - start
+
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                kept, elapsed = asyncio.get_event_loop().run_until_complete(run())
+            crawler.stats.close_spider()
+    finally:
+        standin.stop()
+    return {
+        'pipelines/items_per_second': result(items / elapsed, 'items/s', 'higher'),
+        'pipelines/kept_ratio': result(kept / items, 'ratio', 'higher'),
+    }
+
+
+def synthetic_characters(count):
+    """Personnages dont la forme suit celle des fichiers produits par les crawls"""
+    species = ('Human', 'Elf', 'Dwarf', 'Demon', 'Orc', 'Spirit')
+    roles = ('Knight', 'Merchant', 'Mage', 'Warlord', 'Scout')
+    return [{
+        'name': f'{species[i % 6]} {roles[i % 5]} {i:06d}',
+        'url': f'https://benchwiki.fandom.com/wiki/Character_{i}',
+        'image_url': f'https://static.wikia.nocookie.net/benchwiki/images/{i % 16:x}/{i % 256:02x}/{i}.png',
+        'type': species[i % 6],
+        'role': roles[i % 5],
+        'class_name': ('Paladin', 'Rogue', 'Cleric')[i % 3],
+        'origin': f'Region {i % 40}',
+        'affiliation': f'Order {i % 12}',
+        'attributes': {'Gender': ('Female', 'Male')[i % 2], 'Born': f'{300 + i % 90} SA'},
+    } for i in range(count)]
+
+
+def bench_server(sizes=(1000, 10000, 100000), repeat=30):
+    """Latence des routes de lecture du serveur (client de test Flask), en ms"""
+    data_dir = tempfile.mkdtemp(prefix='bench-server-')
+    # Le serveur lit DATA_DIR à l'import
+    os.environ['DATA_DIR'] = data_dir
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    import server
+    logging.getLogger('server').setLevel(logging.WARNING)
+    from scraper.storage import atomic_write_json
+
+    if server.ensure_data_directory() != data_dir:
+        raise RuntimeError("server a déjà été importé avec un autre DATA_DIR")
+
+    for size in sizes:
+        name = f'synth{size}'
+        items = synthetic_characters(size)
+        json_path = os.path.join(data_dir, f'{name}_characters.json')
+        atomic_write_json(json_path, items)
+        server.wiki_catalog.record(name, items)
+        # Import dans la base des personnages, hors mesure
+        server.character_db.sync(name, json_path)
+
+    try:
+        return _measure_server(server, sizes, repeat)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def _measure_server(server, sizes, repeat):
+    results = {}
+    client = server.app.test_client()
+
+    def measure(url, count=repeat, before=None):
+        # Première requête hors mesure (index de recherche, fichiers ouverts), sauf pour les mesures à froid
+        if before is None:
+            client.get(url)
+        samples = []
+        for _ in range(count):
+            if before:
+                before()
+            start = perf_counter()
+            response = client.get(url)
+            samples.append(1000 * (perf_counter() - start))
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} : {response.status_code}")
+        return samples
+
+    def report(key, samples):
+        results[f'{key}_p50_ms'] = result(statistics.median(samples), 'ms', 'lower')
+        results[f'{key}_p95_ms'] = result(percentile(samples, 0.95), 'ms', 'lower')
+
+    report('server/wikis', measure('/wikis'))
+    for size in sizes:
+        name = f'synth{size}'
+        prefix = f'server/{size}'
+        # Les grands wikis ne sont rechargés à froid que quelques fois
+        cold_count = max(3, min(repeat, 30000 // size))
+        report(f'{prefix}/wiki_cold', measure(f'/wiki/{name}', cold_count,
+                                              lambda: server.wiki_response_cache.invalidate(name)))
+        report(f'{prefix}/wiki_warm', measure(f'/wiki/{name}'))
+        report(f'{prefix}/page_first', measure(f'/wiki/{name}?limit=50'))
+        deep = server.encode_cursor(size - 50, None)
+        report(f'{prefix}/page_deep', measure(f'/wiki/{name}?limit=50&cursor={deep}'))
+        report(f'{prefix}/page_sorted', measure(f'/wiki/{name}?limit=50&sort=-name'))
+        report(f'{prefix}/page_filtered', measure(f'/wiki/{name}?limit=50&type=elf&sort=name'))
+    report('server/search', measure('/search?q=merchnt&limit=20'))
+    return results
@@ -0,0 +1,166 @@
+"""Hôte Scrapy persistant pour lancer les crawls sans démarrer de processus"""
+import os
+import sys
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlerHost:
+    """Garde un CrawlerRunner chargé sur un thread dédié au reactor Twisted"""
+
+    def __init__(self, scraper_dir, settings_module='scraper.settings', log_level='WARNING'):
+        self.scraper_dir = scraper_dir
+        self.settings_module = settings_module
+        self.log_level = log_level
+        self.reactor = None
+        self.runner = None
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.startup_error = None
+
+    def start(self):
+        """Démarre le reactor une seule fois et attend qu'il soit prêt"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='crawler-reactor', daemon=True)
+                self.thread.start()
+        self.ready.wait()
+        if self.startup_error:
+            raise RuntimeError(f"Impossible de démarrer l'hôte Scrapy: {self.startup_error}")
+
+    def _run(self):
+        try:
+            # Importer le projet Scrapy comme le ferait `scrapy crawl`
+            if self.scraper_dir not in sys.path:
+                sys.path.insert(0, self.scraper_dir)
+            os.environ.setdefault('SCRAPY_SETTINGS_MODULE', self.settings_module)
+
+            from scrapy.crawler import CrawlerRunner
+            from scrapy.utils.project import get_project_settings
+            from scrapy.utils.reactor import install_reactor
+
+            settings = get_project_settings()
+            # Le répertoire du cache HTTP reste celui du projet scraper
+            if not os.path.isabs(settings.get('HTTPCACHE_DIR')):
+                settings.set('HTTPCACHE_DIR', os.path.join(
+                    self.scraper_dir, '.scrapy', settings.get('HTTPCACHE_DIR')
+                ))
+            if settings.get('TWISTED_REACTOR'):
+                install_reactor(settings.get('TWISTED_REACTOR'))
+            from twisted.internet import reactor
+
+            logging.getLogger('scrapy').setLevel(self.log_level)
+            self.reactor = reactor
+            self.runner = CrawlerRunner(settings)
+            # Charger les spiders maintenant pour que le premier crawl soit rapide
+            self.runner.spider_loader.list()
+        except Exception as e:
+            logger.exception("Crawler host failed to start")
+            self.startup_error = e
+            self.ready.set()
+            return
+
+        reactor.callWhenRunning(self.ready.set)
+        logger.info("Crawler host started")
+        reactor.run(installSignalHandlers=False)
+
+    def crawl(self, spider_name, on_event=None, **spider_kwargs):
+        """Lance un crawl et bloque le thread appelant jusqu'à sa fin
+
+        `on_event(kind, data)` reçoit, depuis le thread du reactor, chaque
+        personnage qui a passé les pipelines et la progression du crawl.
+        Retourne les statistiques Scrapy du crawl.
+        """
+        from twisted.internet import threads
+
+        self.start()
+        return threads.blockingCallFromThread(
+            self.reactor, self._crawl, spider_name, spider_kwargs, on_event
+        )
+
+    def _crawl(self, spider_name, spider_kwargs, on_event=None):
+        crawler = self.runner.create_crawler(spider_name)
+        handlers = crawl_event_handlers(on_event) if on_event else {}
+        for signal, handler in handlers.items():
+            crawler.signals.connect(handler, signal=signal, weak=False)
+        d = self.runner.crawl(crawler, **spider_kwargs)
+
+        def finished(result):
+            for signal, handler in handlers.items():
+                crawler.signals.disconnect(handler, signal=signal)
+            return result
+
+        d.addBoth(finished)
+        d.addCallback(lambda _: crawler.stats.get_stats())
+        return d
+
+    def stop(self):
+        if self.reactor is not None and self.reactor.running:
+            self.reactor.callFromThread(self.reactor.stop)
+
+
+def crawl_event_handlers(on_event):
+    """Handlers des signaux Scrapy qui traduisent le crawl en événements
+
+    - `start` : wikis crawlés et leur limite
+    - `character` : un personnage sorti des pipelines
+    - `progress` : personnages gardés et écartés d'un wiki, avec sa limite
+    - `error` : erreur d'un callback du spider ou d'un pipeline
+    """
+    from itemadapter import ItemAdapter
+    from scrapy import signals
+
+    scraped = {}
+    dropped = {}
+
+    def progress(spider, wiki_name):
+        target = spider.wikis.get(wiki_name)
+        on_event('progress', {
+            'wiki': wiki_name,
+            'count': scraped.get(wiki_name, 0),
+            'dropped': dropped.get(wiki_name, 0),
+            'limit': target.character_limit if target else None,
+        })
+
+    def spider_opened(spider):
+        on_event('start', {'wikis': {
+            name: {'url': target.fandom_url, 'limit': target.character_limit}
+            for name, target in spider.wikis.items()
+        }})
+
+    def item_scraped(item, response, spider):
+        data = ItemAdapter(item).asdict()
+        wiki_name = data.get('wiki')
+        scraped[wiki_name] = scraped.get(wiki_name, 0) + 1
+        on_event('character', data)
+        progress(spider, wiki_name)
+
+    def item_dropped(item, response, exception, spider):
+        wiki_name = ItemAdapter(item).get('wiki')
+        dropped[wiki_name] = dropped.get(wiki_name, 0) + 1
+        progress(spider, wiki_name)
+
+    def item_error(item, response, spider, failure):
+        on_event('error', {
+            'wiki': ItemAdapter(item).get('wiki'),
+            'url': getattr(response, 'url', None),
+            'message': failure.getErrorMessage(),
+        })
+
+    def spider_error(failure, response, spider):
+        on_event('error', {
+            'wiki': response.meta.get('wiki'),
+            'url': response.url,
+            'message': failure.getErrorMessage(),
+        })
+
+    return {
+        signals.spider_opened: spider_opened,
+        signals.item_scraped: item_scraped,
+        signals.item_dropped: item_dropped,
+        signals.item_error: item_error,
+        signals.spider_error: spider_error,
+    }
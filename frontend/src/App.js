@@ -1,6 +1,34 @@
 import React, { useState, useEffect } from 'react';
 import './App.css';
 
+// Intervalle entre deux vérifications de l'état d'un job (ms)
+const JOB_POLL_INTERVAL = 2000;
+
+// Erreur du flux /jobs/<id>/stream : on se rabat sur l'attente du résultat
+const STREAM_INTERRUPTED = 'Flux interrompu';
+
+// Nombre de personnages demandés par page de /wiki/<name>
+const WIKI_PAGE_SIZE = 100;
+
+// Miniature servie par le serveur ; l'identifiant est le titre de la page du personnage
+function thumbnailUrl(wikiName, character, width) {
+  if (!wikiName || !character.url || !character.image_url) {
+    return character.image_url;
+  }
+  const id = decodeURIComponent(character.url.replace(/\/+$/, '').split('/').pop());
+  return `http://localhost:5000/img/${wikiName}/${encodeURIComponent(id)}?w=${width}`;
+}
+
+// En cas d'échec : l'image d'origine, puis l'image par défaut
+function handleImageError(e, character) {
+  if (character.image_url && e.target.src !== character.image_url) {
+    e.target.src = character.image_url;
+    return;
+  }
+  e.target.onerror = null;
+  e.target.src = '/placeholder.png';
+}
+
 function SearchBar({ onSearch, isLoading }) {
   const [url, setUrl] = useState('');
 
@@ -26,7 +54,7 @@ function SearchBar({ onSearch, isLoading }) {
   );
 }
 
-function CharacterCard({ character, onSelect, isSelected, isCompareMode }) {
+function CharacterCard({ character, wikiName, onSelect, isSelected, isCompareMode }) {
   // Fonction helper pour afficher les détails s'ils existent
   const renderDetails = () => {
     if (!character) return null;
@@ -62,12 +90,10 @@ function CharacterCard({ character, onSelect, isSelected, isCompareMode }) {
     <div className={`character-card ${isSelected ? 'selected' : ''}`}>
       <div className="character-image">
         <img 
-          src={character.image_url || '/placeholder.png'} 
+          src={thumbnailUrl(wikiName, character, 240) || '/placeholder.png'} 
           alt={character.name} 
-          onError={(e) => {
-            e.target.onerror = null;
-            e.target.src = '/placeholder.png';
-          }} 
+          loading="lazy"
+          onError={(e) => handleImageError(e, character)} 
         />
       </div>
       <div className="character-info">
@@ -100,7 +126,7 @@ function CharacterCard({ character, onSelect, isSelected, isCompareMode }) {
   );
 }
 
-function ComparisonView({ characters, onClose }) {
+function ComparisonView({ characters, wikiName, onClose }) {
   if (!characters || characters.length !== 2) return null;
 
   return (
@@ -113,12 +139,9 @@ function ComparisonView({ characters, onClose }) {
             <div key={index} className="comparison-character">
               <div className="comparison-image">
                 <img 
-                  src={character.image_url} 
+                  src={thumbnailUrl(wikiName, character, 480)} 
                   alt={character.name}
-                  onError={(e) => {
-                    e.target.onerror = null;
-                    e.target.src = '/placeholder.png';
-                  }}
+                  onError={(e) => handleImageError(e, character)}
                 />
               </div>
               <h3>{character.name}</h3>
@@ -181,21 +204,34 @@ function App() {
     setError(null);
 
     try {
-      const response = await fetch(`http://localhost:5000/wiki/${wikiName}`);
-      const data = await response.json();
-      console.log('Données reçues du wiki:', data); // Debug
+      // Charger les personnages page par page pour afficher les premières cartes rapidement
+      let cursor = null;
+      let loaded = [];
+      do {
+        const params = new URLSearchParams({ limit: WIKI_PAGE_SIZE });
+        if (cursor) {
+          params.set('cursor', cursor);
+        }
+        const response = await fetch(`http://localhost:5000/wiki/${wikiName}?${params}`);
+        const data = await response.json();
+        console.log('Données reçues du wiki:', data); // Debug
 
-      if (response.ok && data.success) {
-        if (Array.isArray(data.data)) {
-          setCharacters(data.data);
-          console.log('Personnages chargés:', data.data.length);
-        } else {
+        if (!response.ok || !data.success) {
+          setError(data.error || 'Erreur lors de la récupération des données');
+          break;
+        }
+        if (!Array.isArray(data.data)) {
           console.error('Les données ne sont pas un tableau:', data.data);
           setError('Format de données incorrect');
+          break;
         }
-      } else {
-        setError(data.error || 'Erreur lors de la récupération des données');
-      }
+
+        loaded = [...loaded, ...data.data];
+        setCharacters(loaded);
+        setIsLoading(false);
+        cursor = data.next_cursor;
+      } while (cursor);
+      console.log('Personnages chargés:', loaded.length);
     } catch (err) {
       console.error('Erreur complète:', err);
       setError('Erreur de connexion au serveur');
@@ -228,6 +264,43 @@ function App() {
     setIsCompareMode(false);
   };
 
+  // Interroge le serveur jusqu'à la fin du job de scraping
+  const waitForJob = async (jobId) => {
+    while (true) {
+      const response = await fetch(`http://localhost:5000/jobs/${jobId}/result`);
+      const data = await response.json();
+
+      if (response.status !== 202) {
+        if (!response.ok) {
+          throw new Error(data.error || 'Erreur lors du scraping');
+        }
+        return data;
+      }
+
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+    }
+  };
+
+  // Suit le job en direct : chaque personnage est affiché dès qu'il est scrapé
+  const streamJob = (jobId, onCharacter) => new Promise((resolve, reject) => {
+    const source = new EventSource(`http://localhost:5000/jobs/${jobId}/stream`);
+
+    source.addEventListener('character', (event) => {
+      onCharacter(JSON.parse(event.data));
+    });
+    source.addEventListener('status', (event) => {
+      const job = JSON.parse(event.data);
+      if (job.status === 'done' || job.status === 'failed') {
+        source.close();
+        resolve(job);
+      }
+    });
+    source.onerror = () => {
+      source.close();
+      reject(new Error(STREAM_INTERRUPTED));
+    };
+  });
+
   const handleSearch = async (url) => {
     setIsLoading(true);
     setError(null);
@@ -242,13 +315,36 @@ function App() {
         body: JSON.stringify({ url }),
       });
 
-      const data = await response.json();
-      console.log('Données reçues du scraping:', data); // Debug
+      const job = await response.json();
 
       if (!response.ok) {
-        throw new Error(data.error || 'Erreur lors du scraping');
+        throw new Error(job.error || 'Erreur lors du scraping');
       }
 
+      // Un wiki scrapé récemment est servi sans nouveau crawl : le job est déjà terminé
+      if (window.EventSource && job.status !== 'done') {
+        try {
+          const finished = await streamJob(job.job_id, (character) => {
+            setCharacters(prev => [...prev, character]);
+          });
+          if (finished.status === 'failed') {
+            throw new Error(finished.error || 'Erreur lors du scraping');
+          }
+          // Rafraîchir la liste des wikis après un nouveau scraping
+          fetchWikis();
+          return;
+        } catch (err) {
+          if (err.message !== STREAM_INTERRUPTED) {
+            throw err;
+          }
+          // Flux coupé : le résultat complet est récupéré à la fin du job
+          console.warn('Flux interrompu, attente du résultat');
+        }
+      }
+
+      const data = await waitForJob(job.job_id);
+      console.log('Données reçues du scraping:', data); // Debug
+
       if (data.success) {
         if (Array.isArray(data.data)) {
           setCharacters(data.data);
@@ -351,6 +447,7 @@ function App() {
               <CharacterCard 
                 key={`${character.name}-${index}`} 
                 character={character}
+                wikiName={selectedWiki}
                 isCompareMode={isCompareMode}
                 isSelected={selectedCharacters.some(c => c.name === character.name)}
                 onSelect={handleCharacterSelect}
@@ -363,6 +460,7 @@ function App() {
       {showComparison && (
         <ComparisonView 
           characters={selectedCharacters}
+          wikiName={selectedWiki}
           onClose={closeComparison}
         />
       )}
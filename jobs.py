@@ -0,0 +1,230 @@
+"""Gestion asynchrone des jobs de scraping"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import logging
+
+logger = logging.getLogger(__name__)
+
+# États possibles d'un job
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFullError(Exception):
+    """Levée quand la file des jobs en attente est pleine"""
+
+
+class ScrapeJobError(Exception):
+    """Erreur de scraping avec un message et des détails pour le client"""
+
+    def __init__(self, error, details='', status_code=500):
+        super().__init__(error)
+        self.error = error
+        self.details = details
+        self.status_code = status_code
+
+
+class JobEvents:
+    """Journal des événements d'un job, relu par les clients qui suivent le scraping en direct"""
+
+    def __init__(self):
+        self.events = []
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def publish(self, kind, data):
+        with self.condition:
+            if self.closed:
+                return
+            self.events.append((kind, data))
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def read(self, start, timeout=None):
+        """Événements à partir de l'index `start`, en attendant au plus `timeout` s'il n'y en a pas
+
+        Retourne (événements, journal fermé).
+        """
+        with self.condition:
+            if start >= len(self.events) and not self.closed:
+                self.condition.wait(timeout)
+            return self.events[start:], self.closed
+
+
+class WikiLocks:
+    """Un verrou par wiki : deux crawls n'écrivent jamais les fichiers d'un même wiki en même temps"""
+
+    def __init__(self):
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, wiki_names):
+        # Toujours dans le même ordre, pour qu'un scraping groupé ne puisse pas s'interbloquer
+        with self.lock:
+            locks = [self.locks.setdefault(name, threading.Lock()) for name in sorted(set(wiki_names))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+
+class ScrapeJob:
+    """Un job de scraping pour un wiki"""
+
+    def __init__(self, url, wiki_name, options=None, key=None, urls=None, wiki_names=None):
+        self.id = uuid.uuid4().hex
+        # URL et nom du wiki (None pour un scraping groupé)
+        self.url = url
+        self.wiki_name = wiki_name
+        # URLs et noms des wikis d'un scraping groupé (None pour un seul wiki)
+        self.urls = urls
+        self.wiki_names = wiki_names
+        # Arguments supplémentaires passés au spider (ex: mode)
+        self.options = options or {}
+        # Clé des requêtes identiques qui partagent ce job tant qu'il n'est pas terminé
+        self.key = key
+        self.requests = 1
+        self.status = PENDING
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.details = None
+        self.status_code = None
+        self.events = JobEvents()
+
+    def to_dict(self):
+        """Représentation du job sans les données scrapées"""
+        return {
+            'job_id': self.id,
+            'url': self.url,
+            'wiki_name': self.wiki_name,
+            'urls': self.urls,
+            'wiki_names': self.wiki_names,
+            'options': self.options,
+            'status': self.status,
+            'coalesced': self.requests > 1,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+            'details': self.details,
+        }
+
+
+class JobManager:
+    """Exécute les jobs dans un pool de workers borné"""
+
+    def __init__(self, run_job, max_workers=2, max_pending=20, max_finished=100):
+        self.run_job = run_job
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrape')
+        self.jobs = {}
+        # Jobs en attente ou en cours, par clé de requête
+        self.active = {}
+        self.lock = threading.Lock()
+
+    def submit(self, url, wiki_name, options=None, key=None, urls=None, wiki_names=None):
+        """Met un job en file, ou retourne le job en cours pour la même clé
+
+        Un scraping groupé passe url et wiki_name à None et ses listes dans urls et wiki_names.
+        """
+        target = url or ', '.join(urls or ())
+        with self.lock:
+            job = self.active.get(key) if key is not None else None
+            if job is not None:
+                job.requests += 1
+                logger.info(f"Job {job.id} shared with a new request for {target}")
+                return job
+            pending = sum(1 for job in self.jobs.values() if job.status == PENDING)
+            if pending >= self.max_pending:
+                raise QueueFullError(f"{pending} jobs déjà en attente")
+            job = ScrapeJob(url, wiki_name, options, key, urls, wiki_names)
+            self.jobs[job.id] = job
+            if key is not None:
+                self.active[key] = job
+            self._prune()
+        job.events.publish('status', job.to_dict())
+        self.executor.submit(self._execute, job)
+        logger.info(f"Job {job.id} queued for {target}")
+        return job
+
+    def record(self, url, wiki_name, options, result):
+        """Enregistre un job déjà terminé (résultat réutilisé sans crawl)"""
+        job = ScrapeJob(url, wiki_name, options)
+        job.started_at = job.finished_at = job.created_at
+        job.result = result
+        job.status = DONE
+        with self.lock:
+            self.jobs[job.id] = job
+            self._prune()
+        self._publish_result(job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def counts(self):
+        """Nombre de jobs connus par état"""
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def _execute(self, job):
+        job.status = RUNNING
+        job.started_at = time.time()
+        job.events.publish('status', job.to_dict())
+        try:
+            job.result = self.run_job(job)
+            job.status = DONE
+        except ScrapeJobError as e:
+            job.error = e.error
+            job.details = e.details
+            job.status_code = e.status_code
+            job.status = FAILED
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            job.error = 'Erreur inattendue'
+            job.details = str(e)
+            job.status_code = 500
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            with self.lock:
+                if self.active.get(job.key) is job:
+                    del self.active[job.key]
+            logger.info(f"Job {job.id} finished with status {job.status}")
+            self._publish_result(job)
+
+    def _publish_result(self, job):
+        # Le résultat complet reste sur /jobs/<id>/result : l'événement n'en donne que le résumé
+        summary = {key: value for key, value in (job.result or {}).items() if key != 'data'}
+        job.events.publish('status', dict(job.to_dict(), result=summary or None))
+        job.events.close()
+
+    def _prune(self):
+        """Oublie les plus anciens jobs terminés"""
+        finished = [job for job in self.jobs.values() if job.status in (DONE, FAILED)]
+        if len(finished) <= self.max_finished:
+            return
+        finished.sort(key=lambda job: job.finished_at)
+        for job in finished[:len(finished) - self.max_finished]:
+            del self.jobs[job.id]
@@ -0,0 +1,66 @@
+"""Cache mémoire des réponses JSON déjà encodées"""
+import gzip
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+class CachedResponse:
+    """Corps JSON encodé, sa version gzip et ses validateurs HTTP"""
+
+    def __init__(self, body, mtime_ns, size):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6)
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.etag = f'{mtime_ns:x}-{size:x}'
+        self.last_modified = datetime.fromtimestamp(mtime_ns / 1e9, tz=timezone.utc)
+
+    @property
+    def nbytes(self):
+        return len(self.body) + len(self.gzipped)
+
+
+class ResponseCache:
+    """Cache LRU invalidé par la date de modification et la taille du fichier source"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, path, build):
+        """Retourne la réponse en cache pour `key`, reconstruite via `build(path)` si le fichier a changé"""
+        stat = os.stat(path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                self.entries.move_to_end(key)
+                return entry
+
+        # Encodage hors du verrou pour ne pas bloquer les autres wikis
+        entry = CachedResponse(build(path), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            self._put(key, entry)
+        return entry
+
+    def invalidate(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry:
+                self.total_bytes -= entry.nbytes
+
+    def _put(self, key, entry):
+        old = self.entries.pop(key, None)
+        if old:
+            self.total_bytes -= old.nbytes
+        # Une réponse plus grande que le budget n'est pas conservée
+        if entry.nbytes > self.max_bytes:
+            return
+        self.entries[key] = entry
+        self.total_bytes += entry.nbytes
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= evicted.nbytes
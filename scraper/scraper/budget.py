@@ -0,0 +1,91 @@
+# Budget de requêtes d'un wiki
+#
+# Avec une limite de N personnages, demander toutes les pages listées par
+# la catégorie gaspille l'essentiel des téléchargements. Le budget garde en
+# réserve les pages de personnages découvertes et n'en libère que ce qu'il
+# faut pour atteindre la limite, d'après la proportion observée de pages
+# qui donnent un personnage gardé par les pipelines. La page suivante de la
+# catégorie (ou une sous-catégorie) n'est demandée qu'une fois la réserve
+# épuisée, et la réserve n'est abandonnée qu'une fois la limite atteinte par
+# des personnages passés par les pipelines.
+
+import math
+from collections import deque
+
+# Proportion minimale de pages utiles retenue pour l'estimation
+MIN_YIELD_RATE = 0.05
+
+
+class CrawlBudget:
+    """Pages de personnages d'un wiki en réserve, libérées selon le quota restant"""
+
+    def __init__(self, slack=1.2):
+        # Pages demandées en plus de l'estimation, pour absorber les pages sans image
+        self.slack = slack
+        # Pages découvertes pas encore demandées (requêtes ou titres pour l'API)
+        self.backlog = deque()
+        # Pages de catégorie à lire (page suivante, sous-catégories), demandées
+        # par priorité décroissante quand la réserve est vide
+        self.listings = []
+        self.in_flight = 0
+        self.pages = 0
+        self.hits = 0
+
+    @property
+    def yield_rate(self):
+        """Proportion lissée des pages lues qui ont donné un personnage (1 au départ)"""
+        return max(MIN_YIELD_RATE, (self.hits + 1) / (self.pages + 1))
+
+    def wanted(self, remaining):
+        """Pages à avoir en cours pour obtenir `remaining` personnages"""
+        if remaining <= 0:
+            return 0
+        return math.ceil(remaining * self.slack / self.yield_rate)
+
+    def add(self, entries):
+        self.backlog.extend(entries)
+
+    def add_listing(self, request):
+        self.listings.append(request)
+
+    def release(self, remaining):
+        """(pages, pages de catégorie) à demander maintenant pour `remaining` personnages"""
+        count = min(len(self.backlog), max(0, self.wanted(remaining) - self.in_flight))
+        entries = [self.backlog.popleft() for _ in range(count)]
+        self.in_flight += count
+        listings = []
+        if not self.backlog and self.listings and self.in_flight < self.wanted(remaining):
+            best = max(self.listings, key=lambda request: request.priority)
+            self.listings.remove(best)
+            listings.append(best)
+        return entries, listings
+
+    def release_all(self):
+        """Tout ce qui est en réserve, sans tenir compte du quota"""
+        entries, listings = list(self.backlog), list(self.listings)
+        self.backlog.clear()
+        self.listings.clear()
+        self.in_flight += len(entries)
+        return entries, listings
+
+    def done(self, pages, items=0):
+        """Compte des pages lues (ou en échec) et les personnages qu'elles ont donnés"""
+        self.in_flight = max(0, self.in_flight - pages)
+        self.pages += pages
+        self.hits += items
+
+    def requeue(self, entries):
+        """Remet en tête de réserve des pages en cours qui n'ont pas été traitées"""
+        self.backlog.extendleft(reversed(entries))
+        self.in_flight = max(0, self.in_flight - len(entries))
+
+    def dropped(self, items=1):
+        """Personnages comptés par done() puis écartés par les pipelines"""
+        self.hits = max(0, self.hits - items)
+
+    def cancel(self):
+        """Abandonne la réserve et retourne le nombre de pages qui ne seront pas demandées"""
+        cancelled = len(self.backlog)
+        self.backlog.clear()
+        self.listings.clear()
+        return cancelled
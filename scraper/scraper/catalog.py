@@ -0,0 +1,127 @@
+# Catalogue des wikis scrapés
+#
+# data/catalog.json résume chaque fichier data/<wiki>_characters.json
+# (nombre de personnages, taille, date du dernier scraping, couverture
+# des champs, limite et raison de fin du dernier crawl) pour éviter de
+# relire tous les fichiers de données.
+
+import json
+import os
+import threading
+import time
+
+from .storage import atomic_write_json
+
+CATALOG_FILENAME = 'catalog.json'
+DATA_SUFFIX = '_characters.json'
+
+
+def field_coverage(items):
+    """Compte, pour chaque champ, le nombre d'items où il est renseigné"""
+    coverage = {}
+    for item in items:
+        for field, value in item.items():
+            if value:
+                coverage[field] = coverage.get(field, 0) + 1
+    return coverage
+
+
+class WikiCatalog:
+    """Index des fichiers de données, mis à jour par les crawls"""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, CATALOG_FILENAME)
+        self.entries = {}
+        self.catalog_mtime_ns = None
+        self.lock = threading.Lock()
+
+    def data_path(self, wiki_name):
+        return os.path.join(self.data_dir, f'{wiki_name}{DATA_SUFFIX}')
+
+    def _load(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_mtime_ns == self.catalog_mtime_ns:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('wikis', {})
+        except (json.JSONDecodeError, OSError):
+            self.entries = {}
+        self.catalog_mtime_ns = stat.st_mtime_ns
+
+    def _save(self):
+        atomic_write_json(self.path, {'wikis': self.entries})
+        self.catalog_mtime_ns = os.stat(self.path).st_mtime_ns
+
+    def _entry(self, wiki_name, items, stat, last_scraped):
+        return {
+            'name': wiki_name,
+            'character_count': len(items),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'last_scraped': last_scraped,
+            'field_coverage': field_coverage(items),
+        }
+
+    def record(self, wiki_name, items):
+        """Enregistre le résultat d'un crawl terminé"""
+        with self.lock:
+            self._load()
+            stat = os.stat(self.data_path(wiki_name))
+            self.entries[wiki_name] = self._entry(wiki_name, items, stat, time.time())
+            self._save()
+
+    def record_run(self, wiki_name, character_limit, finish_reason):
+        """Ajoute à l'entrée d'un wiki la limite demandée et la raison de fin de son dernier crawl"""
+        with self.lock:
+            self._load()
+            entry = self.entries.get(wiki_name)
+            if entry is None:
+                return
+            entry.update(character_limit=character_limit, finish_reason=finish_reason)
+            self._save()
+
+    def refresh(self):
+        """Resynchronise le catalogue avec les fichiers du dossier data
+
+        Seuls les fichiers dont la date de modification ou la taille
+        diffèrent du catalogue sont relus. La date du dossier ne suffit pas :
+        un fichier réécrit sur place ne la change pas.
+        """
+        with self.lock:
+            self._load()
+            changed = False
+            found = set()
+            for filename in os.listdir(self.data_dir):
+                if not filename.endswith(DATA_SUFFIX):
+                    continue
+                wiki_name = filename[:-len(DATA_SUFFIX)]
+                found.add(wiki_name)
+                stat = os.stat(os.path.join(self.data_dir, filename))
+                entry = self.entries.get(wiki_name)
+                if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                    continue
+                try:
+                    with open(self.data_path(wiki_name), 'r', encoding='utf-8') as f:
+                        items = json.load(f)
+                except json.JSONDecodeError:
+                    continue
+                self.entries[wiki_name] = self._entry(wiki_name, items, stat, stat.st_mtime)
+                changed = True
+            for wiki_name in set(self.entries) - found:
+                del self.entries[wiki_name]
+                changed = True
+            if changed:
+                self._save()
+
+    def list(self):
+        self.refresh()
+        return sorted(self.entries.values(), key=lambda entry: entry['name'])
+
+    def get(self, wiki_name):
+        self.refresh()
+        return self.entries.get(wiki_name)
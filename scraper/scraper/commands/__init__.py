@@ -0,0 +1 @@
+# Commandes Scrapy propres au projet (voir COMMANDS_MODULE dans settings.py)
@@ -0,0 +1,32 @@
+import os
+
+from scrapy.commands import ScrapyCommand
+from scrapy.utils.project import data_path
+
+from ..httpcache import compact
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {'LOG_ENABLED': False}
+
+    def short_desc(self):
+        return "Évince et compacte le cache HTTP SQLite"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            '--max-bytes', type=int, default=None,
+            help="taille maximale du cache (défaut : HTTPCACHE_SQLITE_MAX_BYTES)"
+        )
+
+    def run(self, args, opts):
+        path = os.path.join(data_path(self.settings['HTTPCACHE_DIR']), 'cache.sqlite')
+        if not os.path.exists(path):
+            print(f"Aucun cache à compacter : {path}")
+            return
+        max_bytes = opts.max_bytes
+        if max_bytes is None:
+            max_bytes = self.settings.getint('HTTPCACHE_SQLITE_MAX_BYTES')
+        removed, before, after = compact(path, max_bytes, self.settings.getint('HTTPCACHE_EXPIRATION_SECS'))
+        print(f"{removed} réponses supprimées, cache réduit de {before} à {after} octets")
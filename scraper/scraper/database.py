@@ -0,0 +1,225 @@
+# Base SQLite des personnages scrapés
+#
+# data/characters.sqlite contient une ligne par personnage avec des index
+# sur le wiki, le nom, le titre de page et les champs de l'infobox : pages,
+# tris, filtres, comptes et recherches d'image deviennent des requêtes
+# indexées. La base est en WAL, le serveur peut donc la lire pendant qu'un
+# crawl écrit. Les fichiers data/<wiki>_characters.json restent écrits
+# pour compatibilité ; un wiki dont le fichier a changé hors d'un crawl est
+# réimporté depuis celui-ci.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .thumbnails import character_id
+
+DB_FILENAME = 'characters.sqlite'
+# Champs de l'item copiés dans des colonnes indexées (tri et filtres côté serveur)
+INDEXED_FIELDS = ('name', 'type', 'role', 'class_name', 'origin')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS wikis (
+    name TEXT PRIMARY KEY,
+    character_count INTEGER NOT NULL,
+    source_mtime_ns INTEGER,
+    source_size INTEGER,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS characters (
+    wiki TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT,
+    url TEXT,
+    image_url TEXT,
+    name TEXT,
+    type TEXT,
+    role TEXT,
+    class_name TEXT,
+    origin TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (wiki, position)
+);
+CREATE INDEX IF NOT EXISTS characters_title ON characters (wiki, title);
+''' + ''.join(
+    f'CREATE INDEX IF NOT EXISTS characters_{field} ON characters (wiki, {field} COLLATE NOCASE, position);\n'
+    for field in INDEXED_FIELDS
+)
+
+
+def _column(value):
+    # Les valeurs vides sont stockées à NULL : elles restent en fin de tri
+    return str(value) if value else None
+
+
+class CharacterDatabase:
+    """Personnages de tous les wikis, une connexion SQLite par thread"""
+
+    def __init__(self, path, batch_size=500):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.local = threading.local()
+        # Un seul import depuis un fichier JSON à la fois
+        self.sync_lock = threading.Lock()
+        self.connection().executescript(SCHEMA)
+
+    @classmethod
+    def for_data_dir(cls, data_dir):
+        return cls(os.path.join(data_dir, DB_FILENAME))
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def replace_wiki(self, wiki, items, source=None):
+        """Remplace tous les personnages d'un wiki, en une transaction et par lots d'insertions
+
+        `source` est (mtime_ns, taille) du fichier JSON exporté en même temps.
+        """
+        conn = self.connection()
+        rows = (
+            (wiki, position, character_id(item['url']) if item.get('url') else None,
+             item.get('url'), item.get('image_url'),
+             *(_column(item.get(field)) for field in INDEXED_FIELDS),
+             json.dumps(item, ensure_ascii=False))
+            for position, item in enumerate(items)
+        )
+        columns = ', '.join(('wiki', 'position', 'title', 'url', 'image_url', *INDEXED_FIELDS, 'data'))
+        placeholders = ', '.join('?' * (5 + len(INDEXED_FIELDS) + 1))
+        count = 0
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM characters WHERE wiki = ?', (wiki,))
+            while True:
+                batch = [row for _, row in zip(range(self.batch_size), rows)]
+                if not batch:
+                    break
+                conn.executemany(f'INSERT INTO characters ({columns}) VALUES ({placeholders})', batch)
+                count += len(batch)
+            conn.execute(
+                'INSERT OR REPLACE INTO wikis VALUES (?, ?, ?, ?, ?)',
+                (wiki, count, *(source or (None, None)), time.time())
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return count
+
+    def remove_wiki(self, wiki):
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM characters WHERE wiki = ?', (wiki,))
+            conn.execute('DELETE FROM wikis WHERE name = ?', (wiki,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def source(self, wiki):
+        """(mtime_ns, taille) du fichier JSON importé pour ce wiki, ou None"""
+        row = self.connection().execute(
+            'SELECT source_mtime_ns, source_size FROM wikis WHERE name = ?', (wiki,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def sync(self, wiki, json_path):
+        """Réimporte le fichier JSON d'un wiki s'il a changé depuis le dernier import
+
+        Retourne False si le wiki n'a pas de fichier de données.
+        """
+        try:
+            stat = os.stat(json_path)
+        except FileNotFoundError:
+            if self.source(wiki) is not None:
+                self.remove_wiki(wiki)
+            return False
+        version = (stat.st_mtime_ns, stat.st_size)
+        if self.source(wiki) == version:
+            return True
+        with self.sync_lock:
+            if self.source(wiki) != version:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    items = json.load(f)
+                self.replace_wiki(wiki, items, source=version)
+        return True
+
+    def _where(self, wiki, filters):
+        clauses = ['wiki = ?']
+        params = [wiki]
+        for field, value in (filters or {}).items():
+            if field not in INDEXED_FIELDS:
+                raise ValueError(f"Filtre impossible sur '{field}'")
+            clauses.append(f'{field} = ? COLLATE NOCASE')
+            params.append(value)
+        return ' AND '.join(clauses), params
+
+    def _select(self, where, params, order, offset, limit):
+        rows = self.connection().execute(
+            f'SELECT data FROM characters WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?',
+            (*params, limit, offset)
+        )
+        return [json.loads(data) for data, in rows]
+
+    def count(self, wiki, filters=None):
+        if not filters:
+            row = self.connection().execute('SELECT character_count FROM wikis WHERE name = ?', (wiki,)).fetchone()
+            return row[0] if row else 0
+        where, params = self._where(wiki, filters)
+        return self.connection().execute(f'SELECT COUNT(*) FROM characters WHERE {where}', params).fetchone()[0]
+
+    def page(self, wiki, offset=0, limit=50, sort=None, descending=False, filters=None):
+        """Personnages d'un wiki dans l'ordre demandé (ordre du crawl par défaut)"""
+        where, params = self._where(wiki, filters)
+        direction = 'DESC' if descending else 'ASC'
+        if sort is None and not filters:
+            # Positions contiguës : accès direct par la clé primaire plutôt qu'un OFFSET
+            if descending:
+                start = self.count(wiki) - 1 - offset
+                return self._select(f'{where} AND position <= ?', [*params, start], 'position DESC', 0, limit)
+            return self._select(f'{where} AND position >= ?', [*params, offset], 'position', 0, limit)
+        if sort is None:
+            return self._select(where, params, f'position {direction}', offset, limit)
+        if sort not in INDEXED_FIELDS:
+            raise ValueError(f"Tri impossible sur '{sort}'")
+
+        # Les personnages sans valeur restent en fin de liste, dans l'ordre du crawl
+        items = self._select(f'{where} AND {sort} IS NOT NULL', params,
+                             f'{sort} COLLATE NOCASE {direction}, position {direction}', offset, limit)
+        if len(items) < limit:
+            if items:
+                missing_offset = 0
+            else:
+                missing_offset = offset - self.connection().execute(
+                    f'SELECT COUNT(*) FROM characters WHERE {where} AND {sort} IS NOT NULL', params
+                ).fetchone()[0]
+            items += self._select(f'{where} AND {sort} IS NULL', params, 'position',
+                                  max(0, missing_offset), limit - len(items))
+        return items
+
+    def items(self, wiki):
+        """Tous les personnages d'un wiki, dans l'ordre du crawl"""
+        return self._select('wiki = ?', [wiki], 'position', 0, -1)
+
+    def image_url(self, wiki, title):
+        """URL de l'image du personnage dont la page a pour titre `title`"""
+        row = self.connection().execute(
+            'SELECT image_url FROM characters WHERE wiki = ? AND title = ? AND image_url IS NOT NULL LIMIT 1',
+            (wiki, title)
+        ).fetchone()
+        return row[0] if row else None
@@ -0,0 +1,200 @@
+# Déduplication à mémoire bornée
+#
+# Les empreintes des requêtes, les liens suivis par le spider et les clés
+# d'items sont rangés dans un même filtre de Bloom extensible : quelques
+# bits par élément au lieu des chaînes complètes, avec un taux de faux
+# positifs configurable (DEDUPE_ERROR_RATE). Le filtre est partagé par le
+# crawler et, quand JOBDIR est défini, sauvegardé à la fermeture puis
+# rechargé pour reprendre un crawl interrompu.
+
+import hashlib
+import json
+import logging
+import math
+import os
+
+from scrapy import signals
+from scrapy.dupefilters import BaseDupeFilter
+from w3lib.url import canonicalize_url
+
+from .storage import temporary_path
+
+logger = logging.getLogger(__name__)
+
+SEEN_FILENAME = 'seen.bloom'
+
+
+def canonical_url(url):
+    """URL normalisée (paramètres triés, sans fragment) pour la déduplication"""
+    return canonicalize_url(url, keep_fragments=False)
+
+
+def key_hash(key):
+    """Deux hachages 64 bits d'une clé, d'où sont dérivées les positions de bits"""
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+class BloomFilter:
+    """Filtre de Bloom de taille fixe, dimensionné pour `capacity` éléments"""
+
+    def __init__(self, capacity, error_rate, bits=None, count=0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+        self.count = count
+
+    def contains(self, hashes):
+        # Double hachage : k positions à partir d'un seul condensat
+        h1, h2 = hashes
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            p = (h1 + i * h2) % size
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    def add(self, hashes):
+        h1, h2 = hashes
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            p = (h1 + i * h2) % size
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter:
+    """Suite de filtres de Bloom : un nouveau filtre, deux fois plus grand et
+    plus strict, est ajouté quand le précédent est plein"""
+
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(self, capacity=200000, error_rate=0.0001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.filters = []
+
+    def __contains__(self, key):
+        hashes = key_hash(key)
+        return any(bloom.contains(hashes) for bloom in self.filters)
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    def add(self, key):
+        """Ajoute une clé ; retourne True si elle était (probablement) déjà présente"""
+        hashes = key_hash(key)
+        if any(bloom.contains(hashes) for bloom in self.filters):
+            return True
+        if not self.filters or self.filters[-1].full:
+            n = len(self.filters)
+            self.filters.append(BloomFilter(
+                self.capacity * self.GROWTH ** n,
+                # Le taux global reste borné par error_rate / (1 - TIGHTENING)
+                self.error_rate * (1 - self.TIGHTENING) * self.TIGHTENING ** n
+            ))
+        self.filters[-1].add(hashes)
+        return False
+
+    @property
+    def nbytes(self):
+        return sum(len(bloom.bits) for bloom in self.filters)
+
+    def save(self, path):
+        """Écrit l'en-tête JSON puis les tableaux de bits, de façon atomique"""
+        header = {
+            'capacity': self.capacity,
+            'error_rate': self.error_rate,
+            'filters': [
+                {'capacity': b.capacity, 'error_rate': b.error_rate, 'count': b.count}
+                for b in self.filters
+            ],
+        }
+        tmp_path = temporary_path(path)
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+            for bloom in self.filters:
+                f.write(bloom.bits)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            sbf = cls(header['capacity'], header['error_rate'])
+            for entry in header['filters']:
+                bloom = BloomFilter(entry['capacity'], entry['error_rate'], count=entry['count'])
+                bloom.bits = bytearray(f.read(len(bloom.bits)))
+                sbf.filters.append(bloom)
+        return sbf
+
+
+class SeenFilter:
+    """Filtre partagé par le dupefilter, le spider et les pipelines d'un crawler"""
+
+    def __init__(self, bloom, path=None):
+        self.bloom = bloom
+        self.path = path
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        # Une seule instance par crawler
+        seen = getattr(crawler, 'seen_filter', None)
+        if seen is not None:
+            return seen
+
+        settings = crawler.settings
+        jobdir = settings.get('JOBDIR')
+        path = os.path.join(jobdir, SEEN_FILENAME) if jobdir else None
+        if path and os.path.exists(path):
+            bloom = ScalableBloomFilter.load(path)
+            logger.info(f"Reprise de la déduplication depuis {path} ({len(bloom)} clés)")
+        else:
+            bloom = ScalableBloomFilter(
+                settings.getint('DEDUPE_CAPACITY', 200000),
+                settings.getfloat('DEDUPE_ERROR_RATE', 0.0001)
+            )
+        seen = cls(bloom, path)
+        crawler.seen_filter = seen
+        crawler.signals.connect(seen.spider_closed, signal=signals.spider_closed)
+        return seen
+
+    def add(self, namespace, key):
+        """Retourne True si la clé a déjà été vue dans cet espace de noms"""
+        return self.bloom.add(f'{namespace}:{key}')
+
+    def spider_closed(self, spider, reason):
+        if self.path:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.bloom.save(self.path)
+        spider.crawler.stats.set_value('dedupe/keys', len(self.bloom))
+        spider.crawler.stats.set_value('dedupe/bytes', self.bloom.nbytes)
+
+
+class BloomDupeFilter(BaseDupeFilter):
+    """Dupefilter Scrapy qui range les empreintes de requêtes dans le filtre partagé"""
+
+    def __init__(self, seen, fingerprinter, stats=None):
+        self.seen = seen
+        self.fingerprinter = fingerprinter
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(SeenFilter.from_crawler(crawler), crawler.request_fingerprinter, crawler.stats)
+
+    def request_seen(self, request):
+        return self.seen.add('request', self.fingerprinter.fingerprint(request).hex())
+
+    def log(self, request, spider):
+        if self.stats is not None:
+            self.stats.inc_value('dupefilter/filtered')
@@ -0,0 +1,134 @@
+# Découverte de la catégorie des personnages d'un wiki
+#
+# Les liens candidats de la page d'accueil sont notés : la catégorie exacte
+# (Category:Characters), puis les noms de catégorie courants sur Fandom
+# (Playable characters, Characters (série)...), les catégories qui parlent
+# de personnages et enfin les articles. Seuls les meilleurs sont suivis, avec
+# leur note comme priorité Scrapy. La catégorie d'entrée qui a donné des
+# personnages est retenue par wiki dans data/.state/discovery.json : le
+# crawl suivant commence directement par elle.
+
+import json
+import os
+import time
+from urllib.parse import unquote, urljoin, urlsplit
+
+from .storage import atomic_write_json
+
+# Notes des liens candidats, utilisées comme priorités des requêtes
+EXACT_SCORE = 100
+NAMED_SCORE = 80
+RELATED_SCORE = 50
+SUBCATEGORY_SCORE = 30
+ARTICLE_SCORE = 10
+
+# Catégories de personnages courantes sur Fandom, en plus de la catégorie demandée
+NAMED_PREFIXES = ('playable', 'main', 'major', 'recurring', 'minor', 'supporting', 'all')
+# Catégories qui parlent de personnages sans en lister
+EXCLUDED_WORDS = ('image', 'stub', 'template', 'navbox', 'quote', 'galler', 'infobox',
+                  'audio', 'video', 'sprite', 'icon', 'artwork', 'screenshot', 'article')
+# Paramètres des liens d'édition, d'historique ou de diff
+EXCLUDED_QUERY = ('action=', 'oldid=', 'diff=', 'veaction=')
+
+
+def page_title(url):
+    """Titre MediaWiki d'une URL /wiki/<titre>, avec des espaces, ou None"""
+    parts = urlsplit(url)
+    if '/wiki/' not in parts.path or any(key in parts.query for key in EXCLUDED_QUERY):
+        return None
+    return unquote(parts.path.split('/wiki/', 1)[1]).replace('_', ' ').strip()
+
+
+def category_score(url, category='Characters', subcategory=False):
+    """Note d'un lien candidat vers la liste des personnages, ou None s'il faut l'ignorer
+
+    `subcategory` : lien trouvé parmi les membres d'une catégorie de personnages.
+    """
+    title = page_title(url)
+    if not title:
+        return None
+    namespace, _, name = title.rpartition(':')
+    name = name.lower()
+    if any(word in name for word in EXCLUDED_WORDS):
+        return None
+    wanted = category.replace('_', ' ').lower()
+    singular = wanted[:-1] if wanted.endswith('s') else wanted
+
+    if namespace.lower() == 'category':
+        if name == wanted:
+            return EXACT_SCORE
+        if name.startswith(f'{wanted} (') or name in (f'{prefix} {wanted}' for prefix in NAMED_PREFIXES):
+            return NAMED_SCORE
+        if singular in name:
+            return RELATED_SCORE
+        return SUBCATEGORY_SCORE if subcategory else None
+    if namespace or subcategory:
+        # Special:, File:, Template:... ou membre qui n'est pas une catégorie
+        return None
+    if name in (wanted, f'list of {wanted}'):
+        return ARTICLE_SCORE
+    return None
+
+
+def category_candidates(response, category, limit):
+    """Meilleurs liens candidats d'une page, du même wiki : [(url, note)] par note décroissante"""
+    host = urlsplit(response.url).netloc
+    scores = {}
+    for href in response.css('a::attr(href)').getall():
+        url = urljoin(response.url, href).split('#')[0]
+        if urlsplit(url).netloc != host:
+            continue
+        score = category_score(url, category)
+        if score is not None and score > scores.get(url, -1):
+            scores[url] = score
+    return sorted(scores.items(), key=lambda candidate: -candidate[1])[:limit]
+
+
+class DiscoveryState:
+    """Catégorie d'entrée de chaque wiki, persistée entre deux crawls"""
+
+    def __init__(self, path):
+        self.path = path
+        self.wikis = self._load()
+        self.changed = {}
+
+    @classmethod
+    def for_data_dir(cls, data_dir):
+        state_dir = os.path.join(data_dir, '.state')
+        os.makedirs(state_dir, exist_ok=True)
+        return cls(os.path.join(state_dir, 'discovery.json'))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+    def get(self, wiki_name):
+        return self.wikis.get(wiki_name, {}).get('category_url')
+
+    def remember(self, wiki_name, category_url):
+        if self.get(wiki_name) != category_url:
+            entry = {'category_url': category_url, 'updated_at': time.time()}
+            self.wikis[wiki_name] = self.changed[wiki_name] = entry
+
+    def forget(self, wiki_name):
+        if wiki_name in self.wikis:
+            del self.wikis[wiki_name]
+            self.changed[wiki_name] = None
+
+    def save(self):
+        if self.changed:
+            # Garder les wikis enregistrés entre-temps par d'autres crawls
+            wikis = self._load()
+            for wiki_name, entry in self.changed.items():
+                if entry is None:
+                    wikis.pop(wiki_name, None)
+                else:
+                    wikis[wiki_name] = entry
+            atomic_write_json(self.path, wikis, indent=None)
+            self.wikis = wikis
+            self.changed = {}
@@ -0,0 +1,288 @@
+# Frontière de crawl partagée entre plusieurs processus
+#
+# Les requêtes en attente, les empreintes déjà vues et les items sont
+# rangés dans un fichier SQLite (FRONTIER_PATH). Plusieurs processus
+# lancés avec `-s SCHEDULER=scraper.frontier.SharedScheduler` se
+# partagent ainsi le crawl des mêmes wikis sans télécharger deux fois la
+# même page. Un wiki repart de zéro quand aucun autre processus ne le
+# crawle et qu'il ne reste aucune requête en attente ; sinon le processus
+# rejoint (ou reprend) le crawl en cours.
+
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import uuid
+from time import time
+
+from scrapy import signals
+from scrapy.dupefilters import BaseDupeFilter
+from scrapy.exceptions import DontCloseSpider
+from scrapy.utils.misc import build_from_crawler, load_object
+from scrapy.utils.project import data_path
+from scrapy.utils.request import request_from_dict
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    wiki TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS requests_next ON requests (wiki, priority DESC, id);
+CREATE TABLE IF NOT EXISTS seen (
+    fingerprint TEXT PRIMARY KEY,
+    wiki TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS seen_wiki ON seen (wiki);
+CREATE TABLE IF NOT EXISTS items (
+    wiki TEXT NOT NULL,
+    url TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (wiki, url)
+);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    wikis TEXT NOT NULL,
+    busy INTEGER NOT NULL,
+    heartbeat REAL NOT NULL
+);
+"""
+
+# Intervalle minimum entre deux mises à jour du battement de cœur (secondes)
+HEARTBEAT_INTERVAL = 5.0
+
+
+def frontier_path(settings):
+    path = settings.get('FRONTIER_PATH')
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return path
+    return os.path.join(data_path('frontier', createdir=True), 'frontier.sqlite')
+
+
+class SqliteFrontier:
+    """Requêtes, empreintes vues, items et processus actifs d'un crawl partagé"""
+
+    def __init__(self, path, worker_timeout=60.0):
+        self.path = path
+        self.worker_timeout = worker_timeout
+        self.conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def join(self, worker_id, wikis):
+        """Enregistre un processus et remet à zéro les wikis qui ne sont plus crawlés
+
+        Retourne les wikis remis à zéro.
+        """
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.execute(
+                'DELETE FROM workers WHERE heartbeat < ?', (time() - self.worker_timeout,)
+            )
+            active = set()
+            for (names,) in self.conn.execute('SELECT wikis FROM workers'):
+                active.update(json.loads(names))
+            reset = []
+            for wiki in wikis:
+                if wiki in active or self._pending(wiki):
+                    continue
+                self.conn.execute('DELETE FROM seen WHERE wiki = ?', (wiki,))
+                self.conn.execute('DELETE FROM items WHERE wiki = ?', (wiki,))
+                reset.append(wiki)
+            self.conn.execute(
+                'INSERT OR REPLACE INTO workers VALUES (?, ?, 1, ?)',
+                (worker_id, json.dumps(list(wikis)), time())
+            )
+        return reset
+
+    def leave(self, worker_id):
+        self.conn.execute('DELETE FROM workers WHERE id = ?', (worker_id,))
+
+    def heartbeat(self, worker_id, busy):
+        self.conn.execute(
+            'UPDATE workers SET busy = ?, heartbeat = ? WHERE id = ?', (int(busy), time(), worker_id)
+        )
+
+    def busy_peers(self, worker_id, wikis):
+        """Nombre d'autres processus actifs qui crawlent un de ces wikis"""
+        count = 0
+        for names, in self.conn.execute(
+                'SELECT wikis FROM workers WHERE id != ? AND busy = 1 AND heartbeat >= ?',
+                (worker_id, time() - self.worker_timeout)):
+            if set(json.loads(names)) & set(wikis):
+                count += 1
+        return count
+
+    def mark_seen(self, fingerprint, wiki):
+        """Retourne True si l'empreinte était déjà connue"""
+        cursor = self.conn.execute(
+            'INSERT OR IGNORE INTO seen VALUES (?, ?)', (fingerprint, wiki)
+        )
+        return cursor.rowcount == 0
+
+    def push(self, wiki, priority, data):
+        self.conn.execute(
+            'INSERT INTO requests (wiki, priority, data) VALUES (?, ?, ?)', (wiki, priority, data)
+        )
+
+    def pop(self, wikis):
+        """Retire et retourne la requête la plus prioritaire de ces wikis, ou None"""
+        placeholders = ','.join('?' * len(wikis))
+        row = self.conn.execute(
+            f'DELETE FROM requests WHERE id = ('
+            f' SELECT id FROM requests WHERE wiki IN ({placeholders})'
+            f' ORDER BY priority DESC, id LIMIT 1'
+            f') RETURNING data',
+            list(wikis)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _pending(self, wiki):
+        return self.conn.execute(
+            'SELECT COUNT(*) FROM requests WHERE wiki = ?', (wiki,)
+        ).fetchone()[0]
+
+    def pending(self, wikis):
+        return sum(self._pending(wiki) for wiki in wikis)
+
+    def add_item(self, wiki, item):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO items VALUES (?, ?, ?)',
+            (wiki, item.get('url') or uuid.uuid4().hex, json.dumps(item, ensure_ascii=False))
+        )
+
+    def count_items(self, wiki):
+        return self.conn.execute(
+            'SELECT COUNT(*) FROM items WHERE wiki = ?', (wiki,)
+        ).fetchone()[0]
+
+    def items(self, wiki):
+        """Items rassemblés par tous les processus, dans l'ordre d'arrivée"""
+        return [
+            json.loads(data) for data, in self.conn.execute(
+                'SELECT data FROM items WHERE wiki = ? ORDER BY rowid', (wiki,)
+            )
+        ]
+
+
+class SqliteDupeFilter(BaseDupeFilter):
+    """Filtre de doublons dont les empreintes sont partagées via la frontière"""
+
+    def __init__(self, path, fingerprinter, stats=None):
+        self.path = path
+        self.fingerprinter = fingerprinter
+        self.stats = stats
+        self.frontier = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(frontier_path(crawler.settings), crawler.request_fingerprinter, crawler.stats)
+
+    def open(self):
+        self.frontier = SqliteFrontier(self.path)
+
+    def close(self, reason):
+        self.frontier.close()
+
+    def request_seen(self, request):
+        fingerprint = self.fingerprinter.fingerprint(request).hex()
+        return self.frontier.mark_seen(fingerprint, request.meta.get('wiki', ''))
+
+    def log(self, request, spider):
+        if self.stats is not None:
+            self.stats.inc_value('dupefilter/filtered')
+
+
+class SharedScheduler:
+    """Planificateur dont la file d'attente est partagée entre plusieurs processus
+
+    Un processus inactif attend tant qu'un autre processus travaille
+    encore sur un de ses wikis, car celui-ci peut ajouter des requêtes.
+    """
+
+    def __init__(self, crawler, path, dupefilter, worker_timeout=60.0):
+        self.crawler = crawler
+        self.path = path
+        self.df = dupefilter
+        self.worker_timeout = worker_timeout
+        self.worker_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.frontier = None
+        self.spider = None
+        self.wikis = []
+        self.busy = True
+        self.last_heartbeat = 0.0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        dupefilter_cls = load_object(settings.get('FRONTIER_DUPEFILTER_CLASS'))
+        scheduler = cls(
+            crawler,
+            frontier_path(settings),
+            build_from_crawler(dupefilter_cls, crawler),
+            worker_timeout=settings.getfloat('FRONTIER_WORKER_TIMEOUT', 60.0)
+        )
+        crawler.signals.connect(scheduler.spider_idle, signal=signals.spider_idle)
+        return scheduler
+
+    def open(self, spider):
+        self.spider = spider
+        self.wikis = list(spider.wikis)
+        self.frontier = SqliteFrontier(self.path, self.worker_timeout)
+        self.df.open()
+        reset = self.frontier.join(self.worker_id, self.wikis)
+        joined = [wiki for wiki in self.wikis if wiki not in reset]
+        logger.info(f"Frontière partagée {self.path} : worker {self.worker_id}, "
+                    f"nouveaux wikis {reset}, wikis rejoints {joined}")
+        # Le pipeline de stockage rassemble les items de tous les processus
+        spider.frontier = self.frontier
+
+    def close(self, reason):
+        self.frontier.leave(self.worker_id)
+        self.df.close(reason)
+        self.frontier.close()
+
+    def has_pending_requests(self):
+        return self.frontier.pending(self.wikis) > 0
+
+    def enqueue_request(self, request):
+        # Les requêtes de départ ne sont envoyées que par un seul processus
+        if (not request.dont_filter or request.meta.get('is_start_request')) \
+                and self.df.request_seen(request):
+            self.df.log(request, self.spider)
+            return False
+        wiki = request.meta.get('wiki', '')
+        data = pickle.dumps(request.to_dict(spider=self.spider), protocol=4)
+        self.frontier.push(wiki, request.priority, data)
+        self.crawler.stats.inc_value('scheduler/enqueued/frontier')
+        return True
+
+    def next_request(self):
+        data = self.frontier.pop(self.wikis)
+        self._heartbeat(busy=self.busy or data is not None)
+        if data is None:
+            return None
+        self.crawler.stats.inc_value('scheduler/dequeued/frontier')
+        return request_from_dict(pickle.loads(data), spider=self.spider)
+
+    def spider_idle(self, spider):
+        self._heartbeat(busy=False)
+        if self.frontier.busy_peers(self.worker_id, self.wikis):
+            raise DontCloseSpider
+
+    def _heartbeat(self, busy):
+        # Un changement d'état est publié tout de suite, le reste périodiquement
+        now = time()
+        if busy != self.busy or now - self.last_heartbeat >= HEARTBEAT_INTERVAL:
+            self.frontier.heartbeat(self.worker_id, busy)
+            self.busy = busy
+            self.last_heartbeat = now
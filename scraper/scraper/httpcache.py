@@ -0,0 +1,146 @@
+# Stockage du cache HTTP dans un seul fichier SQLite
+#
+# Remplace FilesystemCacheStorage, qui crée plusieurs petits fichiers par
+# réponse : les corps sont compressés avec zlib, les entrées les moins
+# récemment lues sont évincées au-delà de HTTPCACHE_SQLITE_MAX_BYTES et
+# `scrapy compactcache` récupère l'espace libéré.
+
+import logging
+import os
+import sqlite3
+import zlib
+from time import time
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    fingerprint TEXT PRIMARY KEY,
+    spider TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers BLOB NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+def open_cache_db(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def evict(conn, max_bytes, expiration_secs=0):
+    """Supprime les entrées expirées puis les moins récemment lues au-delà du budget
+
+    Retourne le nombre d'entrées supprimées.
+    """
+    removed = 0
+    if expiration_secs > 0:
+        removed += conn.execute(
+            'DELETE FROM responses WHERE stored_at < ?', (time() - expiration_secs,)
+        ).rowcount
+    total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+    if max_bytes and total > max_bytes:
+        # Descendre à 90 % du budget pour ne pas évincer à chaque écriture
+        target = total - int(max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for fingerprint, size in conn.execute(
+                'SELECT fingerprint, size FROM responses ORDER BY accessed_at'):
+            victims.append((fingerprint,))
+            freed += size
+            if freed >= target:
+                break
+        conn.executemany('DELETE FROM responses WHERE fingerprint = ?', victims)
+        removed += len(victims)
+    return removed
+
+
+class SqliteCacheStorage:
+    """Stockage du cache HTTP Scrapy dans HTTPCACHE_DIR/cache.sqlite"""
+
+    def __init__(self, settings):
+        self.path = os.path.join(data_path(settings['HTTPCACHE_DIR'], createdir=True), 'cache.sqlite')
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.max_bytes = settings.getint('HTTPCACHE_SQLITE_MAX_BYTES')
+        self.compression_level = settings.getint('HTTPCACHE_COMPRESSION_LEVEL', 6)
+        self.conn = None
+        self.written = 0
+
+    def open_spider(self, spider):
+        logger.debug(f"Using SQLite cache storage in {self.path}", extra={'spider': spider})
+        self.conn = open_cache_db(self.path)
+        self._fingerprinter = spider.crawler.request_fingerprinter
+
+    def close_spider(self, spider):
+        evict(self.conn, self.max_bytes, self.expiration_secs)
+        self.conn.close()
+
+    def retrieve_response(self, spider, request):
+        """Retourne la réponse en cache, ou None"""
+        fingerprint = self._fingerprinter.fingerprint(request).hex()
+        row = self.conn.execute(
+            'SELECT url, status, headers, body, stored_at FROM responses WHERE fingerprint = ?',
+            (fingerprint,)
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, raw_headers, body, stored_at = row
+        if 0 < self.expiration_secs < time() - stored_at:
+            return None
+        self.conn.execute(
+            'UPDATE responses SET accessed_at = ? WHERE fingerprint = ?', (time(), fingerprint)
+        )
+
+        body = zlib.decompress(body)
+        headers = Headers(headers_raw_to_dict(raw_headers))
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        request.meta['cache_timestamp'] = stored_at
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        """Compresse et enregistre la réponse"""
+        fingerprint = self._fingerprinter.fingerprint(request).hex()
+        body = zlib.compress(response.body, self.compression_level)
+        headers = headers_dict_to_raw(response.headers)
+        size = len(body) + len(headers)
+        now = time()
+        self.conn.execute(
+            'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (fingerprint, spider.name, response.url, response.status, headers, body, size, now, now)
+        )
+        # Vérifier le budget régulièrement plutôt qu'à chaque réponse
+        self.written += size
+        if self.max_bytes and self.written >= self.max_bytes // 20:
+            self.written = 0
+            evict(self.conn, self.max_bytes, self.expiration_secs)
+
+
+def compact(path, max_bytes=0, expiration_secs=0):
+    """Évince selon le budget puis reconstruit le fichier pour libérer l'espace
+
+    Retourne (entrées supprimées, taille avant, taille après).
+    """
+    size_before = os.path.getsize(path)
+    conn = open_cache_db(path)
+    try:
+        removed = evict(conn, max_bytes, expiration_secs)
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+    return removed, size_before, os.path.getsize(path)
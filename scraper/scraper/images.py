@@ -0,0 +1,214 @@
+# Validation réseau des images des personnages
+#
+# Les URLs à vérifier sont regroupées en petits lots et interrogées en
+# parallèle par une session aiohttp unique (connexions keep-alive, nombre
+# de connexions limité par hôte). Une requête GET partielle (Range) suffit
+# pour connaître le statut, le type de contenu et les dimensions. Les
+# résultats sont gardés dans un cache SQLite qui survit aux redémarrages.
+
+import asyncio
+import logging
+import os
+import sqlite3
+import struct
+from time import time
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Octets lus au début de chaque image pour en trouver les dimensions
+HEADER_BYTES = 32768
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    url TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    content_type TEXT,
+    width INTEGER,
+    height INTEGER,
+    checked_at REAL NOT NULL
+);
+"""
+
+
+def image_size(data):
+    """(largeur, hauteur) d'une image PNG, GIF, JPEG ou WebP, ou None"""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        return struct.unpack('<HH', data[6:10])
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP' and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', data[26:30])
+            return width & 0x3fff, height & 0x3fff
+        if chunk == b'VP8L':
+            bits = int.from_bytes(data[21:25], 'little')
+            return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+        if chunk == b'VP8X':
+            return int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+        return None
+    if data[:2] == b'\xff\xd8':
+        # Parcourir les segments JPEG jusqu'au marqueur SOF
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xff:
+                i += 1
+                continue
+            marker = data[i + 1]
+            if marker in (0xd8, 0x01) or 0xd0 <= marker <= 0xd7 or marker == 0xff:
+                i += 1 if marker == 0xff else 2
+                continue
+            length = struct.unpack('>H', data[i + 2:i + 4])[0]
+            if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+                height, width = struct.unpack('>HH', data[i + 5:i + 9])
+                return width, height
+            i += 2 + length
+    return None
+
+
+class ImageCache:
+    """Résultats de validation par URL, persistés dans un fichier SQLite"""
+
+    def __init__(self, path, ttl=7 * 24 * 3600):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def get(self, url):
+        """Dernier résultat encore frais pour cette URL, ou None"""
+        row = self.conn.execute(
+            'SELECT status, content_type, width, height, checked_at FROM images WHERE url = ?', (url,)
+        ).fetchone()
+        if row is None or time() - row[4] > self.ttl:
+            return None
+        return {'status': row[0], 'content_type': row[1], 'width': row[2], 'height': row[3]}
+
+    def put_many(self, results):
+        now = time()
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?)',
+                [(url, r['status'], r['content_type'], r['width'], r['height'], now)
+                 for url, r in results.items()]
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def is_valid(result):
+    return result['status'] in (200, 206) and (result['content_type'] or '').startswith('image/')
+
+
+class ImageValidator:
+    """Vérifie les images par lots, sur un pool de connexions partagé
+
+    `check()` peut être attendu par plusieurs items à la fois : les URLs
+    sont accumulées jusqu'à `batch_size` ou pendant `batch_delay`, puis
+    vérifiées ensemble. Une même URL n'est vérifiée qu'une fois.
+    """
+
+    def __init__(self, cache, concurrency=16, per_host=4, timeout=10.0,
+                 batch_size=20, batch_delay=0.05, stats=None):
+        self.cache = cache
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.stats = stats
+        self.session = None
+        self.waiting = {}       # url -> futures des items en attente
+        self.flush_handle = None
+        self.tasks = set()
+
+    def _inc(self, key):
+        if self.stats is not None:
+            self.stats.inc_value(f'images/{key}')
+
+    async def check(self, url):
+        """Résultat de validation de l'URL (statut, type, dimensions), ou None si injoignable"""
+        result = self._submit(url)
+        return await result if asyncio.isfuture(result) else result
+
+    async def check_many(self, urls):
+        """Résultats pour plusieurs URLs, envoyées ensemble sans attendre `batch_delay`"""
+        results = [self._submit(url) for url in urls]
+        self._flush()
+        return [await result if asyncio.isfuture(result) else result for result in results]
+
+    def _submit(self, url):
+        """Résultat en cache, ou future résolue une fois le lot de l'URL vérifié"""
+        cached = self.cache.get(url)
+        if cached is not None:
+            self._inc('cache_hit')
+            return cached
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.waiting.setdefault(url, []).append(future)
+        if len(self.waiting) >= self.batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.batch_delay, self._flush)
+        return future
+
+    def _flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.waiting = self.waiting, {}
+        if batch:
+            task = asyncio.ensure_future(self._check_batch(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _check_batch(self, batch):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        self._inc('batches')
+        urls = list(batch)
+        results = await asyncio.gather(*(self._fetch(url) for url in urls))
+        found = {url: result for url, result in zip(urls, results) if result is not None}
+        if found:
+            self.cache.put_many(found)
+        for url, result in zip(urls, results):
+            for future in batch[url]:
+                if not future.done():
+                    future.set_result(result)
+
+    async def _fetch(self, url):
+        try:
+            async with self.session.get(url, headers={'Range': f'bytes=0-{HEADER_BYTES - 1}'}) as response:
+                data = await response.content.read(HEADER_BYTES) if response.status in (200, 206) else b''
+                size = image_size(data) if data else None
+                self._inc(f'status/{response.status}')
+                return {
+                    'status': response.status,
+                    'content_type': response.headers.get('Content-Type', '').split(';')[0].strip(),
+                    'width': size[0] if size else None,
+                    'height': size[1] if size else None,
+                }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Injoignable : ne rien conclure et ne pas mettre en cache
+            logger.debug(f"Image check failed for {url}: {e!r}")
+            self._inc('errors')
+            return None
+
+    async def close(self):
+        self._flush()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.session is not None:
+            await self.session.close()
+        self.cache.close()
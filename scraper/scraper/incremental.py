@@ -0,0 +1,70 @@
+# État des pages déjà crawlées, pour le recrawl incrémental
+#
+# Pour chaque page de personnage on garde l'ETag, le Last-Modified, un
+# hash du contenu et, en mode API, l'id de la dernière révision. Un
+# nouveau crawl peut ainsi envoyer des requêtes conditionnelles et
+# réutiliser l'item précédent quand la page n'a pas changé.
+
+import hashlib
+import json
+import os
+
+from .storage import atomic_write_json
+
+
+def content_hash(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+class RecrawlState:
+    """Validateurs HTTP et hash par URL de page, persistés entre deux crawls"""
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = self._load()
+        self.changed = set()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+    @classmethod
+    def for_wiki(cls, data_dir, wiki_name):
+        state_dir = os.path.join(data_dir, '.state')
+        os.makedirs(state_dir, exist_ok=True)
+        return cls(os.path.join(state_dir, f'{wiki_name}_pages.json'))
+
+    def get(self, url):
+        return self.pages.get(url, {})
+
+    def update(self, url, **fields):
+        entry = self.pages.setdefault(url, {})
+        fields = {key: value for key, value in fields.items() if value is not None}
+        if any(entry.get(key) != value for key, value in fields.items()):
+            entry.update(fields)
+            self.changed.add(url)
+
+    def save(self):
+        if self.changed:
+            # Garder les pages enregistrées entre-temps par d'autres processus
+            pages = self._load()
+            pages.update({url: self.pages[url] for url in self.changed})
+            atomic_write_json(self.path, pages, indent=None)
+            self.pages = pages
+            self.changed = set()
+
+
+def load_previous_items(json_file):
+    """Items du dernier crawl, indexés par URL de page"""
+    if not os.path.exists(json_file):
+        return {}
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            return {item['url']: item for item in json.load(f) if item.get('url')}
+    except (json.JSONDecodeError, TypeError, KeyError):
+        return {}
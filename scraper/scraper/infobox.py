@@ -0,0 +1,102 @@
+# Extraction des infobox Fandom (.portable-infobox)
+#
+# L'infobox est parcourue une seule fois avec lxml : chaque ligne
+# .pi-data donne son propre couple (data-source, label, valeur), ce qui
+# évite de décaler labels et valeurs quand une ligne n'a pas de label.
+# Les labels sont associés aux champs de CharacterItem via une table
+# précompilée, configurable par wiki ; les autres lignes sont gardées
+# dans un dictionnaire d'attributs.
+
+import re
+
+from lxml import etree
+
+# Mots-clés (data-source ou label) associés à chaque champ, par priorité
+DEFAULT_FIELD_MAP = {
+    'type': ['type', 'espèce', 'race', 'species'],
+    'role': ['role', 'occupation', 'métier', 'job'],
+    'class_name': ['class', 'classe'],
+    'origin': ['origin', 'origine', 'from', 'birthplace'],
+}
+
+INFOBOX_XPATH = etree.XPath(
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' portable-infobox ')]"
+)
+
+
+def normalize_text(element):
+    return ' '.join(' '.join(element.itertext()).split())
+
+
+def has_class(element, name):
+    classes = element.get('class')
+    return bool(classes) and name in classes.split()
+
+
+class InfoboxExtractor:
+    """Associe les lignes d'infobox aux champs via une table précompilée"""
+
+    def __init__(self, field_map=None):
+        field_map = {**DEFAULT_FIELD_MAP, **(field_map or {})}
+        # Correspondance exacte sur data-source ou label, puis recherche
+        # de mot-clé dans le label avec une seule expression régulière
+        self.exact = {}
+        self.group_fields = {}
+        patterns = []
+        for field, keywords in field_map.items():
+            for keyword in keywords:
+                keyword = keyword.lower()
+                group = f'k{len(patterns)}'
+                self.exact.setdefault(keyword, field)
+                self.group_fields[group] = field
+                patterns.append(f'(?P<{group}>{re.escape(keyword)})')
+        self.keyword_pattern = re.compile('|'.join(patterns)) if patterns else None
+        self.field_order = list(field_map)
+        self.label_cache = {}
+
+    def map_label(self, label, data_source=None):
+        """Retourne le champ associé à une ligne d'infobox, ou None"""
+        if data_source:
+            field = self.exact.get(data_source.lower())
+            if field:
+                return field
+        label = label.lower()
+        if label in self.label_cache:
+            return self.label_cache[label]
+        field = self.exact.get(label)
+        if field is None and self.keyword_pattern is not None:
+            # Respecter l'ordre de priorité des champs, comme la table
+            matched = {self.group_fields[m.lastgroup] for m in self.keyword_pattern.finditer(label)}
+            field = next((f for f in self.field_order if f in matched), None)
+        self.label_cache[label] = field
+        return field
+
+    def assign(self, character, attributes, label, value, data_source=None):
+        """Range une ligne dans un champ de l'item ou dans les attributs"""
+        if not value:
+            return
+        field = self.map_label(label, data_source)
+        if field and field not in character:
+            character[field] = value
+        elif data_source or label:
+            attributes[data_source or label] = value
+
+    def extract(self, response):
+        """Retourne (champs, attributs, image) de l'infobox de la page"""
+        fields, attributes, image_url = {}, {}, None
+        infoboxes = INFOBOX_XPATH(response.selector.root)
+        if not infoboxes:
+            return fields, attributes, image_url
+
+        for element in infoboxes[0].iter(tag=etree.Element):
+            if image_url is None and element.tag == 'img' and has_class(element, 'pi-image-thumbnail'):
+                image_url = element.get('src') or element.get('data-src')
+            elif has_class(element, 'pi-data'):
+                label, value = '', ''
+                for child in element:
+                    if has_class(child, 'pi-data-label'):
+                        label = normalize_text(child)
+                    elif has_class(child, 'pi-data-value'):
+                        value = normalize_text(child)
+                self.assign(fields, attributes, label, value, element.get('data-source'))
+        return fields, attributes, image_url
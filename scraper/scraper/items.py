@@ -14,3 +14,7 @@ class CharacterItem(scrapy.Item):
     role = scrapy.Field()
     class_name = scrapy.Field()
     origin = scrapy.Field()
+    # Lignes de l'infobox qui ne correspondent à aucun champ ci-dessus
+    attributes = scrapy.Field()
+    # Wiki d'origine, utilisé pour router l'item vers son fichier (non sauvegardé)
+    wiki = scrapy.Field()
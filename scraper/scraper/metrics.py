@@ -0,0 +1,261 @@
+# Mesures de performance des crawls et du serveur
+#
+# Compteurs, jauges et histogrammes gardés dans le processus et exposés
+# au format texte de Prometheus (/metrics dans server.py). Les crawls
+# lancés par le serveur tournent dans le même processus et partagent donc
+# le même registre ; un crawl lancé avec `scrapy crawl` garde ses mesures
+# dans le fichier de statistiques écrit à côté des données.
+
+import functools
+import inspect
+import logging
+import os
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from time import monotonic
+
+from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from .storage import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# Bornes des histogrammes de durée (secondes)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STATS_SUFFIX = '_stats.json'
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Série de valeurs indexées par leurs labels"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def samples(self):
+        with self.lock:
+            return [(key, self.name, value) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, name, value, *extra in self.samples():
+            lines.append(f'{name}{_format_labels(self.labels, key, *extra)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # Un compteur par borne, puis +Inf, la somme et le nombre
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            items = sorted((key, list(counts)) for key, counts in self.values.items())
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                samples.append((key, f'{self.name}_bucket', cumulative, [('le', _format_value(float(bound)))]))
+            samples.append((key, f'{self.name}_sum', counts[-2]))
+            samples.append((key, f'{self.name}_count', counts[-1]))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        """Enregistre une mesure, ou retourne celle déjà enregistrée sous ce nom"""
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Registre du processus, lu par /metrics
+REGISTRY = Registry()
+
+CALLBACK_SECONDS = REGISTRY.register(Histogram(
+    'scraper_callback_seconds', "Temps passé dans chaque callback du spider", ('callback',)))
+PIPELINE_SECONDS = REGISTRY.register(Histogram(
+    'scraper_pipeline_seconds', "Latence de process_item par pipeline", ('pipeline',)))
+DOWNLOAD_SECONDS = REGISTRY.register(Histogram(
+    'scraper_download_seconds', "Latence des téléchargements par statut HTTP", ('status',)))
+ITEMS_TOTAL = REGISTRY.register(Counter(
+    'scraper_items_total', "Items scrapés par wiki", ('wiki',)))
+ITEMS_PER_SECOND = REGISTRY.register(Gauge(
+    'scraper_items_per_second', "Débit moyen du crawl en cours ou du dernier crawl", ('spider',)))
+CRAWLS_RUNNING = REGISTRY.register(Gauge(
+    'scraper_crawls_running', "Crawls en cours dans ce processus"))
+
+
+def record_timing(stats, key, seconds):
+    """Ajoute une durée aux statistiques du crawl (timing/<key>/seconds et timing/<key>/count)"""
+    if stats is not None:
+        stats.inc_value(f'timing/{key}/seconds', seconds)
+        stats.inc_value(f'timing/{key}/count')
+
+
+def _timed(method, name, stats):
+    """Enveloppe process_item pour mesurer sa latence, y compris pour les items écartés (DropItem)"""
+    def observe(start):
+        elapsed = monotonic() - start
+        PIPELINE_SECONDS.observe(elapsed, pipeline=name)
+        record_timing(stats, f'pipeline/{name}', elapsed)
+
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def timed(*args, **kwargs):
+            start = monotonic()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                observe(start)
+    else:
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = monotonic()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                observe(start)
+    return timed
+
+
+def timed_pipeline(cls):
+    """Décorateur de classe de pipeline : l'instance créée par from_crawler mesure la latence de process_item"""
+    from_crawler = cls.from_crawler.__func__
+
+    @functools.wraps(from_crawler)
+    def timed_from_crawler(klass, crawler, *args, **kwargs):
+        pipeline = from_crawler(klass, crawler, *args, **kwargs)
+        if crawler.settings.getbool('METRICS_ENABLED', True):
+            pipeline.process_item = _timed(pipeline.process_item, klass.__name__, crawler.stats)
+        return pipeline
+
+    cls.from_crawler = classmethod(timed_from_crawler)
+    return cls
+
+
+class CrawlMetrics:
+    """Extension qui suit le débit d'items et sauvegarde les statistiques de chaque crawl
+
+    Les statistiques sont écrites dans data/<wiki>_stats.json : statistiques
+    globales du crawl et statistiques propres au wiki (wiki/<nom>/...).
+    """
+
+    def __init__(self, stats, enabled=True):
+        if not enabled:
+            raise NotConfigured
+        self.stats = stats
+        self.started = None
+        self.items = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls(crawler.stats, crawler.settings.getbool('METRICS_ENABLED', True))
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        self.started = monotonic()
+        CRAWLS_RUNNING.inc()
+
+    def item_scraped(self, item, response, spider):
+        self.items += 1
+        ITEMS_TOTAL.inc(wiki=ItemAdapter(item).get('wiki') or spider.name)
+        elapsed = monotonic() - self.started
+        if elapsed > 0:
+            ITEMS_PER_SECOND.set(round(self.items / elapsed, 3), spider=spider.name)
+
+    def spider_closed(self, spider, reason):
+        CRAWLS_RUNNING.inc(-1)
+        elapsed = monotonic() - self.started
+        items_per_second = round(self.items / elapsed, 3) if elapsed > 0 else 0.0
+        ITEMS_PER_SECOND.set(items_per_second, spider=spider.name)
+        self.stats.set_value('items_per_second', items_per_second)
+
+        stats = {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in self.stats.get_stats().items()
+        }
+        for target in getattr(spider, 'wikis', {}).values():
+            prefix = f'wiki/{target.wiki_name}/'
+            path = os.path.join(spider.data_dir, f'{target.wiki_name}{STATS_SUFFIX}')
+            try:
+                atomic_write_json(path, {
+                    'job_id': getattr(spider, 'job_id', None),
+                    'wiki_name': target.wiki_name,
+                    'reason': reason,
+                    'stats': {k: v for k, v in stats.items() if not k.startswith('wiki/')},
+                    'wiki_stats': {k[len(prefix):]: v for k, v in stats.items() if k.startswith(prefix)},
+                })
+            except (OSError, TypeError) as e:
+                logger.error(f"Impossible d'écrire {path}: {e}")
@@ -3,11 +3,19 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import monotonic
+
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from .incremental import content_hash
+from .metrics import CALLBACK_SECONDS, DOWNLOAD_SECONDS, record_timing
+
 
 class ScraperSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -101,3 +109,281 @@ class ScraperDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class CrawlBudgetMiddleware:
+    """Abandonne les requêtes d'un wiki dont la limite de personnages est atteinte
+
+    Les pages déjà dans la file du scheduler quand le quota est rempli ne
+    sont pas téléchargées (voir CrawlBudget pour celles encore en réserve).
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('CRAWL_BUDGET_ENABLED'):
+            raise NotConfigured
+        return cls(crawler.stats)
+
+    def process_request(self, request, spider):
+        target = getattr(spider, 'wikis', {}).get(request.meta.get('wiki'))
+        if target is not None and target.limit_filled:
+            self.stats.inc_value('budget/ignored_requests')
+            raise IgnoreRequest(f"Limite de personnages atteinte pour {target.wiki_name}")
+        return None
+
+
+class IncrementalRecrawlMiddleware:
+    """Envoie des requêtes conditionnelles pour les pages déjà crawlées
+
+    Actif uniquement quand le spider est lancé avec `-a incremental=1`.
+    Les pages de personnages inchangées (304 ou même contenu) sont
+    marquées avec `recrawl_unchanged` pour que le spider réutilise
+    l'item précédent au lieu de reparser la page.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def recrawl_state(self, request, spider):
+        """État incrémental du wiki de la requête, ou None"""
+        target = getattr(spider, 'wikis', {}).get(request.meta.get('wiki'))
+        return target.recrawl_state if target is not None else None
+
+    def process_request(self, request, spider):
+        state = self.recrawl_state(request, spider)
+        if state is None:
+            return None
+
+        # Le cache HTTP servirait des pages périmées : on revalide auprès du wiki
+        request.meta['dont_cache'] = True
+
+        key = request.meta.get('recrawl_key')
+        if not key:
+            return None
+        entry = state.get(key)
+        if entry.get('etag'):
+            request.headers.setdefault('If-None-Match', entry['etag'])
+        if entry.get('last_modified'):
+            request.headers.setdefault('If-Modified-Since', entry['last_modified'])
+        return None
+
+    def process_response(self, request, response, spider):
+        state = self.recrawl_state(request, spider)
+        key = request.meta.get('recrawl_key')
+        if state is None or not key:
+            return response
+
+        if response.status == 304:
+            request.meta['recrawl_unchanged'] = True
+            self.stats.inc_value('incremental/not_modified')
+            return response
+
+        if response.status == 200:
+            digest = content_hash(response.body)
+            unchanged = state.get(key).get('hash') == digest
+            request.meta['recrawl_unchanged'] = unchanged
+            self.stats.inc_value(
+                'incremental/same_content' if unchanged else 'incremental/changed'
+            )
+            state.update(
+                key,
+                etag=response.headers.get('ETag', b'').decode('latin-1') or None,
+                last_modified=response.headers.get('Last-Modified', b'').decode('latin-1') or None,
+                hash=digest,
+            )
+        return response
+
+
+class AdaptiveThrottleMiddleware:
+    """Ajuste la concurrence et le délai de chaque hôte selon la latence et les erreurs
+
+    Augmentation additive tant que l'hôte répond vite, réduction
+    multiplicative sur 429/503 ou erreur réseau, et respect du header
+    Retry-After. L'état courant de chaque hôte est publié dans les stats
+    sous `adaptive/<hôte>/...`.
+    """
+
+    THROTTLE_CODES = (429, 503)
+    # Débit ajouté après chaque réponse rapide (requêtes/seconde)
+    RATE_STEP = 0.2
+    # En dessous de ce délai, la concurrence prend le relais
+    MIN_DELAY = 0.05
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_THROTTLE_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.target_latency = settings.getfloat('ADAPTIVE_TARGET_LATENCY', 1.0)
+        self.min_concurrency = settings.getint('ADAPTIVE_MIN_CONCURRENCY', 1)
+        self.max_concurrency = settings.getint('ADAPTIVE_MAX_CONCURRENCY', 16)
+        self.max_delay = settings.getfloat('ADAPTIVE_MAX_DELAY', 60.0)
+        self.hosts = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_response(self, request, response, spider):
+        latency = request.meta.get('download_latency')
+        # Les réponses du cache HTTP ne disent rien de l'hôte
+        if latency is None or 'cached' in response.flags:
+            return response
+
+        slot_key, slot = self._slot(request)
+        if slot is None:
+            return response
+
+        state = self.hosts.setdefault(slot_key, {'latency': latency, 'successes': 0})
+        state['latency'] = 0.8 * state['latency'] + 0.2 * latency
+
+        if response.status in self.THROTTLE_CODES:
+            self._back_off(slot, state, self._retry_after(response))
+        elif state['latency'] > 2 * self.target_latency:
+            # Hôte lent : réduire doucement la concurrence et espacer les requêtes
+            slot.concurrency = max(self.min_concurrency, slot.concurrency - 1)
+            slot.delay = min(self.max_delay, max(slot.delay, state['latency'] / max(slot.concurrency, 1)))
+            state['successes'] = 0
+        elif state['latency'] <= self.target_latency:
+            # Hôte rapide : supprimer d'abord le délai, puis ajouter une
+            # requête parallèle par fenêtre complète de réponses rapides
+            if slot.delay > 0:
+                # Augmentation additive du débit (1 / délai)
+                delay = 1.0 / (1.0 / slot.delay + self.RATE_STEP)
+                slot.delay = delay if delay > self.MIN_DELAY else 0.0
+            else:
+                state['successes'] += 1
+                if state['successes'] >= slot.concurrency:
+                    state['successes'] = 0
+                    slot.concurrency = min(self.max_concurrency, slot.concurrency + 1)
+
+        self._publish(slot_key, slot, state)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        slot_key, slot = self._slot(request)
+        if slot is not None:
+            state = self.hosts.setdefault(slot_key, {'latency': self.target_latency, 'successes': 0})
+            self._back_off(slot, state, None)
+            self._publish(slot_key, slot, state)
+        return None
+
+    def _slot(self, request):
+        key = request.meta.get('download_slot')
+        return key, self.crawler.engine.downloader.slots.get(key)
+
+    def _back_off(self, slot, state, retry_after):
+        state['successes'] = 0
+        slot.concurrency = max(self.min_concurrency, slot.concurrency // 2)
+        delay = max(slot.delay * 1.5, 0.25)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+            self.stats.inc_value('adaptive/retry_after')
+        slot.delay = min(self.max_delay, delay)
+        self.stats.inc_value('adaptive/backoff')
+
+    def _retry_after(self, response):
+        """Délai demandé par le header Retry-After, en secondes"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        value = value.decode('latin-1').strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+    def _publish(self, slot_key, slot, state):
+        self.stats.set_value(f'adaptive/{slot_key}/concurrency', slot.concurrency)
+        self.stats.set_value(f'adaptive/{slot_key}/delay', round(slot.delay, 3))
+        self.stats.set_value(f'adaptive/{slot_key}/latency', round(state['latency'], 3))
+
+
+def _callback_name(response, spider):
+    callback = response.request.callback if response.request is not None else None
+    return getattr(callback, '__name__', None) or 'parse'
+
+
+class CallbackTimingMiddleware:
+    """Mesure le temps passé dans chaque callback du spider (scraper_callback_seconds)
+
+    Placé au plus près du spider, il ne compte que le temps passé à
+    produire les résultats du callback, pas celui des autres middlewares.
+    """
+
+    def __init__(self, stats=None):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('METRICS_ENABLED', True):
+            raise NotConfigured
+        return cls(crawler.stats)
+
+    def process_spider_output(self, response, result, spider):
+        elapsed = 0.0
+        iterator = iter(result)
+        try:
+            while True:
+                start = monotonic()
+                try:
+                    output = next(iterator)
+                except StopIteration:
+                    elapsed += monotonic() - start
+                    break
+                elapsed += monotonic() - start
+                yield output
+        finally:
+            self._observe(elapsed, _callback_name(response, spider))
+
+    async def process_spider_output_async(self, response, result, spider):
+        elapsed = 0.0
+        iterator = result.__aiter__()
+        try:
+            while True:
+                start = monotonic()
+                try:
+                    output = await iterator.__anext__()
+                except StopAsyncIteration:
+                    elapsed += monotonic() - start
+                    break
+                elapsed += monotonic() - start
+                yield output
+        finally:
+            self._observe(elapsed, _callback_name(response, spider))
+
+    def _observe(self, elapsed, callback):
+        CALLBACK_SECONDS.observe(elapsed, callback=callback)
+        record_timing(self.stats, f'callback/{callback}', elapsed)
+
+
+class DownloadMetricsMiddleware:
+    """Mesure la latence des téléchargements par statut HTTP (scraper_download_seconds)"""
+
+    def __init__(self, stats=None):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('METRICS_ENABLED', True):
+            raise NotConfigured
+        return cls(crawler.stats)
+
+    def process_response(self, request, response, spider):
+        latency = request.meta.get('download_latency')
+        # Les réponses du cache HTTP n'ont pas été téléchargées
+        if latency is not None and 'cached' not in response.flags:
+            DOWNLOAD_SECONDS.observe(latency, status=response.status)
+            record_timing(self.stats, f'download/{response.status}', latency)
+        return response
@@ -5,116 +5,410 @@
 
 
 # useful for handling different item types with a single interface
+import asyncio
 import scrapy
 from scrapy.exceptions import DropItem
 from urllib.parse import urlparse
-import aiohttp
-import asyncio
 import logging
+import os
 from itemadapter import ItemAdapter
-from cachetools import TTLCache
-from concurrent.futures import ThreadPoolExecutor
 import re
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+from .catalog import WikiCatalog
+from .dedupe import ScalableBloomFilter, SeenFilter, canonical_url
+from .images import ImageCache, ImageValidator, is_valid
+from .metrics import record_timing, timed_pipeline
+from .database import CharacterDatabase
+from .storage import JsonLinesWriter, atomic_write_json
+from .thumbnails import ThumbnailError, ThumbnailStore
+
 
+class SurplusItem(DropItem):
+    """Personnage en trop : la limite de son wiki est déjà remplie"""
 
 class ScraperPipeline:
     def process_item(self, item, spider):
         return item
 
-class ValidationPipeline:
-    """Pipeline pour valider les données de base"""
+class Stage:
+    """Étape du traitement des items : `check` nettoie ou vérifie un item et lève DropItem pour l'écarter"""
     
-    def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
+    name = None
+    
+    def open(self, spider):
+        pass
+        
+    async def close(self):
+        pass
+        
+    def check(self, adapter):
+        # Étape sans vérification item par item (voir run pour les vérifications par lot)
+        pass
+        
+    async def run(self, entries, drop):
+        """Applique l'étape à un lot d'entrées (item, adapter, future) et retourne celles gardées"""
+        kept = []
+        for entry in entries:
+            try:
+                self.check(entry[1])
+            except DropItem as e:
+                drop(entry, self, e)
+                continue
+            kept.append(entry)
+        return kept
+
+class CleaningStage(Stage):
+    """Nettoyage du nom et des URLs, avant les étapes qui en dépendent"""
+    
+    name = 'clean'
+    
+    def __init__(self):
+        # Compiler les expressions régulières une seule fois
+        self.character_suffix = re.compile(r'\s*\(Character\)\s*$')
+        self.url_params = re.compile(r'\?.*$')
+        self.clean_image_url = None
+        
+    def open(self, spider):
+        self.clean_image_url = spider.clean_image_url
+        
+    def check(self, adapter):
+        # Nettoyer le nom
+        if adapter.get('name'):
+            name = adapter['name'].strip()
+            name = self.character_suffix.sub('', name)
+            adapter['name'] = name
         
+        # Nettoyer les URLs
+        if adapter.get('url'):
+            adapter['url'] = self.url_params.sub('', adapter['url'])
+        
+        if adapter.get('image_url'):
+            adapter['image_url'] = self.clean_image_url(adapter['image_url'])
+
+class ValidationStage(Stage):
+    """Validation des données de base"""
+    
+    name = 'validate'
+    
+    def check(self, adapter):
         # Vérifications rapides sans appel réseau
         if not adapter.get('name') or not adapter.get('url'):
-            raise DropItem(f"Item incomplet trouvé: {item}")
+            raise DropItem(f"Item incomplet trouvé: {adapter.asdict()}")
         
         # Validation basique d'URL sans appel réseau
         if not adapter['url'].startswith(('http://', 'https://')):
             raise DropItem(f"URL invalide trouvée: {adapter['url']}")
-            
-        return item
 
-class OptimizedImagePipeline:
-    """Pipeline optimisé pour valider les URLs d'images"""
+class DuplicatesStage(Stage):
+    """Élimination des doublons, sur le nom déjà nettoyé"""
     
-    def __init__(self):
-        self.logger = logging.getLogger(__name__)
-        # Cache pour stocker les résultats de validation d'image (TTL de 1 heure)
-        self.image_cache = TTLCache(maxsize=1000, ttl=3600)
+    name = 'dedupe'
+    
+    def __init__(self, seen=None):
+        # Filtre de Bloom partagé avec le spider, à mémoire bornée
+        self.seen = seen or SeenFilter(ScalableBloomFilter())
+        
+    def check(self, adapter):
+        # Créer une clé unique combinant nom et URL (l'étape de validation peut être désactivée)
+        item_key = f"{adapter.get('name')}::{canonical_url(adapter.get('url') or '')}"
+        
+        if self.seen.add('item', item_key):
+            raise DropItem(f"Doublon trouvé: {adapter.get('name')}")
+
+class ImageStage(Stage):
+    """Validation des URLs d'images, vérifiées sur le réseau lot par lot"""
+    
+    name = 'image'
+    
+    def __init__(self, settings=None, stats=None):
+        self.settings = settings
+        self.stats = stats
+        # Vérification réseau par lots, résultats persistés entre deux crawls
+        self.validator = None
         # Expressions régulières compilées
-        self.image_pattern = re.compile(r'\.(jpg|jpeg|png|gif)$', re.I)
+        self.image_pattern = re.compile(r'\.(jpg|jpeg|png|gif|webp)$', re.I)
         
-    def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
+    def open(self, spider):
+        settings = self.settings
+        if settings is None or not settings.getbool('IMAGE_VALIDATION_ENABLED', True):
+            return
+        cache_path = settings.get('IMAGE_CACHE_PATH') or os.path.join(spider.data_dir, '.state', 'images.sqlite')
+        self.validator = ImageValidator(
+            ImageCache(cache_path, ttl=settings.getint('IMAGE_CACHE_TTL', 7 * 24 * 3600)),
+            concurrency=settings.getint('IMAGE_VALIDATION_CONCURRENCY', 16),
+            per_host=settings.getint('IMAGE_VALIDATION_PER_HOST', 4),
+            timeout=settings.getfloat('IMAGE_VALIDATION_TIMEOUT', 10.0),
+            batch_size=settings.getint('IMAGE_VALIDATION_BATCH_SIZE', 20),
+            batch_delay=settings.getfloat('IMAGE_VALIDATION_BATCH_DELAY', 0.1),
+            stats=self.stats
+        )
+        
+    async def close(self):
+        if self.validator is not None:
+            await self.validator.close()
         
+    def check(self, adapter):
         if not adapter.get('image_url'):
-            raise DropItem(f"Item sans image trouvé: {adapter['name']}")
+            raise DropItem(f"Item sans image trouvé: {adapter.get('name')}")
         
         image_url = adapter['image_url']
         
         # Vérification rapide du format de l'URL
         if not image_url.startswith(('http://', 'https://')):
-            raise DropItem(f"URL d'image invalide pour {adapter['name']}")
+            raise DropItem(f"URL d'image invalide pour {adapter.get('name')}")
         
         # Vérification rapide de l'extension
         if not self.image_pattern.search(image_url):
             # Si pas d'extension, vérifier si c'est une URL de Fandom connue
             if not any(x in image_url.lower() for x in ['/render', '/portrait', '/image']):
-                raise DropItem(f"Format d'image non reconnu pour {adapter['name']}")
+                raise DropItem(f"Format d'image non reconnu pour {adapter.get('name')}")
         
-        # Utiliser le cache si disponible
-        if image_url in self.image_cache:
-            if not self.image_cache[image_url]:
-                raise DropItem(f"Image précédemment invalide pour {adapter['name']}")
-            return item
+    async def run(self, entries, drop):
+        entries = await super().run(entries, drop)
+        if self.validator is None or not entries:
+            return entries
         
-        # Marquer l'image comme valide dans le cache
-        self.image_cache[image_url] = True
-        return item
+        # Toutes les images du lot sont vérifiées ensemble
+        results = await self.validator.check_many([entry[1]['image_url'] for entry in entries])
+        kept = []
+        for entry, result in zip(entries, results):
+            # Serveur injoignable (None) : garder l'item plutôt que de le perdre
+            if result is not None and not is_valid(result):
+                adapter = entry[1]
+                drop(entry, self, DropItem(
+                    f"Image invalide ({result['status']}, {result['content_type']}) pour {adapter.get('name')}"))
+                continue
+            kept.append(entry)
+        return kept
 
-class DuplicatesPipeline:
-    """Pipeline pour éliminer les doublons"""
+@timed_pipeline
+class ProcessingPipeline:
+    """Pipeline qui nettoie, valide, dédoublonne et vérifie les images des items par micro-lots
+
+    Les items sont regroupés jusqu'à PROCESSING_BATCH_SIZE ou pendant
+    PROCESSING_BATCH_DELAY, puis chaque étape de PROCESSING_STAGES passe
+    sur le lot, toujours dans l'ordre nettoyage, validation, déduplication,
+    images. Les items écartés sont comptés par étape
+    (processing/dropped/<étape>).
+    """
     
-    def __init__(self):
-        self.seen = set()
+    STAGES = ('clean', 'validate', 'dedupe', 'image')
+    
+    def __init__(self, stages, batch_size=50, batch_delay=0.01, stats=None):
+        self.logger = logging.getLogger(__name__)
+        self.stages = stages
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.stats = stats
+        self.batch = []
+        self.flush_handle = None
+        self.tasks = set()
         
-    def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        enabled = settings.getlist('PROCESSING_STAGES', list(cls.STAGES))
+        unknown = set(enabled) - set(cls.STAGES)
+        if unknown:
+            raise ValueError(f"Étapes de traitement inconnues : {', '.join(sorted(unknown))}")
+        factories = {
+            'clean': CleaningStage,
+            'validate': ValidationStage,
+            'dedupe': lambda: DuplicatesStage(SeenFilter.from_crawler(crawler)),
+            'image': lambda: ImageStage(settings, crawler.stats),
+        }
+        # L'ordre d'exécution ne dépend pas de l'ordre de la liste
+        return cls(
+            [factories[name]() for name in cls.STAGES if name in enabled],
+            batch_size=settings.getint('PROCESSING_BATCH_SIZE', 50),
+            batch_delay=settings.getfloat('PROCESSING_BATCH_DELAY', 0.01),
+            stats=crawler.stats
+        )
         
-        # Créer une clé unique combinant nom et URL
-        item_key = f"{adapter['name']}::{adapter['url']}"
+    def open_spider(self, spider):
+        for stage in self.stages:
+            stage.open(spider)
         
-        if item_key in self.seen:
-            raise DropItem(f"Doublon trouvé: {adapter['name']}")
-            
-        self.seen.add(item_key)
-        return item
+    async def close_spider(self, spider):
+        self._flush()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        for stage in self.stages:
+            await stage.close()
+        
+    async def process_item(self, item, spider):
+        future = asyncio.get_running_loop().create_future()
+        self.batch.append((item, ItemAdapter(item), future))
+        if len(self.batch) >= self.batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.batch_delay, self._flush)
+        return await future
+        
+    def _flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.batch = self.batch, []
+        if batch:
+            task = asyncio.ensure_future(self._process_batch(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        
+    def _inc(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(f'processing/{key}', count)
+        
+    def _drop(self, entry, stage, error):
+        self._inc(f'dropped/{stage.name}')
+        entry[2].set_exception(error)
+        
+    async def _process_batch(self, entries):
+        self._inc('batches')
+        self._inc('items', len(entries))
+        try:
+            for stage in self.stages:
+                start = monotonic()
+                entries = await stage.run(entries, self._drop)
+                record_timing(self.stats, f'processing/{stage.name}', monotonic() - start)
+        except Exception as e:
+            # Une erreur inattendue ne doit pas bloquer les items du lot
+            self.logger.error(f"Erreur pendant le traitement d'un lot: {e!r}")
+            for entry in entries:
+                if not entry[2].done():
+                    entry[2].set_exception(e)
+            return
+        for item, _, future in entries:
+            future.set_result(item)
 
-class CleaningPipeline:
-    """Pipeline pour nettoyer les données"""
+@timed_pipeline
+class ThumbnailWarmPipeline:
+    """Pipeline qui prépare les miniatures servies par /img/<wiki>/<id> pendant le crawl"""
     
-    def __init__(self):
-        # Compiler les expressions régulières une seule fois
-        self.character_suffix = re.compile(r'\s*\(Character\)\s*$')
-        self.url_params = re.compile(r'\?.*$')
+    def __init__(self, settings=None, stats=None):
+        self.logger = logging.getLogger(__name__)
+        self.settings = settings
+        self.stats = stats
+        self.store = None
+        self.executor = None
+        self.pending = set()
         
-    def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings, crawler.stats)
         
-        # Nettoyer le nom
-        if adapter.get('name'):
-            name = adapter['name'].strip()
-            name = self.character_suffix.sub('', name)
-            adapter['name'] = name
+    def open_spider(self, spider):
+        settings = self.settings
+        if settings is None or not settings.getbool('THUMBNAIL_WARM_ENABLED', False):
+            return
+        directory = settings.get('THUMBNAIL_CACHE_DIR') or os.path.join(spider.data_dir, '.state', 'thumbnails')
+        self.store = ThumbnailStore(directory, max_bytes=settings.getint('THUMBNAIL_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+        self.widths = [int(w) for w in settings.getlist('THUMBNAIL_WARM_WIDTHS', [240])]
+        # Téléchargements et réductions hors du reactor
+        self.executor = ThreadPoolExecutor(max_workers=settings.getint('THUMBNAIL_WARM_CONCURRENCY', 4))
         
-        # Nettoyer les URLs
-        if adapter.get('url'):
-            adapter['url'] = self.url_params.sub('', adapter['url'])
+    def _warm(self, url):
+        try:
+            self.store.warm(url, self.widths)
+        except ThumbnailError as e:
+            self.logger.debug(f"Miniature non préparée: {e}")
+            if self.stats is not None:
+                self.stats.inc_value('thumbnails/errors')
+            return
+        if self.stats is not None:
+            self.stats.inc_value('thumbnails/warmed')
         
-        if adapter.get('image_url'):
-            adapter['image_url'] = spider.clean_image_url(adapter['image_url'])
-            
+    def process_item(self, item, spider):
+        image_url = ItemAdapter(item).get('image_url')
+        if self.executor is not None and image_url:
+            # L'item n'attend pas : la miniature est préparée en arrière-plan
+            future = self.executor.submit(self._warm, image_url)
+            self.pending.add(future)
+            future.add_done_callback(self.pending.discard)
+        return item
+        
+    async def close_spider(self, spider):
+        if self.executor is None:
+            return
+        if self.pending:
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in list(self.pending)), return_exceptions=True)
+        self.executor.shutdown(wait=False)
+
+@timed_pipeline
+class StreamingStoragePipeline:
+    """Pipeline qui ajoute chaque item une seule fois dans le journal JSON Lines de son wiki
+
+    À la fermeture, les items de chaque wiki sont écrits dans la base SQLite
+    des personnages et exportés dans data/<wiki>_characters.json.
+    """
+
+    def __init__(self, fsync_batch=20, stats=None, resume=False):
+        self.logger = logging.getLogger(__name__)
+        self.fsync_batch = fsync_batch
+        self.stats = stats
+        # Avec JOBDIR, un crawl interrompu reprend son journal au lieu de le vider
+        self.resume = resume
+        self.writers = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            fsync_batch=crawler.settings.getint('STORAGE_FSYNC_BATCH', 20),
+            stats=crawler.stats,
+            resume=bool(crawler.settings.get('JOBDIR'))
+        )
+
+    def open_spider(self, spider):
+        if spider.frontier is not None:
+            # Crawl partagé : les items de tous les processus sont rassemblés dans la frontière
+            return
+        for target in spider.wikis.values():
+            journal_path = f"{target.json_file}.journal"
+            writer = JsonLinesWriter(journal_path, fsync_batch=self.fsync_batch, append=self.resume)
+            if writer.count:
+                self.logger.info(f"Reprise de {target.wiki_name} : {writer.count} items déjà journalisés")
+                target.character_count = target.scraped_count = writer.count
+            self.writers[target.wiki_name] = writer
+
+    def process_item(self, item, spider):
+        data = ItemAdapter(item).asdict()
+        target = spider.wikis[data.pop('wiki')]
+        if spider.frontier is not None:
+            stored = spider.frontier.count_items(target.wiki_name)
+        else:
+            stored = self.writers[target.wiki_name].count
+        if stored >= target.character_limit:
+            # Les pages en cours quand la limite est atteinte sont lues quand même, au cas
+            # où des personnages seraient écartés : ceux qui n'ont pas servi sont abandonnés ici
+            if self.stats is not None:
+                self.stats.inc_value('budget/surplus_items')
+            raise SurplusItem(f"Limite de {target.character_limit} personnages déjà atteinte pour {target.wiki_name}")
+        if spider.frontier is not None:
+            spider.frontier.add_item(target.wiki_name, data)
+            # La limite porte sur les items trouvés par tous les processus
+            target.character_count = max(target.character_count, spider.frontier.count_items(target.wiki_name))
+        else:
+            self.writers[target.wiki_name].write(data)
+        if self.stats is not None:
+            self.stats.inc_value(target.stat_key('item_scraped_count'))
         return item
+
+    def close_spider(self, spider):
+        catalog = WikiCatalog(spider.data_dir)
+        database = CharacterDatabase.for_data_dir(spider.data_dir)
+        for target in spider.wikis.values():
+            if spider.frontier is not None:
+                # Le dernier processus à terminer écrit le fichier complet
+                items = spider.frontier.items(target.wiki_name)[:target.character_limit]
+                atomic_write_json(target.json_file, items)
+            else:
+                # Le fichier final n'est remplacé qu'une fois complet ; avec
+                # JOBDIR le journal est gardé pour une éventuelle reprise
+                items = self.writers.pop(target.wiki_name).finalize(target.json_file, keep_journal=self.resume)
+            stat = os.stat(target.json_file)
+            database.replace_wiki(target.wiki_name, items, source=(stat.st_mtime_ns, stat.st_size))
+            self.logger.info(f"{len(items)} items sauvegardés dans {target.json_file}")
+            catalog.record(target.wiki_name, items)
+        database.close()
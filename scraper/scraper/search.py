@@ -0,0 +1,139 @@
+# Index de recherche des personnages sur tous les wikis
+#
+# Les champs texte sont découpés en mots ; chaque mot du vocabulaire est
+# indexé par ses trigrammes, ce qui permet de retrouver les mots proches
+# d'un mot de la requête (préfixe ou faute de frappe) sans parcourir les
+# personnages. Un wiki peut être réindexé seul à la fin de son crawl.
+
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+# Champs indexés et leur poids dans le score
+SEARCH_FIELDS = {
+    'name': 3.0,
+    'type': 1.0,
+    'role': 1.0,
+    'class_name': 1.0,
+    'origin': 1.0,
+}
+
+# Similarité minimale entre un mot de la requête et un mot indexé
+MIN_SIMILARITY = 0.4
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Minuscules sans accents"""
+    text = unicodedata.normalize('NFKD', str(text).casefold())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return WORD_PATTERN.findall(normalize(text))
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Index inversé par trigrammes, mis à jour wiki par wiki"""
+
+    def __init__(self):
+        self.docs = {}          # doc_id -> personnage indexé
+        self.wiki_docs = {}     # wiki -> ids des documents
+        self.versions = {}      # wiki -> version des données indexées
+        self.postings = {}      # mot -> {doc_id: poids}
+        self.grams = {}         # trigramme -> mots
+        self.next_id = 0
+        self.lock = threading.RLock()
+
+    def update_wiki(self, wiki_name, characters, version=None):
+        """Remplace les documents d'un wiki sans toucher aux autres"""
+        with self.lock:
+            self.remove_wiki(wiki_name)
+            doc_ids = []
+            for character in characters:
+                doc_id = self.next_id
+                self.next_id += 1
+                self.docs[doc_id] = dict(character, wiki=wiki_name)
+                doc_ids.append(doc_id)
+                for field, weight in SEARCH_FIELDS.items():
+                    for word in tokenize(character.get(field) or ''):
+                        self._add_posting(word, doc_id, weight)
+            self.wiki_docs[wiki_name] = doc_ids
+            self.versions[wiki_name] = version
+
+    def remove_wiki(self, wiki_name):
+        with self.lock:
+            for doc_id in self.wiki_docs.pop(wiki_name, []):
+                character = self.docs.pop(doc_id)
+                for field in SEARCH_FIELDS:
+                    for word in tokenize(character.get(field) or ''):
+                        self._remove_posting(word, doc_id)
+            self.versions.pop(wiki_name, None)
+
+    def _add_posting(self, word, doc_id, weight):
+        postings = self.postings.get(word)
+        if postings is None:
+            postings = self.postings[word] = {}
+            for gram in trigrams(word):
+                self.grams.setdefault(gram, set()).add(word)
+        postings[doc_id] = max(weight, postings.get(doc_id, 0))
+
+    def _remove_posting(self, word, doc_id):
+        postings = self.postings.get(word)
+        if postings is None:
+            return
+        postings.pop(doc_id, None)
+        if not postings:
+            del self.postings[word]
+            for gram in trigrams(word):
+                words = self.grams.get(gram)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del self.grams[gram]
+
+    def _similar_words(self, word):
+        """Mots indexés proches de `word`, avec leur similarité"""
+        query_grams = trigrams(word)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.grams.get(gram, ()))
+        similar = {}
+        for candidate, count in shared.items():
+            if candidate.startswith(word):
+                similarity = 1.0
+            else:
+                # Coefficient de Dice entre les deux ensembles de trigrammes
+                similarity = 2 * count / (len(query_grams) + len(trigrams(candidate)))
+            if similarity >= MIN_SIMILARITY:
+                similar[candidate] = similarity
+        return similar
+
+    def search(self, query, limit=20, offset=0, wiki=None):
+        """Retourne (nombre total de résultats, page de résultats classés)"""
+        with self.lock:
+            scores = Counter()
+            for word in set(tokenize(query)):
+                best = {}
+                for candidate, similarity in self._similar_words(word).items():
+                    for doc_id, weight in self.postings[candidate].items():
+                        score = similarity * weight
+                        if score > best.get(doc_id, 0):
+                            best[doc_id] = score
+                scores.update(best)
+
+            if wiki is not None:
+                scores = Counter({d: s for d, s in scores.items() if self.docs[d]['wiki'] == wiki})
+            ranked = sorted(scores.items(), key=lambda ds: (-ds[1], normalize(self.docs[ds[0]].get('name', ''))))
+            page = [
+                {'score': round(score, 3), **self.docs[doc_id]}
+                for doc_id, score in ranked[offset:offset + limit]
+            ]
+            return len(ranked), page
@@ -5,6 +5,7 @@ BOT_NAME = 'scraper'
 
 SPIDER_MODULES = ['scraper.spiders']
 NEWSPIDER_MODULE = 'scraper.spiders'
+COMMANDS_MODULE = 'scraper.commands'
 
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
@@ -13,34 +14,127 @@ USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTM
 ROBOTSTXT_OBEY = True
 
 # Configure maximum concurrent requests performing at the same time to the same domain
+# (valeurs de départ, ajustées ensuite par AdaptiveThrottleMiddleware)
 CONCURRENT_REQUESTS = 16
 CONCURRENT_REQUESTS_PER_DOMAIN = 8
 
+# Plusieurs wikis crawlés ensemble (-a fandom_urls=...) : le planificateur
+# sert d'abord les hôtes qui ont le moins de téléchargements en cours, pour
+# partager équitablement CONCURRENT_REQUESTS entre les wikis
+SCHEDULER_PRIORITY_QUEUE = 'scrapy.pqueues.DownloaderAwarePriorityQueue'
+
+# Déduplication des requêtes, liens et items par un filtre de Bloom à mémoire
+# bornée, sauvegardé dans JOBDIR pour reprendre un crawl interrompu
+DUPEFILTER_CLASS = 'scraper.dedupe.BloomDupeFilter'
+DEDUPE_CAPACITY = 200000
+DEDUPE_ERROR_RATE = 0.0001
+
+# Crawl réparti entre plusieurs processus (-s SCHEDULER=scraper.frontier.SharedScheduler) :
+# file d'attente, empreintes vues et items partagés dans un fichier SQLite
+# (par défaut .scrapy/frontier/frontier.sqlite)
+FRONTIER_PATH = None
+FRONTIER_DUPEFILTER_CLASS = 'scraper.frontier.SqliteDupeFilter'
+FRONTIER_WORKER_TIMEOUT = 60.0
+
 # Configure a delay for requests for the same website
 DOWNLOAD_DELAY = 0.5
 
+# Concurrence et délai adaptés par hôte selon la latence, les 429/503 et Retry-After
+ADAPTIVE_THROTTLE_ENABLED = True
+ADAPTIVE_TARGET_LATENCY = 1.0
+ADAPTIVE_MIN_CONCURRENCY = 1
+ADAPTIVE_MAX_CONCURRENCY = 16
+ADAPTIVE_MAX_DELAY = 60.0
+
+# Découverte de la catégorie des personnages : liens candidats notés et suivis par
+# priorité depuis la page d'accueil, jusqu'à la profondeur donnée (1 : catégorie
+# d'entrée, 2 : ses sous-catégories) ; la catégorie qui a fonctionné est retenue
+# par wiki dans data/.state/discovery.json
+CATEGORY_DISCOVERY_MAX_DEPTH = 2
+CATEGORY_DISCOVERY_CANDIDATES = 3
+
+# Pages de personnages demandées au rythme du quota restant (character_limit),
+# d'après la proportion observée de pages qui donnent un personnage ; les
+# requêtes en file sont abandonnées une fois la limite atteinte
+CRAWL_BUDGET_ENABLED = True
+# Pages demandées en plus de l'estimation (1.2 = 20 % de marge)
+CRAWL_BUDGET_SLACK = 1.2
+
 # Enable or disable downloader middlewares
 DOWNLOADER_MIDDLEWARES = {
+    # Avant tout le reste : les requêtes d'un wiki complet ne partent pas
+    'scraper.middlewares.CrawlBudgetMiddleware': 50,
     'scrapy.downloadermiddlewares.retry.RetryMiddleware': 90,
+    # Avant le cache (900) pour les requêtes, après la décompression (810) pour les réponses
+    'scraper.middlewares.IncrementalRecrawlMiddleware': 800,
     'scrapy.downloadermiddlewares.httpcompression.HttpCompressionMiddleware': 810,
+    # Après le cache (900) pour voir les réponses du réseau en premier
+    'scraper.middlewares.AdaptiveThrottleMiddleware': 950,
+    # Au plus près du réseau : latence de chaque téléchargement, avant les retries
+    'scraper.middlewares.DownloadMetricsMiddleware': 960,
+}
+
+# Mesures exposées au format Prometheus par /metrics (scraper/metrics.py) ;
+# les statistiques de chaque crawl sont écrites dans data/<wiki>_stats.json
+METRICS_ENABLED = True
+SPIDER_MIDDLEWARES = {
+    # Au plus près du spider : temps passé dans chaque callback
+    'scraper.middlewares.CallbackTimingMiddleware': 1000,
+}
+EXTENSIONS = {
+    'scraper.metrics.CrawlMetrics': 500,
 }
 
-# Configure JSON export
+# Configure data storage
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(os.path.dirname(current_dir))
 data_dir = os.path.join(project_root, 'data')
 os.makedirs(data_dir, exist_ok=True)
 
-FEEDS = {
-    os.path.join(data_dir, '%(name)s_characters.json'): {
-        'format': 'json',
-        'encoding': 'utf8',
-        'store_empty': False,
-        'indent': 2,
-        'overwrite': True,
-    }
+# Les items sont ajoutés en JSON Lines puis le fichier
+# data/<wiki>_characters.json est écrit atomiquement à la fermeture
+ITEM_PIPELINES = {
+    'scraper.pipelines.ProcessingPipeline': 300,
+    'scraper.pipelines.ThumbnailWarmPipeline': 800,
+    'scraper.pipelines.StreamingStoragePipeline': 900,
 }
 
+# Traitement des items par micro-lots, en une passe : nettoyage, validation,
+# déduplication puis vérification des images. Retirer une étape de la liste
+# la désactive ; l'ordre d'exécution reste toujours celui-ci.
+PROCESSING_STAGES = ['clean', 'validate', 'dedupe', 'image']
+PROCESSING_BATCH_SIZE = 50
+# Attente maximale (secondes) avant de traiter un lot incomplet
+PROCESSING_BATCH_DELAY = 0.01
+
+# Vérification réseau des images (GET partiel par lots, connexions keep-alive)
+IMAGE_VALIDATION_ENABLED = True
+IMAGE_VALIDATION_CONCURRENCY = 16
+IMAGE_VALIDATION_PER_HOST = 4
+IMAGE_VALIDATION_TIMEOUT = 10.0
+IMAGE_VALIDATION_BATCH_SIZE = 20
+# Attente maximale (secondes) avant de vérifier un lot incomplet
+IMAGE_VALIDATION_BATCH_DELAY = 0.1
+# Cache des résultats (par défaut data/.state/images.sqlite)
+IMAGE_CACHE_PATH = None
+IMAGE_CACHE_TTL = 7 * 24 * 3600
+
+# Préparation des miniatures servies par /img/<wiki>/<id> (désactivée par
+# défaut : chaque image est alors téléchargée en entier pendant le crawl)
+THUMBNAIL_WARM_ENABLED = False
+THUMBNAIL_WARM_WIDTHS = [240]
+THUMBNAIL_WARM_CONCURRENCY = 4
+# Cache partagé avec le serveur (par défaut data/.state/thumbnails)
+THUMBNAIL_CACHE_DIR = None
+THUMBNAIL_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Nombre d'items écrits entre deux fsync du journal
+STORAGE_FSYNC_BATCH = 20
+
+# Correspondances supplémentaires label/data-source d'infobox -> champ, par wiki
+# ex: {'leagueoflegends': {'class_name': ['position'], 'origin': ['region']}}
+INFOBOX_FIELD_MAPS = {}
+
 # Enable retry on error
 RETRY_ENABLED = True
 RETRY_TIMES = 3
@@ -54,4 +148,8 @@ HTTPCACHE_ENABLED = True
 HTTPCACHE_EXPIRATION_SECS = 0
 HTTPCACHE_DIR = 'httpcache'
 HTTPCACHE_IGNORE_HTTP_CODES = []
-HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+# Un seul fichier SQLite (HTTPCACHE_DIR/cache.sqlite) avec corps compressés ;
+# `scrapy compactcache` évince et récupère l'espace
+HTTPCACHE_STORAGE = 'scraper.httpcache.SqliteCacheStorage'
+HTTPCACHE_SQLITE_MAX_BYTES = 512 * 1024 * 1024
+HTTPCACHE_COMPRESSION_LEVEL = 6
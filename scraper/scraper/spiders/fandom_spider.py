@@ -1,59 +1,313 @@
 import scrapy
+from itemadapter import ItemAdapter
 from ..items import CharacterItem
+from ..pipelines import SurplusItem
 import re
-from urllib.parse import urljoin, urlparse
-from scrapy.exceptions import CloseSpider
-import os
 import json
+from urllib.parse import urljoin, urlencode
+from scrapy import signals
+from scrapy.exceptions import CloseSpider, DontCloseSpider
+import os
+from ..catalog import WikiCatalog
+from ..dedupe import SeenFilter, canonical_url
+from ..discovery import EXACT_SCORE, DiscoveryState, category_candidates, category_score, page_title
+from ..infobox import InfoboxExtractor
+from ..targets import WikiTarget, parse_wiki_list, DEFAULT_CHARACTER_LIMIT
+
+# Nombre maximum de titres par requête à l'API MediaWiki
+API_BATCH_SIZE = 50
 
 class FandomSpider(scrapy.Spider):
     name = 'fandom'
+    # Profondeur maximale depuis la page d'accueil (1 : catégorie d'entrée, 2 : ses sous-catégories)
+    discovery_max_depth = 2
+    # Liens candidats suivis depuis une page sans liste de personnages
+    discovery_candidates = 3
     
-    def __init__(self, fandom_url=None, *args, **kwargs):
+    def __init__(self, fandom_url=None, mode='html', api_url=None, category='Characters',
+                 incremental=False, fandom_urls=None, character_limit=DEFAULT_CHARACTER_LIMIT,
+                 data_dir=None, *args, **kwargs):
         super(FandomSpider, self).__init__(*args, **kwargs)
-        if not fandom_url:
+        # Un wiki (fandom_url) ou plusieurs crawlés ensemble (fandom_urls)
+        wiki_list = parse_wiki_list(fandom_urls) if fandom_urls else []
+        if fandom_url:
+            wiki_list.insert(0, (fandom_url, None))
+        if not wiki_list:
             raise ValueError("L'URL du wiki Fandom est requise")
-            
-        # Nettoyer l'URL fournie
-        self.fandom_url = fandom_url.strip()
-        if not self.fandom_url.startswith(('http://', 'https://')):
-            self.fandom_url = 'https://' + self.fandom_url
-            
-        # S'assurer que c'est une URL Fandom
-        if 'fandom.com' not in self.fandom_url:
-            raise ValueError("L'URL doit être une URL Fandom valide")
-            
-        # Extraire le nom du wiki de l'URL
-        parsed_url = urlparse(self.fandom_url)
-        self.wiki_name = parsed_url.netloc.split('.')[0]
-        
-        # Créer le dossier data s'il n'existe pas
-        current_dir = os.path.dirname(os.path.abspath(__file__))  # dossier spiders
-        project_root = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))  # dossier racine
-        self.data_dir = os.path.join(project_root, 'data')
+        if mode not in ('html', 'api'):
+            raise ValueError("Le mode doit être 'html' ou 'api'")
+        
+        # Créer le dossier data s'il n'existe pas (par défaut data/ à la racine du projet)
+        if data_dir is None:
+            current_dir = os.path.dirname(os.path.abspath(__file__))  # dossier spiders
+            project_root = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))  # dossier racine
+            data_dir = os.path.join(project_root, 'data')
+        self.data_dir = data_dir
         os.makedirs(self.data_dir, exist_ok=True)
         
-        # Définir le chemin du fichier JSON
-        self.json_file = os.path.join(self.data_dir, f'{self.wiki_name}_characters.json')
-        print(f"\nLes données seront sauvegardées dans : {self.json_file}")
+        # Mode API : lister la catégorie et lire les pages par lots via api.php
+        self.mode = mode
+        self.category = category
+        
+        # Recrawl incrémental : requêtes conditionnelles et réutilisation des items inchangés
+        self.incremental = str(incremental).lower() in ('1', 'true', 'yes')
+        
+        # Frontière partagée entre processus, définie par SharedScheduler
+        self.frontier = None
+        
+        # Catégorie d'entrée retenue pour chaque wiki lors des crawls précédents
+        self.discovery = DiscoveryState.for_data_dir(self.data_dir)
         
-        self.start_urls = [self.fandom_url]
-        self.visited_urls = set()
-        self.character_count = 0
-        self.character_limit = 50
-        self.items = []  # Liste pour stocker les items avant sauvegarde
+        # État propre à chaque wiki : limite, compteur, fichier de sortie
+        self.wikis = {}
+        for url, limit in wiki_list:
+            target = WikiTarget(
+                url, self.data_dir,
+                character_limit=limit or int(character_limit),
+                # Une URL d'API explicite n'a de sens que pour un seul wiki
+                api_url=api_url if len(wiki_list) == 1 else None,
+                incremental=self.incremental
+            )
+            if target.wiki_name in self.wikis:
+                print(f"\nWiki {target.wiki_name} déjà présent, ignoré : {url}")
+                continue
+            self.wikis[target.wiki_name] = target
+            print(f"\nLes données de {target.wiki_name} seront sauvegardées dans : {target.json_file}")
+            if self.incremental:
+                print(f"Mode incrémental : {len(target.previous_items)} personnages déjà connus")
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        for target in spider.wikis.values():
+            target.budget.slack = crawler.settings.getfloat('CRAWL_BUDGET_SLACK', 1.2)
+        spider.discovery_max_depth = crawler.settings.getint('CATEGORY_DISCOVERY_MAX_DEPTH', cls.discovery_max_depth)
+        spider.discovery_candidates = crawler.settings.getint('CATEGORY_DISCOVERY_CANDIDATES', cls.discovery_candidates)
+        crawler.signals.connect(spider.request_dropped, signal=signals.request_dropped)
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(spider.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(spider.item_dropped, signal=signals.item_dropped)
+        crawler.signals.connect(spider.item_dropped, signal=signals.item_error)
+        return spider
+
+    def api_request(self, target, callback, **params):
+        params.update({'action': 'query', 'format': 'json', 'formatversion': 2})
+        return scrapy.Request(
+            f'{target.api_url}?{urlencode(params)}',
+            callback=callback,
+            meta={'wiki': target.wiki_name}
+        )
+
+    def target_for(self, response):
+        """Wiki auquel appartient une réponse, compté dans ses statistiques"""
+        target = self.wikis[response.meta['wiki']]
+        self.crawler.stats.inc_value(target.stat_key('response_count'))
+        return target
+
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        for target in self.wikis.values():
+            if self.mode == 'api':
+                yield self.category_members_request(target)
+            else:
+                yield self.entry_request(target)
+
+    def entry_request(self, target):
+        """Catégorie retenue lors d'un crawl précédent, sinon la catégorie standard du wiki"""
+        url = self.discovery.get(target.wiki_name)
+        if url:
+            self.crawler.stats.inc_value('discovery/remembered')
+        else:
+            url = target.category_url(self.category)
+        request = self.listing_request(target, url, 1, url, priority=EXACT_SCORE)
+        request.meta['entry_guess'] = True
+        request.errback = self.entry_failed
+        return request
+
+    def listing_request(self, target, url, depth, entry_url, priority=0):
+        """Page de catégorie, avec sa profondeur et la catégorie d'entrée dont elle dépend"""
+        return scrapy.Request(url, self.parse_character_list, priority=priority, meta={
+            'wiki': target.wiki_name,
+            'discovery_depth': depth,
+            'entry_url': entry_url,
+        })
+
+    def entry_failed(self, failure):
+        request = failure.request
+        target = self.wikis.get(request.meta.get('wiki'))
+        if target is not None:
+            yield from self.fall_back(target, request.meta['entry_url'])
 
-    def save_items(self):
-        """Sauvegarde les items dans le fichier JSON"""
-        with open(self.json_file, 'w', encoding='utf-8') as f:
-            json.dump(self.items, f, ensure_ascii=False, indent=2)
-            print(f"\nDonnées sauvegardées dans {self.json_file}")
+    def fall_back(self, target, entry_url):
+        """La catégorie d'entrée n'a rien donné : chercher depuis la page d'accueil"""
+        if self.discovery.get(target.wiki_name) == entry_url:
+            self.discovery.forget(target.wiki_name)
+        self.crawler.stats.inc_value('discovery/fallback')
+        print(f"\nAucun personnage dans {entry_url}, recherche depuis la page d'accueil")
+        yield scrapy.Request(target.fandom_url, dont_filter=True, meta={'wiki': target.wiki_name, 'discovery_depth': 0})
+
+    def discover(self, response, target, depth):
+        """Suit les meilleurs liens candidats de la page, par priorité décroissante"""
+        if depth >= self.discovery_max_depth:
+            return
+        for url, score in category_candidates(response, self.category, self.discovery_candidates):
+            if not self.seen.add('link', canonical_url(url)):
+                print(f"\nSuivant le lien vers la liste des personnages : {url} (note {score})")
+                self.crawler.stats.inc_value('discovery/candidates')
+                yield self.listing_request(target, url, depth + 1, url, priority=score)
+
+    @property
+    def seen(self):
+        """Filtre de déduplication partagé avec le dupefilter et les pipelines"""
+        return SeenFilter.from_crawler(self.crawler)
+
+    def infobox(self, target):
+        """Extracteur d'infobox, avec la table de correspondance propre au wiki si définie"""
+        if target.infobox is None:
+            settings = getattr(self, 'settings', None)
+            field_maps = settings.getdict('INFOBOX_FIELD_MAPS') if settings else {}
+            target.infobox = InfoboxExtractor(field_maps.get(target.wiki_name))
+        return target.infobox
+
+    def add_character(self, target, character):
+        """Compte un personnage pour son wiki et l'associe à ce wiki"""
+        character['wiki'] = target.wiki_name
+        target.character_count += 1
+
+    def log_character(self, target, character):
+        print("\n" + "="*50)
+        print(f"[{target.wiki_name}] Character #{target.character_count}/{target.character_limit}: {character['name']}")
+        print(f"URL: {character['url']}")
+        print(f"Image: {character['image_url']}")
+        if character.get('type'):
+            print(f"Type: {character['type']}")
+        if character.get('role'):
+            print(f"Role: {character['role']}")
+        if character.get('class_name'):
+            print(f"Class: {character['class_name']}")
+        if character.get('origin'):
+            print(f"Origin: {character['origin']}")
+        print("="*50)
+        
+        if target.limit_reached:
+            print(f"\nLimite de {target.character_limit} personnages émis pour {target.wiki_name}, en attente des pipelines")
+
+    def reuse_item(self, target, url):
+        """Réémet l'item du crawl précédent pour une page inchangée"""
+        previous = target.previous_items.get(url)
+        if not previous:
+            return None
+        character = CharacterItem({k: v for k, v in previous.items() if k in CharacterItem.fields})
+        self.add_character(target, character)
+        self.crawler.stats.inc_value('incremental/reused_items')
+        self.crawler.stats.inc_value(target.stat_key('reused_items'))
+        print(f"\n[{target.wiki_name}] Inchangé #{target.character_count}/{target.character_limit}: {character['name']}")
+        return character
 
     def check_limit(self):
-        if self.character_count >= self.character_limit:
-            print(f"\nLimite de {self.character_limit} personnages atteinte. Arrêt du scraping.")
-            self.save_items()  # Sauvegarde finale avant l'arrêt
-            raise CloseSpider(f'Limite de {self.character_limit} personnages atteinte')
+        if all(target.limit_filled for target in self.wikis.values()):
+            print("\nLimite de personnages atteinte pour tous les wikis. Arrêt du scraping.")
+            raise CloseSpider('character_limit')
+
+    @property
+    def budget_enabled(self):
+        """Pages demandées au rythme du quota (sauf en crawl partagé, où la file est commune)"""
+        settings = getattr(self, 'settings', None)
+        return bool(settings and settings.getbool('CRAWL_BUDGET_ENABLED')) and self.frontier is None
+
+    def schedule(self, target):
+        """Requêtes à lancer maintenant pour ce wiki : pages en réserve et page suivante de la catégorie"""
+        stats = self.crawler.stats
+        if target.limit_filled:
+            self.cancel_pages(target)
+            self.check_limit()
+            return
+        if target.limit_reached:
+            # Personnages encore dans les pipelines : la réserve est gardée au cas où ils seraient écartés
+            return
+        
+        if self.budget_enabled:
+            entries, listings = target.budget.release(target.character_limit - target.character_count)
+        else:
+            entries, listings = target.budget.release_all()
+        if entries:
+            stats.inc_value('budget/released_pages', len(entries))
+        
+        if self.mode == 'api':
+            for start in range(0, len(entries), API_BATCH_SIZE):
+                yield self.api_pages_request(
+                    target,
+                    entries[start:start + API_BATCH_SIZE],
+                    # En mode incrémental, le contenu n'est demandé que pour les pages modifiées
+                    with_content=not self.incremental
+                )
+        else:
+            yield from entries
+        yield from listings
+
+    def cancel_pages(self, target):
+        """Abandonne la réserve d'un wiki dont la limite est atteinte"""
+        cancelled = target.budget.cancel()
+        if cancelled:
+            self.crawler.stats.inc_value('budget/cancelled_pages', cancelled)
+            self.crawler.stats.inc_value(target.stat_key('budget_cancelled_pages'), cancelled)
+
+    def page_done(self, target, pages, items=0):
+        """Compte des pages de personnages lues et libère les suivantes"""
+        target.budget.done(pages, items)
+        self.crawler.stats.set_value(target.stat_key('budget_yield_rate'), round(target.budget.yield_rate, 3))
+        yield from self.schedule(target)
+
+    def page_failed(self, failure):
+        """Errback des pages de personnages : la page ne compte plus comme en cours"""
+        request = failure.request
+        target = self.wikis.get(request.meta.get('wiki'))
+        if target is None:
+            return
+        yield from self.page_done(target, request.meta.get('budget_pages', 0))
+
+    def request_dropped(self, request, spider):
+        # Page rejetée par le dupefilter : elle ne sera jamais lue
+        target = self.wikis.get(request.meta.get('wiki'))
+        if target is not None and request.meta.get('budget_pages'):
+            target.budget.done(request.meta['budget_pages'])
+
+    def item_scraped(self, item, response, spider):
+        # Le personnage a passé tous les pipelines : il compte pour la limite
+        target = self.wikis.get(ItemAdapter(item).get('wiki'))
+        if target is None:
+            return
+        target.scraped_count += 1
+        if self.frontier is not None:
+            # La limite porte sur les items gardés par tous les processus
+            target.scraped_count = max(target.scraped_count, self.frontier.count_items(target.wiki_name))
+        if target.limit_filled:
+            self.crawler.stats.set_value(target.stat_key('limit_reached'), True)
+            self.cancel_pages(target)
+
+    def item_dropped(self, item, response, spider, exception=None, **kwargs):
+        # Personnage écarté par un pipeline (ou en erreur) : il ne compte plus, d'autres pages sont demandées
+        target = self.wikis.get(ItemAdapter(item).get('wiki'))
+        if target is None or isinstance(exception, SurplusItem):
+            return
+        target.character_count = max(0, target.character_count - 1)
+        target.budget.dropped()
+        self.crawler.stats.inc_value(target.stat_key('dropped_items'))
+        for request in self.schedule(target):
+            self.crawler.engine.crawl(request)
+
+    def spider_idle(self, spider):
+        # Plus rien en cours : relancer les wikis dont la réserve n'est pas vide
+        scheduled = False
+        for target in self.wikis.values():
+            for request in self.schedule(target):
+                self.crawler.engine.crawl(request)
+                scheduled = True
+        if scheduled:
+            raise DontCloseSpider
 
     def clean_image_url(self, url):
         if not url:
@@ -66,30 +320,28 @@ class FandomSpider(scrapy.Spider):
         return url
 
     def parse(self, response):
+        target = self.target_for(response)
         print("\nExploring page:", response.url)
-        
-        # Cherche le lien vers la catégorie des personnages
-        character_links = response.css('a[href*="Category:Characters"]::attr(href), a[href*="Characters"]::attr(href)').getall()
-        
-        for link in character_links:
-            if link and link not in self.visited_urls:
-                self.visited_urls.add(link)
-                absolute_url = urljoin(response.url, link)
-                print(f"\nSuivant le lien vers la liste des personnages : {link}")
-                yield response.follow(link, self.parse_character_list)
+        if target.entry_category is None:
+            # Cherche le lien vers la catégorie des personnages
+            yield from self.discover(response, target, response.meta.get('discovery_depth', 0))
 
     def parse_character_list(self, response):
+        target = self.target_for(response)
+        depth = response.meta.get('discovery_depth', 1)
+        entry_url = response.meta.get('entry_url', response.url)
+        if target.entry_category not in (None, entry_url):
+            # Une autre catégorie d'entrée a déjà donné des personnages
+            self.crawler.stats.inc_value('discovery/skipped_pages')
+            return
         print("\nExploring character list:", response.url)
         
         # Extraction des personnages depuis la structure spécifique de Fandom
         character_items = response.css('.category-page__member')
         print(f"\nTrouvé {len(character_items)} personnages potentiels")
         
+        characters = 0
         for item in character_items:
-            # Vérifie si on a atteint la limite
-            if self.character_count >= self.character_limit:
-                return
-            
             # Extraction des données de base du personnage
             name = item.css('.category-page__member-link::text').get()
             if not name:
@@ -98,6 +350,13 @@ class FandomSpider(scrapy.Spider):
             char_url = item.css('.category-page__member-link::attr(href)').get()
             if char_url:
                 absolute_url = urljoin(response.url, char_url)
+                if (page_title(absolute_url) or '').lower().startswith('category:'):
+                    # Sous-catégorie, lue quand les pages de la catégorie ne suffisent plus
+                    score = category_score(absolute_url, self.category, subcategory=True)
+                    if score is not None and depth < self.discovery_max_depth:
+                        target.budget.add_listing(self.listing_request(target, absolute_url, depth + 1, entry_url, priority=score))
+                    continue
+                characters += 1
                 # Créer un dictionnaire pour stocker les informations de base
                 character_info = {
                     'name': name.strip(),
@@ -111,86 +370,233 @@ class FandomSpider(scrapy.Spider):
                 if image_url:
                     character_info['image_url'] = self.clean_image_url(image_url)
                 
-                # Suivre le lien vers la page du personnage
-                yield response.follow(
+                # Page du personnage, mise en réserve jusqu'à ce que le quota la demande
+                meta = {'wiki': target.wiki_name, 'budget_pages': 1}
+                if self.incremental:
+                    meta.update({'recrawl_key': absolute_url, 'handle_httpstatus_list': [304]})
+                target.budget.add([response.follow(
                     absolute_url,
                     self.parse_character_page,
-                    cb_kwargs={'character_info': character_info}
-                )
+                    errback=self.page_failed,
+                    cb_kwargs={'character_info': character_info},
+                    meta=meta
+                )])
 
+        if characters and target.entry_category is None:
+            target.entry_category = entry_url
+            self.crawler.stats.set_value(target.stat_key('entry_category'), entry_url)
+            self.crawler.stats.set_value(target.stat_key('entry_depth'), depth)
+        elif not character_items:
+            # Pas une liste de personnages : autre catégorie d'entrée ou liens de la page
+            if response.meta.get('entry_guess'):
+                yield from self.fall_back(target, entry_url)
+            else:
+                yield from self.discover(response, target, depth)
+        
         # Vérifie s'il y a une page suivante
         next_page = response.css('a.category-page__pagination-next::attr(href)').get()
-        if next_page and self.character_count < self.character_limit:
-            yield response.follow(next_page, self.parse_character_list)
+        if next_page and not target.limit_filled:
+            target.budget.add_listing(
+                self.listing_request(target, response.urljoin(next_page), depth, entry_url, priority=response.request.priority)
+            )
+        yield from self.schedule(target)
 
     def parse_character_page(self, response, character_info):
-        if self.character_count >= self.character_limit:
+        target = self.target_for(response)
+        if target.limit_filled:
+            yield from self.page_done(target, 1)
             return
 
+        if response.meta.get('recrawl_unchanged'):
+            character = self.reuse_item(target, character_info['url'])
+            if character:
+                yield character
+                yield from self.page_done(target, 1, 1)
+                return
+            if response.status == 304:
+                # Aucun item précédent : redemander la page sans condition
+                request = response.request.replace(dont_filter=True)
+                request.meta.pop('recrawl_key', None)
+                request.meta.pop('recrawl_unchanged', None)
+                request.headers.pop('If-None-Match', None)
+                request.headers.pop('If-Modified-Since', None)
+                yield request
+                return
+
         character = CharacterItem()
         character.update(character_info)
 
-        # Recherche des informations dans l'infobox ou les sections pertinentes
-        infobox = response.css('.portable-infobox')
-        if infobox:
-            # Parcourir tous les labels de l'infobox
-            labels = infobox.css('.pi-data-label')
-            values = infobox.css('.pi-data-value')
-            for label, value in zip(labels, values):
-                label_text = label.css('::text').get('').strip().lower()
-                value_text = ' '.join(value.css('::text').getall()).strip()
-
-                # Mapper les labels aux champs correspondants
-                if any(keyword in label_text for keyword in ['type', 'espèce', 'race', 'species']):
-                    character['type'] = value_text
-                elif any(keyword in label_text for keyword in ['role', 'occupation', 'métier', 'job']):
-                    character['role'] = value_text
-                elif any(keyword in label_text for keyword in ['class', 'classe']):
-                    character['class_name'] = value_text
-                elif any(keyword in label_text for keyword in ['origin', 'origine', 'from', 'birthplace']):
-                    character['origin'] = value_text
+        # Parcours unique de l'infobox : champs connus, autres attributs et image
+        fields, attributes, infobox_image = self.infobox(target).extract(response)
+        character.update(fields)
+        if attributes:
+            character['attributes'] = attributes
 
         # Si l'image n'a pas été trouvée dans la liste, essayer de la trouver sur la page
         if 'image_url' not in character:
-            image_url = response.css('.pi-image-thumbnail::attr(src)').get()
+            image_url = infobox_image or response.css('.pi-image-thumbnail::attr(src)').get()
             if image_url:
                 character['image_url'] = self.clean_image_url(image_url)
 
-        if 'image_url' in character:
-            self.character_count += 1
+        found = 'image_url' in character
+        if found:
+            self.add_character(target, character)
+            self.log_character(target, character)
+            yield character
+        yield from self.page_done(target, 1, int(found))
+
+    def category_members_request(self, target, cmcontinue=None):
+        params = {
+            'list': 'categorymembers',
+            'cmtitle': f'Category:{self.category}',
+            'cmnamespace': 0,
+            'cmlimit': 500,
+        }
+        if cmcontinue:
+            params['cmcontinue'] = cmcontinue
+        return self.api_request(target, self.parse_api_members, **params)
+
+    def parse_api_members(self, response):
+        """Liste les membres de la catégorie et demande leurs pages par lots de 50"""
+        target = self.target_for(response)
+        data = json.loads(response.text)
+        titles = [member['title'] for member in data.get('query', {}).get('categorymembers', [])]
+        print(f"\nTrouvé {len(titles)} personnages potentiels via l'API")
+        
+        # Les titres sont demandés par lots au rythme du quota (voir schedule)
+        target.budget.add(titles)
+        cmcontinue = data.get('continue', {}).get('cmcontinue')
+        if cmcontinue and not target.limit_filled:
+            target.budget.add_listing(self.category_members_request(target, cmcontinue))
+        yield from self.schedule(target)
+
+    def api_pages_request(self, target, titles, with_content=True):
+        params = {
+            'prop': 'pageimages|info',
+            'piprop': 'original',
+            'inprop': 'url',
+            'titles': '|'.join(titles),
+        }
+        if with_content:
+            params.update({'prop': 'pageimages|info|revisions', 'rvprop': 'content', 'rvslots': 'main'})
+        request = self.api_request(target, self.parse_api_pages, **params)
+        request.meta['with_content'] = with_content
+        request.meta['budget_pages'] = len(titles)
+        request.errback = self.page_failed
+        return request
+
+    def parse_api_pages(self, response):
+        """Construit les personnages d'un lot de pages (image, URL et infobox)"""
+        target = self.target_for(response)
+        data = json.loads(response.text)
+        changed_titles = []
+        found = 0
+        for page in data.get('query', {}).get('pages', []):
+            if target.limit_filled:
+                break
             
-            # Convertir l'item en dictionnaire et l'ajouter à la liste
-            item_dict = dict(character)
-            self.items.append(item_dict)
+            image_url = page.get('original', {}).get('source')
+            if page.get('missing') or not image_url:
+                continue
             
-            # Sauvegarder après chaque nouvel item
-            self.save_items()
+            url = page.get('fullurl') or urljoin(target.fandom_url, '/wiki/' + page['title'].replace(' ', '_'))
+            if not response.meta.get('with_content', True):
+                # Même révision que lors du dernier crawl : réutiliser l'item
+                revid = page.get('lastrevid')
+                if revid and target.recrawl_state.get(url).get('revid') == revid:
+                    character = self.reuse_item(target, url)
+                    if character:
+                        found += 1
+                        yield character
+                        continue
+                changed_titles.append(page['title'])
+                continue
             
-            print("\n" + "="*50)
-            print(f"Character #{self.character_count}/{self.character_limit}: {character['name']}")
-            print(f"URL: {character['url']}")
-            print(f"Image: {character['image_url']}")
-            if character.get('type'):
-                print(f"Type: {character['type']}")
-            if character.get('role'):
-                print(f"Role: {character['role']}")
-            if character.get('class_name'):
-                print(f"Class: {character['class_name']}")
-            if character.get('origin'):
-                print(f"Origin: {character['origin']}")
-            print(f"Sauvegardé dans : {self.json_file}")
-            print("="*50)
+            character = CharacterItem()
+            character['name'] = page['title']
+            character['url'] = url
+            character['image_url'] = self.clean_image_url(image_url)
+            if target.recrawl_state is not None:
+                target.recrawl_state.update(url, revid=page.get('lastrevid'))
             
-            if self.character_count >= self.character_limit:
-                print(f"\nLimite de {self.character_limit} personnages atteinte!")
+            revisions = page.get('revisions') or [{}]
+            wikitext = revisions[0].get('slots', {}).get('main', {}).get('content', '')
+            attributes = {}
+            for label, value in self.parse_infobox_wikitext(wikitext):
+                # Le nom du paramètre du modèle joue le rôle de data-source
+                self.infobox(target).assign(character, attributes, label, value, data_source=label)
+            if attributes:
+                character['attributes'] = attributes
             
+            self.add_character(target, character)
+            self.log_character(target, character)
+            found += 1
             yield character
+        
+        if changed_titles and not target.limit_reached:
+            # Pages modifiées redemandées avec leur contenu : elles restent en cours
+            yield self.api_pages_request(target, changed_titles, with_content=True)
+        elif changed_titles:
+            # Pas encore téléchargées : elles ne seront demandées que si des personnages sont écartés
+            target.budget.requeue(changed_titles)
+        yield from self.page_done(target, response.meta.get('budget_pages', 0) - len(changed_titles), found)
 
-    def closed(self, reason):
-        # Sauvegarde finale
-        self.save_items()
+    def parse_infobox_wikitext(self, wikitext):
+        """Extrait les paires (paramètre, valeur) du premier modèle d'infobox"""
+        match = re.search(r'\{\{\s*[^|{}]*infobox[^|{}]*\|', wikitext, re.I)
+        if not match:
+            return []
         
-        if reason == f'Limite de {self.character_limit} personnages atteinte':
-            print(f"\nScraping terminé : limite de {self.character_limit} personnages atteinte.")
-        else:
-            print(f"\nScraping terminé ! {self.character_count} personnages trouvés.")
\ No newline at end of file
+        # Découper le modèle au niveau 0 sur les '|' en ignorant les liens et modèles imbriqués
+        depth, start, params = 0, match.end(), []
+        i = match.end()
+        while i < len(wikitext):
+            pair = wikitext[i:i + 2]
+            if pair in ('{{', '[['):
+                depth += 1
+                i += 2
+                continue
+            if pair in ('}}', ']]'):
+                if depth == 0:
+                    params.append(wikitext[start:i])
+                    break
+                depth -= 1
+                i += 2
+                continue
+            if wikitext[i] == '|' and depth == 0:
+                params.append(wikitext[start:i])
+                start = i + 1
+            i += 1
+        
+        pairs = []
+        for param in params:
+            if '=' not in param:
+                continue
+            label, value = param.split('=', 1)
+            pairs.append((label.strip().lower().replace('_', ' '), self.clean_wikitext(value)))
+        return pairs
+
+    def clean_wikitext(self, value):
+        value = re.sub(r'<br\s*/?>', ', ', value, flags=re.I)
+        value = re.sub(r'<[^>]+>', '', value)
+        value = re.sub(r'\{\{[^{}]*\}\}', '', value)
+        value = re.sub(r'\[\[(?:[^|\]]*\|)?([^\]]*)\]\]', r'\1', value)
+        value = value.replace("'''", '').replace("''", '')
+        return ' '.join(value.split()).strip(' ,')
+
+    def closed(self, reason):
+        # La sauvegarde finale est assurée par StreamingStoragePipeline ; le catalogue
+        # garde la limite et la raison de fin pour savoir si le résultat est complet
+        catalog = WikiCatalog(self.data_dir)
+        for target in self.wikis.values():
+            catalog.record_run(target.wiki_name, target.character_limit, reason)
+            if target.recrawl_state is not None:
+                target.recrawl_state.save()
+            if target.entry_category and target.character_count:
+                self.discovery.remember(target.wiki_name, target.entry_category)
+            
+            if target.limit_filled:
+                print(f"\nScraping de {target.wiki_name} terminé : limite de {target.character_limit} personnages atteinte.")
+            else:
+                print(f"\nScraping de {target.wiki_name} terminé ! {target.character_count} personnages trouvés.")
+        self.discovery.save()
@@ -0,0 +1,83 @@
+# Stockage progressif des items scrapés
+#
+# Les items sont ajoutés une seule fois dans un journal JSON Lines pendant
+# le crawl, puis le fichier final data/<wiki>_characters.json est produit
+# de manière atomique à la fermeture du spider.
+
+import json
+import os
+import tempfile
+
+
+def temporary_path(path):
+    """Chemin temporaire unique dans le dossier de `path`, pour un renommage atomique"""
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp',
+                                    dir=os.path.dirname(path) or '.')
+    os.close(fd)
+    # mkstemp crée le fichier en 0600 : garder les droits habituels des fichiers de données
+    os.chmod(tmp_path, 0o644)
+    return tmp_path
+
+
+def atomic_write_json(path, data, indent=2):
+    """Écrit un objet JSON dans un fichier temporaire puis le renomme"""
+    tmp_path = temporary_path(path)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonLinesWriter:
+    """Journal JSON Lines en ajout seul, synchronisé sur disque par lots"""
+
+    def __init__(self, path, fsync_batch=20, append=False):
+        self.path = path
+        self.fsync_batch = max(1, fsync_batch)
+        self.pending = 0
+        self.count = 0
+        if append and os.path.exists(self.path):
+            # Reprise d'un crawl interrompu : garder les items déjà journalisés,
+            # sans la dernière ligne si elle a été coupée
+            with open(self.path, 'rb+') as f:
+                data = f.read()
+                f.truncate(data.rfind(b'\n') + 1)
+            self.count = data[:data.rfind(b'\n') + 1].count(b'\n')
+            self.file = open(self.path, 'a', encoding='utf-8')
+        else:
+            # Un nouveau crawl repart d'un journal vide
+            self.file = open(self.path, 'w', encoding='utf-8')
+
+    def write(self, item):
+        self.file.write(json.dumps(item, ensure_ascii=False))
+        self.file.write('\n')
+        self.count += 1
+        self.pending += 1
+        if self.pending >= self.fsync_batch:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def read_items(self):
+        """Relit tous les items du journal"""
+        self.sync()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def finalize(self, json_path, keep_journal=False):
+        """Produit le fichier JSON final de façon atomique et supprime le journal"""
+        items = self.read_items()
+        self.file.close()
+        atomic_write_json(json_path, items)
+        if not keep_journal:
+            os.remove(self.path)
+        return items
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
@@ -0,0 +1,107 @@
+# Wikis crawlés par un même spider
+#
+# Chaque wiki garde son propre état (compteur, limite, fichier de sortie,
+# état incrémental), ce qui permet de crawler plusieurs wikis en même
+# temps dans un seul moteur Scrapy. Les requêtes portent le nom de leur
+# wiki dans meta['wiki'].
+
+import os
+from urllib.parse import quote, urlparse
+
+from .budget import CrawlBudget
+from .incremental import RecrawlState, load_previous_items
+
+DEFAULT_CHARACTER_LIMIT = 50
+
+
+def normalize_fandom_url(url):
+    """Nettoie l'URL fournie et vérifie que c'est une URL Fandom"""
+    url = url.strip()
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    if 'fandom.com' not in url:
+        raise ValueError("L'URL doit être une URL Fandom valide")
+    return url
+
+
+def language_prefix(parsed_url):
+    """Préfixe de langue du wiki (ex: /fr), ou chaîne vide"""
+    segments = [s for s in parsed_url.path.split('/') if s]
+    return f'/{segments[0]}' if segments and segments[0] != 'wiki' and len(segments[0]) <= 5 else ''
+
+
+def default_api_url(parsed_url):
+    """URL de api.php, en gardant le préfixe de langue éventuel (ex: /fr/)"""
+    return f'{parsed_url.scheme}://{parsed_url.netloc}{language_prefix(parsed_url)}/api.php'
+
+
+def default_category_url(parsed_url, category):
+    """URL de la page de catégorie Fandom standard (ex: /wiki/Category:Characters)"""
+    title = quote(f'Category:{category}'.replace(' ', '_'), safe=':/')
+    return f'{parsed_url.scheme}://{parsed_url.netloc}{language_prefix(parsed_url)}/wiki/{title}'
+
+
+def parse_wiki_list(fandom_urls):
+    """Liste de (url, limite) depuis une chaîne séparée par des virgules ou une liste
+
+    Les éléments d'une liste peuvent être des URLs ou des dictionnaires
+    {'url': ..., 'limit': ...} ; la limite vaut None si elle n'est pas donnée.
+    """
+    if isinstance(fandom_urls, str):
+        fandom_urls = fandom_urls.replace('\n', ',').split(',')
+    wikis = []
+    for entry in fandom_urls:
+        if isinstance(entry, dict):
+            url, limit = entry.get('url'), entry.get('limit')
+        else:
+            url, limit = entry, None
+        if url and url.strip():
+            wikis.append((url, int(limit) if limit else None))
+    return wikis
+
+
+class WikiTarget:
+    """État de crawl d'un wiki"""
+
+    def __init__(self, fandom_url, data_dir, character_limit=DEFAULT_CHARACTER_LIMIT,
+                 api_url=None, incremental=False):
+        self.fandom_url = normalize_fandom_url(fandom_url)
+        parsed_url = urlparse(self.fandom_url)
+        self.wiki_name = parsed_url.netloc.split('.')[0]
+        self.json_file = os.path.join(data_dir, f'{self.wiki_name}_characters.json')
+        self.api_url = api_url or default_api_url(parsed_url)
+
+        # Personnages émis par le spider, moins ceux écartés par les pipelines
+        self.character_count = 0
+        # Personnages passés par tous les pipelines (signal item_scraped)
+        self.scraped_count = 0
+        self.character_limit = character_limit
+        self.infobox = None
+        # Pages de personnages demandées au rythme du quota restant
+        self.budget = CrawlBudget()
+        # Catégorie d'entrée dont la page a donné des personnages pendant ce crawl
+        self.entry_category = None
+
+        # Recrawl incrémental : validateurs par page et items du dernier crawl
+        self.recrawl_state = None
+        self.previous_items = {}
+        if incremental:
+            self.recrawl_state = RecrawlState.for_wiki(data_dir, self.wiki_name)
+            self.previous_items = load_previous_items(self.json_file)
+
+    @property
+    def limit_reached(self):
+        """Assez de personnages émis : plus de nouvelles pages tant que les pipelines n'ont pas fini"""
+        return self.character_count >= self.character_limit
+
+    @property
+    def limit_filled(self):
+        """Limite atteinte par des personnages passés par les pipelines"""
+        return self.scraped_count >= self.character_limit
+
+    def category_url(self, category):
+        return default_category_url(urlparse(self.fandom_url), category)
+
+    def stat_key(self, name):
+        """Clé des statistiques Scrapy propres à ce wiki"""
+        return f'wiki/{self.wiki_name}/{name}'
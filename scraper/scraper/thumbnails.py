@@ -0,0 +1,230 @@
+# Miniatures des images de personnages
+#
+# Chaque image source n'est téléchargée qu'une fois, puis réduite à
+# quelques largeurs fixes (WebP ou JPEG). Sources et miniatures sont
+# gardées sur disque dans un cache LRU de taille bornée, partagé par le
+# serveur (/img/<wiki>/<id>) et le pipeline qui le préchauffe pendant le
+# crawl. Sans Pillow, l'image source est servie telle quelle depuis le
+# cache.
+
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import unquote
+from urllib.request import Request, urlopen
+
+from .storage import temporary_path
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Largeurs produites ; une largeur demandée est arrondie à la suivante
+THUMBNAIL_WIDTHS = (96, 160, 240, 320, 480)
+DEFAULT_WIDTH = 240
+FORMATS = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+# Taille maximale d'une image source téléchargée
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+USER_AGENT = 'Mozilla/5.0 (compatible; FandomScraper thumbnails)'
+
+
+class ThumbnailError(Exception):
+    """L'image source n'a pas pu être téléchargée ou décodée"""
+
+
+def image_key(url):
+    return hashlib.blake2b(url.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def character_id(page_url):
+    """Identifiant d'un personnage : le titre de sa page (dernier segment de l'URL)"""
+    return unquote(page_url.rstrip('/').rsplit('/', 1)[-1])
+
+
+def thumbnail_width(requested):
+    """Plus petite largeur fixe couvrant la largeur demandée"""
+    if not requested:
+        return DEFAULT_WIDTH
+    for width in THUMBNAIL_WIDTHS:
+        if width >= requested:
+            return width
+    return THUMBNAIL_WIDTHS[-1]
+
+
+def sniff_type(data):
+    """Type MIME d'une image d'après ses premiers octets"""
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[:2] == b'\xff\xd8':
+        return 'image/jpeg'
+    return None
+
+
+class DiskLRUCache:
+    """Fichiers nommés par clé, les moins récemment lus sont supprimés au-delà de `max_bytes`
+
+    L'ordre d'utilisation est porté par la date de modification des
+    fichiers, ce qui le conserve entre deux démarrages.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        files = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                files.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self.entries[name] = size
+            self.total_bytes += size
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get(self, name):
+        """Contenu du fichier en cache, ou None"""
+        try:
+            with open(self.path(name), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self.lock:
+                self._forget(name)
+            return None
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            pass
+        with self.lock:
+            # Fichier ajouté par un autre processus (ex: le crawl)
+            if name not in self.entries:
+                self.entries[name] = len(data)
+                self.total_bytes += len(data)
+            self.entries.move_to_end(name)
+        return data
+
+    def put(self, name, data):
+        path = self.path(name)
+        tmp_path = temporary_path(path)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self._forget(name)
+            self.entries[name] = len(data)
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                evicted, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                try:
+                    os.remove(self.path(evicted))
+                except FileNotFoundError:
+                    pass
+
+    def _forget(self, name):
+        size = self.entries.pop(name, None)
+        if size is not None:
+            self.total_bytes -= size
+
+
+class ThumbnailStore:
+    """Télécharge les images sources une fois et en produit des miniatures en cache"""
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, timeout=10.0, quality=80):
+        self.cache = DiskLRUCache(directory, max_bytes)
+        self.timeout = timeout
+        self.quality = quality
+        # Verrous par clé : une même image n'est téléchargée ou réduite qu'une fois à la fois
+        self.locks = [threading.Lock() for _ in range(64)]
+
+    def _lock(self, key):
+        return self.locks[int(key[:8], 16) % len(self.locks)]
+
+    def source(self, url):
+        """Octets de l'image source, téléchargée au premier appel"""
+        name = f'{image_key(url)}.src'
+        data = self.cache.get(name)
+        if data is not None:
+            return data
+        with self._lock(name):
+            data = self.cache.get(name)
+            if data is None:
+                data = self._download(url)
+                self.cache.put(name, data)
+        return data
+
+    def _download(self, url):
+        try:
+            with urlopen(Request(url, headers={'User-Agent': USER_AGENT}), timeout=self.timeout) as response:
+                data = response.read(MAX_SOURCE_BYTES + 1)
+        except (OSError, ValueError) as e:
+            raise ThumbnailError(f"Téléchargement impossible de {url}: {e}")
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ThumbnailError(f"Image trop grande: {url}")
+        if sniff_type(data) is None:
+            raise ThumbnailError(f"Contenu non reconnu comme une image: {url}")
+        return data
+
+    def thumbnail(self, url, width=None, fmt='webp'):
+        """(octets, type MIME) de la miniature de `url` à la largeur fixe la plus proche"""
+        if Image is None:
+            # Sans Pillow : l'image source, servie depuis le cache disque
+            data = self.source(url)
+            return data, sniff_type(data)
+
+        width = thumbnail_width(width)
+        name = f'{image_key(url)}-{width}.{fmt}'
+        data = self.cache.get(name)
+        if data is None:
+            source = self.source(url)
+            with self._lock(name):
+                data = self.cache.get(name)
+                if data is None:
+                    data = self._resize(source, width, fmt)
+                    self.cache.put(name, data)
+        return data, FORMATS[fmt]
+
+    def _resize(self, source, width, fmt):
+        try:
+            image = Image.open(io.BytesIO(source))
+            image.draft('RGB', (width, width * 4))
+            # Ne jamais agrandir ; la hauteur suit les proportions
+            image.thumbnail((width, width * 4))
+            if fmt == 'jpeg':
+                if image.mode in ('RGBA', 'LA', 'P'):
+                    image = image.convert('RGBA')
+                    background = Image.new('RGB', image.size, (255, 255, 255))
+                    background.paste(image, mask=image.getchannel('A'))
+                    image = background
+                elif image.mode != 'RGB':
+                    image = image.convert('RGB')
+            elif image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            output = io.BytesIO()
+            image.save(output, format=fmt.upper(), quality=self.quality)
+        except (OSError, ValueError) as e:
+            raise ThumbnailError(f"Image illisible: {e}")
+        return output.getvalue()
+
+    def warm(self, url, widths=(DEFAULT_WIDTH,)):
+        """Prépare la source et les miniatures (WebP et JPEG) d'une image"""
+        self.source(url)
+        if Image is None:
+            return
+        for width in widths:
+            for fmt in FORMATS:
+                self.thumbnail(url, width, fmt)
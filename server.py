@@ -1,11 +1,18 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
-import subprocess
+import base64
 import json
 import os
 import re
 from urllib.parse import urlparse
+import sys
+import threading
 import logging
+from time import monotonic, time
+
+from crawler_host import CrawlerHost
+from response_cache import ResponseCache
+from jobs import JobManager, QueueFullError, ScrapeJobError, WikiLocks, DONE, FAILED, PENDING, RUNNING
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -14,6 +21,18 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRAPER_DIR = os.path.join(BASE_DIR, 'scraper')
+
+# Le package scraper est partagé entre le serveur et les crawls
+sys.path.insert(0, SCRAPER_DIR)
+from scraper.catalog import WikiCatalog
+from scraper.metrics import REGISTRY, Counter, Gauge, Histogram
+from scraper.search import SearchIndex
+from scraper.database import INDEXED_FIELDS, CharacterDatabase
+from scraper.targets import DEFAULT_CHARACTER_LIMIT
+from scraper.thumbnails import FORMATS, ThumbnailError, ThumbnailStore, image_key, thumbnail_width
+
 def get_wiki_name(url):
     """Extrait le nom du wiki de l'URL"""
     parsed_url = urlparse(url)
@@ -43,15 +62,250 @@ def validate_fandom_url(url):
         
     return url, None
 
+def is_positive_int(value):
+    """Vrai pour un entier JSON positif (true et false sont des bool, donc des int, en Python)"""
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 1
+
 def ensure_data_directory():
-    """Crée le dossier data s'il n'existe pas"""
-    data_dir = os.path.join(os.path.dirname(__file__), 'data')
+    """Crée le dossier data s'il n'existe pas (DATA_DIR pour en utiliser un autre)"""
+    data_dir = os.environ.get('DATA_DIR') or os.path.join(os.path.dirname(__file__), 'data')
     os.makedirs(data_dir, exist_ok=True)
     logger.info(f"Data directory ensured at: {data_dir}")
     return data_dir
 
+# Catalogue des wikis, tenu à jour par les crawls
+wiki_catalog = WikiCatalog(ensure_data_directory())
+
+# Réponses /wiki/<nom> déjà encodées, invalidées quand le fichier change
+wiki_response_cache = ResponseCache(
+    max_bytes=int(os.environ.get('WIKI_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+)
+
+# Index de recherche sur tous les wikis, mis à jour wiki par wiki
+search_index = SearchIndex()
+search_sync_lock = threading.Lock()
+MAX_SEARCH_LIMIT = 100
+
+# Pagination et filtres de /wiki/<nom> (ex: ?type=Human), lus dans la base des personnages
+PAGE_PARAMS = ('limit', 'cursor', 'fields', 'sort', *INDEXED_FIELDS)
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 500
+character_db = CharacterDatabase.for_data_dir(ensure_data_directory())
+
+# Miniatures /img/<wiki>/<id>, dans le même cache disque que le crawl
+thumbnail_store = ThumbnailStore(
+    os.path.join(ensure_data_directory(), '.state', 'thumbnails'),
+    max_bytes=int(os.environ.get('THUMBNAIL_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+)
+THUMBNAIL_MAX_AGE = int(os.environ.get('THUMBNAIL_MAX_AGE', 30 * 24 * 3600))
+
+# Modes d'extraction acceptés par FandomSpider
+SCRAPE_MODES = ('html', 'api')
+# Nombre maximum de wikis dans un scraping groupé
+MAX_BATCH_WIKIS = int(os.environ.get('SCRAPE_BATCH_MAX_WIKIS', 50))
+# Un wiki scrapé depuis moins longtemps est servi sans nouveau crawl (0 pour désactiver)
+SCRAPE_FRESHNESS_SECONDS = int(os.environ.get('SCRAPE_FRESHNESS_SECONDS', 600))
+# Raisons de fin d'un crawl qui a lu tout le wiki ou rempli sa limite
+COMPLETE_FINISH_REASONS = ('finished', 'character_limit')
+# Un seul crawl à la fois écrit les fichiers d'un wiki
+wiki_locks = WikiLocks()
+
+# Mesures du serveur, exposées avec celles des crawls par /metrics
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', "Durée des requêtes HTTP par route", ('method', 'route', 'status')))
+SCRAPE_JOBS = REGISTRY.register(Gauge(
+    'scrape_jobs', "Jobs de scraping connus par état", ('status',)))
+SCRAPE_REQUESTS = REGISTRY.register(Counter(
+    'scrape_requests_total', "Demandes de scraping : nouveau job, job partagé ou résultat récent", ('outcome',)))
+
+# Commentaire (SSE) ou ligne vide (NDJSON) envoyé quand un flux reste muet
+STREAM_KEEPALIVE = 15
+
+# Reactor et projet Scrapy chargés une seule fois pour tous les crawls
+crawler_host = CrawlerHost(SCRAPER_DIR)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = monotonic()
+
+@app.after_request
+def observe_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # La route (/wiki/<wiki_name>) plutôt que l'URL, pour borner le nombre de séries
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(
+            monotonic() - started, method=request.method, route=route, status=response.status_code
+        )
+    return response
+
+def cached_json_response(entry):
+    """Construit une réponse conditionnelle (ETag/304) à partir d'une entrée du cache"""
+    use_gzip = 'gzip' in request.accept_encodings
+    body = entry.gzipped if use_gzip else entry.body
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(f'{entry.etag}-gz' if use_gzip else entry.etag)
+    response.last_modified = entry.last_modified
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = True
+    if use_gzip:
+        response.content_encoding = 'gzip'
+    return response.make_conditional(request)
+
+def file_version(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def sync_search_index():
+    """Réindexe uniquement les wikis ajoutés, modifiés ou supprimés depuis la dernière recherche"""
+    with search_sync_lock:
+        entries = {entry['name']: entry for entry in wiki_catalog.list()}
+        for wiki_name in set(search_index.versions) - set(entries):
+            search_index.remove_wiki(wiki_name)
+        for wiki_name, entry in entries.items():
+            if search_index.versions.get(wiki_name) == (entry['mtime_ns'], entry['size']):
+                continue
+            json_path = wiki_catalog.data_path(wiki_name)
+            if character_db.sync(wiki_name, json_path):
+                search_index.update_wiki(wiki_name, character_db.items(wiki_name), character_db.source(wiki_name))
+
+def load_characters(json_path):
+    """Personnages d'un fichier de données, ou ScrapeJobError s'il est absent, illisible ou vide"""
+    if not os.path.exists(json_path):
+        logger.error(f"JSON file not found at: {json_path}")
+        raise ScrapeJobError(
+            'Aucune donnée générée',
+            'Le fichier JSON n\'a pas été créé',
+            404
+        )
+        
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            characters = json.load(f)
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error: {str(e)}")
+        raise ScrapeJobError('Erreur de lecture JSON', str(e))
+        
+    if not characters:
+        logger.warning("No characters found in JSON file")
+        raise ScrapeJobError(
+            'Aucun personnage trouvé',
+            'Le scraping n\'a trouvé aucun personnage',
+            404
+        )
+    return characters
+
+def fresh_result(wiki_name, limit=None):
+    """Résultat du dernier scraping du wiki s'il date de moins de SCRAPE_FRESHNESS_SECONDS, sinon None"""
+    entry = wiki_catalog.get(wiki_name)
+    if not entry or time() - entry['last_scraped'] >= SCRAPE_FRESHNESS_SECONDS:
+        return None
+    # Seul un crawl allé à son terme avec une limite au moins aussi grande donne un résultat complet
+    if entry.get('finish_reason') not in COMPLETE_FINISH_REASONS:
+        return None
+    if (entry.get('character_limit') or 0) < (limit or DEFAULT_CHARACTER_LIMIT):
+        return None
+    try:
+        characters = load_characters(wiki_catalog.data_path(wiki_name))
+    except ScrapeJobError:
+        return None
+    return {
+        'message': f'{len(characters)} personnages trouvés',
+        'data': characters,
+        'wiki_name': wiki_name,
+        'last_scraped': entry['last_scraped']
+    }
+
+def run_scrape_job(job):
+    """Exécute le spider pour un job et retourne les personnages trouvés"""
+    if 'fandom_urls' in job.options:
+        return run_batch_job(job)
+    
+    data_dir = ensure_data_directory()
+    json_path = os.path.join(data_dir, f'{job.wiki_name}_characters.json')
+    logger.info(f"Will save to: {json_path}")
+    
+    # Vérifier que le dossier scraper existe
+    if not os.path.exists(SCRAPER_DIR):
+        logger.error("Scraper directory not found")
+        raise ScrapeJobError('Configuration error', 'Scraper directory not found')
+    
+    # Exécuter le spider dans l'hôte Scrapy déjà chargé
+    logger.info(f"Starting in-process crawl of {job.url}")
+    try:
+        with wiki_locks.hold([job.wiki_name]):
+            stats = crawler_host.crawl('fandom', on_event=job.events.publish, fandom_url=job.url,
+                                       job_id=job.id, data_dir=data_dir, **job.options)
+    except Exception as e:
+        logger.error(f"Scraping failed: {e}")
+        raise ScrapeJobError('Erreur lors du scraping', str(e))
+    logger.info(f"Crawl finished: {stats.get('finish_reason')}")
+        
+    # Vérifier et lire les résultats
+    characters = load_characters(json_path)
+    logger.info(f"Successfully scraped {len(characters)} characters")
+    search_index.update_wiki(job.wiki_name, characters, file_version(json_path))
+    return {
+        'message': f'{len(characters)} personnages trouvés',
+        'data': characters,
+        'wiki_name': job.wiki_name
+    }
+
+def run_batch_job(job):
+    """Crawle plusieurs wikis dans un seul moteur et résume le résultat de chacun"""
+    data_dir = ensure_data_directory()
+    logger.info(f"Starting in-process batch crawl of {len(job.wiki_names)} wikis")
+    try:
+        with wiki_locks.hold(job.wiki_names):
+            stats = crawler_host.crawl('fandom', on_event=job.events.publish, job_id=job.id,
+                                       data_dir=data_dir, **job.options)
+    except Exception as e:
+        logger.error(f"Batch scraping failed: {e}")
+        raise ScrapeJobError('Erreur lors du scraping', str(e))
+    logger.info(f"Batch crawl finished: {stats.get('finish_reason')}")
+    
+    wikis = {}
+    total = 0
+    for wiki_name in job.wiki_names:
+        # Statistiques propres au wiki (wiki/<nom>/...)
+        prefix = f'wiki/{wiki_name}/'
+        summary = {key[len(prefix):]: value for key, value in stats.items() if key.startswith(prefix)}
+        json_path = os.path.join(data_dir, f'{wiki_name}_characters.json')
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                characters = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Cannot read {json_path}: {e}")
+            summary['error'] = str(e)
+            characters = []
+        if characters:
+            search_index.update_wiki(wiki_name, characters, file_version(json_path))
+        summary['character_count'] = len(characters)
+        total += len(characters)
+        wikis[wiki_name] = summary
+        
+    if not total:
+        raise ScrapeJobError(
+            'Aucun personnage trouvé',
+            'Le scraping n\'a trouvé aucun personnage',
+            404
+        )
+    
+    logger.info(f"Successfully scraped {total} characters from {len(wikis)} wikis")
+    return {
+        'message': f'{total} personnages trouvés sur {len(wikis)} wikis',
+        'wikis': wikis
+    }
+
+job_manager = JobManager(
+    run_scrape_job,
+    max_workers=int(os.environ.get('SCRAPE_CONCURRENCY', 2)),
+    max_pending=int(os.environ.get('SCRAPE_QUEUE_SIZE', 20))
+)
+
 @app.route('/scrape', methods=['POST'])
 def scrape():
+    """Met un scraping en file d'attente et retourne immédiatement l'id du job"""
     try:
         logger.info("Received scrape request")
         data = request.json
@@ -68,87 +322,53 @@ def scrape():
             logger.error(f"URL validation error: {error}")
             return jsonify({'error': error}), 400
             
-        # Préparer le dossier de données
-        data_dir = ensure_data_directory()
-        wiki_name = get_wiki_name(clean_url)
-        json_path = os.path.join(data_dir, f'{wiki_name}_characters.json')
-        logger.info(f"Will save to: {json_path}")
-        
-        # Vérifier que le dossier scraper existe
-        if not os.path.exists('scraper'):
-            logger.error("Scraper directory not found")
-            return jsonify({
-                'error': 'Configuration error',
-                'details': 'Scraper directory not found'
-            }), 500
-        
-        # Configurer et exécuter le spider
-        spider_cmd = [
-            'scrapy', 'crawl', 'fandom',
-            '-a', f'fandom_url={clean_url}',
-            '--nolog'  # Éviter la pollution des logs
-        ]
-        
-        logger.info(f"Executing command: {' '.join(spider_cmd)}")
-        
-        process = subprocess.Popen(
-            spider_cmd,
-            cwd='scraper',
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        stdout, stderr = process.communicate()
-        
-        # Log the output
-        if stdout:
-            logger.info(f"Spider stdout: {stdout}")
-        if stderr:
-            logger.error(f"Spider stderr: {stderr}")
-        
-        # Gérer les erreurs de scraping
-        if process.returncode != 0:
-            error_msg = stderr.strip()
-            logger.error(f"Scraping failed with return code {process.returncode}")
-            return jsonify({
-                'error': 'Erreur lors du scraping',
-                'details': error_msg
-            }), 500
+        # Mode d'extraction : pages HTML ou API MediaWiki par lots
+        mode = data.get('mode', 'html')
+        if mode not in SCRAPE_MODES:
+            return jsonify({'error': f"Mode inconnu : {mode}"}), 400
             
-        # Vérifier et lire les résultats
-        if not os.path.exists(json_path):
-            logger.error(f"JSON file not found at: {json_path}")
-            return jsonify({
-                'error': 'Aucune donnée générée',
-                'details': 'Le fichier JSON n\'a pas été créé'
-            }), 404
+        # Nombre de personnages voulus pour ce scraping
+        limit = data.get('limit')
+        if limit is not None and not is_positive_int(limit):
+            return jsonify({'error': 'La limite doit être un entier positif'}), 400
             
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                characters = json.load(f)
-                
-            if not characters:
-                logger.warning("No characters found in JSON file")
+        wiki_name = get_wiki_name(clean_url)
+        options = {
+            'mode': mode,
+            # Recrawl incrémental d'un wiki déjà scrapé
+            'incremental': bool(data.get('incremental', False))
+        }
+        if limit is not None:
+            options['character_limit'] = limit
+            
+        # Wiki scrapé récemment : résultat stocké, sauf si "refresh" est demandé
+        if SCRAPE_FRESHNESS_SECONDS > 0 and not data.get('refresh'):
+            result = fresh_result(wiki_name, limit)
+            if result:
+                job = job_manager.record(clean_url, wiki_name, options, result)
+                SCRAPE_REQUESTS.inc(outcome='fresh')
+                logger.info(f"Serving stored result for {wiki_name}")
                 return jsonify({
-                    'error': 'Aucun personnage trouvé',
-                    'details': 'Le scraping n\'a trouvé aucun personnage'
-                }), 404
+                    'success': True,
+                    'fresh': True,
+                    **job.to_dict()
+                }), 200
                 
-            logger.info(f"Successfully scraped {len(characters)} characters")
-            return jsonify({
-                'success': True,
-                'message': f'{len(characters)} personnages trouvés',
-                'data': characters,
-                'wiki_name': wiki_name
-            })
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {str(e)}")
+        # Les demandes identiques partagent le même crawl tant qu'il n'est pas terminé
+        key = ('scrape', wiki_name, mode, options['incremental'], limit)
+        try:
+            job = job_manager.submit(clean_url, wiki_name, options, key=key)
+        except QueueFullError as e:
             return jsonify({
-                'error': 'Erreur de lecture JSON',
+                'error': 'Trop de scrapings en attente',
                 'details': str(e)
-            }), 500
+            }), 503
+            
+        SCRAPE_REQUESTS.inc(outcome='coalesced' if job.requests > 1 else 'queued')
+        return jsonify({
+            'success': True,
+            **job.to_dict()
+        }), 202
             
     except Exception as e:
         logger.exception("Unexpected error occurred")
@@ -157,26 +377,165 @@ def scrape():
             'details': str(e)
         }), 500
 
+@app.route('/scrape/batch', methods=['POST'])
+def scrape_batch():
+    """Met en file d'attente un seul scraping pour plusieurs wikis"""
+    data = request.json
+    if not data or not isinstance(data.get('wikis'), list) or not data['wikis']:
+        return jsonify({'error': 'Une liste "wikis" non vide est requise'}), 400
+    if len(data['wikis']) > MAX_BATCH_WIKIS:
+        return jsonify({'error': f'Au plus {MAX_BATCH_WIKIS} wikis par scraping groupé'}), 400
+        
+    mode = data.get('mode', 'html')
+    if mode not in SCRAPE_MODES:
+        return jsonify({'error': f"Mode inconnu : {mode}"}), 400
+        
+    # Chaque wiki est une URL ou {"url": ..., "limit": ...}
+    targets = {}
+    for entry in data['wikis']:
+        url, limit = (entry.get('url'), entry.get('limit')) if isinstance(entry, dict) else (entry, None)
+        clean_url, error = validate_fandom_url(url)
+        if error:
+            return jsonify({'error': error, 'details': str(url)}), 400
+        if limit is not None and not is_positive_int(limit):
+            return jsonify({'error': 'La limite doit être un entier positif', 'details': clean_url}), 400
+        targets.setdefault(get_wiki_name(clean_url), {'url': clean_url, 'limit': limit})
+        
+    incremental = bool(data.get('incremental', False))
+    key = ('batch', tuple(sorted((name, target['limit'] or 0) for name, target in targets.items())), mode, incremental)
+    try:
+        job = job_manager.submit(
+            None,
+            None,
+            {
+                'mode': mode,
+                'incremental': incremental,
+                'fandom_urls': list(targets.values())
+            },
+            key=key,
+            urls=[target['url'] for target in targets.values()],
+            wiki_names=list(targets)
+        )
+    except QueueFullError as e:
+        return jsonify({
+            'error': 'Trop de scrapings en attente',
+            'details': str(e)
+        }), 503
+        
+    SCRAPE_REQUESTS.inc(outcome='coalesced' if job.requests > 1 else 'queued')
+    return jsonify({
+        'success': True,
+        **job.to_dict()
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Retourne l'état d'un job de scraping"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({
+            'error': 'Job non trouvé',
+            'details': f'Aucun job avec l\'id {job_id}'
+        }), 404
+        
+    return jsonify({
+        'success': True,
+        **job.to_dict()
+    })
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Retourne le résultat d'un job terminé"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({
+            'error': 'Job non trouvé',
+            'details': f'Aucun job avec l\'id {job_id}'
+        }), 404
+        
+    if job.status == FAILED:
+        return jsonify({
+            'error': job.error,
+            'details': job.details
+        }), job.status_code
+        
+    if job.status != DONE:
+        return jsonify({
+            'success': False,
+            **job.to_dict()
+        }), 202
+        
+    return jsonify({
+        'success': True,
+        **job.result
+    })
+
+def format_event(index, kind, data, ndjson):
+    payload = json.dumps(data, ensure_ascii=False)
+    if ndjson:
+        return f'{{"id": {index}, "event": "{kind}", "data": {payload}}}\n'
+    return f'id: {index}\nevent: {kind}\ndata: {payload}\n\n'
+
+def job_event_stream(job, start, ndjson):
+    """Envoie les événements du job à partir de `start`, jusqu'à la fin du job"""
+    position = start
+    while True:
+        events, closed = job.events.read(position, timeout=STREAM_KEEPALIVE)
+        if events:
+            # Tous les événements en attente partent dans un seul morceau
+            yield ''.join(format_event(position + i, kind, data, ndjson) for i, (kind, data) in enumerate(events))
+            position += len(events)
+        elif closed:
+            return
+        else:
+            yield '\n' if ndjson else ': keep-alive\n\n'
+
+@app.route('/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    """Diffuse en direct les personnages et la progression d'un job (SSE, ou NDJSON avec format=ndjson)"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({
+            'error': 'Job non trouvé',
+            'details': f'Aucun job avec l\'id {job_id}'
+        }), 404
+        
+    ndjson = (request.args.get('format') == 'ndjson'
+              or request.accept_mimetypes.best_match(['text/event-stream', 'application/x-ndjson']) == 'application/x-ndjson')
+    # Reprise après une déconnexion : EventSource renvoie le dernier id reçu
+    last_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        start = int(last_id) + 1 if last_id is not None else 0
+    except ValueError:
+        return jsonify({
+            'error': 'Paramètres invalides',
+            'details': 'Last-Event-ID doit être un entier'
+        }), 400
+        
+    response = app.response_class(
+        job_event_stream(job, max(start, 0), ndjson),
+        mimetype='application/x-ndjson' if ndjson else 'text/event-stream'
+    )
+    response.cache_control.no_cache = True
+    # Pas de mise en tampon par un éventuel proxy (nginx)
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Mesures du serveur et des crawls au format texte de Prometheus"""
+    counts = job_manager.counts()
+    for status in (PENDING, RUNNING, DONE, FAILED):
+        SCRAPE_JOBS.set(counts.get(status, 0), status=status)
+    return app.response_class(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/wikis', methods=['GET'])
 def get_wikis():
     """Retourne la liste des wikis déjà scrapés"""
     try:
-        data_dir = ensure_data_directory()
-        wiki_files = [f for f in os.listdir(data_dir) if f.endswith('_characters.json')]
-        wikis = []
-        
-        for file in wiki_files:
-            wiki_name = file.replace('_characters.json', '')
-            with open(os.path.join(data_dir, file), 'r', encoding='utf-8') as f:
-                characters = json.load(f)
-                wikis.append({
-                    'name': wiki_name,
-                    'character_count': len(characters)
-                })
-                
         return jsonify({
             'success': True,
-            'wikis': wikis
+            'wikis': wiki_catalog.list()
         })
         
     except Exception as e:
@@ -185,9 +544,67 @@ def get_wikis():
             'details': str(e)
         }), 500
 
+def encode_cursor(offset, sort):
+    """Curseur opaque désignant la position suivante dans un ordre de tri"""
+    raw = json.dumps({'o': offset, 's': sort}).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor, sort):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        offset = int(data['o'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Curseur invalide')
+    if data.get('s') != sort or offset < 0:
+        raise ValueError('Le curseur ne correspond pas au tri demandé')
+    return offset
+
+def get_wiki_page(wiki_name, json_path):
+    """Retourne une page de personnages, filtrée, triée et projetée sur les champs demandés"""
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_LIMIT))
+        if not 0 < limit <= MAX_PAGE_LIMIT:
+            raise ValueError(f'limit doit être compris entre 1 et {MAX_PAGE_LIMIT}')
+            
+        sort = request.args.get('sort') or None
+        field = sort.lstrip('-') if sort else None
+        if field and field not in INDEXED_FIELDS:
+            raise ValueError(f"Tri impossible sur '{field}' (champs : {', '.join(INDEXED_FIELDS)})")
+            
+        cursor = request.args.get('cursor')
+        offset = decode_cursor(cursor, sort) if cursor else 0
+    except ValueError as e:
+        return jsonify({
+            'error': 'Paramètres invalides',
+            'details': str(e)
+        }), 400
+        
+    fields = [f for f in request.args.get('fields', '').split(',') if f]
+    filters = {f: request.args[f] for f in INDEXED_FIELDS if f in request.args}
+    
+    character_db.sync(wiki_name, json_path)
+    count = character_db.count(wiki_name, filters)
+    characters = character_db.page(wiki_name, offset, limit, field,
+                                   descending=bool(sort and sort.startswith('-')), filters=filters)
+    if fields:
+        characters = [{f: c[f] for f in fields if f in c} for c in characters]
+        
+    next_offset = offset + len(characters)
+    return jsonify({
+        'success': True,
+        'wiki_name': wiki_name,
+        'character_count': count,
+        'data': characters,
+        'next_cursor': encode_cursor(next_offset, sort) if next_offset < count else None
+    })
+
 @app.route('/wiki/<wiki_name>', methods=['GET'])
 def get_wiki_data(wiki_name):
-    """Retourne les données d'un wiki spécifique"""
+    """Retourne les données d'un wiki spécifique
+
+    Avec `limit`, `cursor`, `fields`, `sort` ou un filtre sur un champ
+    (`type`, `role`...), seule la page demandée est lue dans la base.
+    """
     try:
         data_dir = ensure_data_directory()
         json_path = os.path.join(data_dir, f'{wiki_name}_characters.json')
@@ -198,21 +615,110 @@ def get_wiki_data(wiki_name):
                 'details': f'Aucune donnée pour le wiki {wiki_name}'
             }), 404
             
-        with open(json_path, 'r', encoding='utf-8') as f:
-            characters = json.load(f)
+        if any(param in request.args for param in PAGE_PARAMS):
+            return get_wiki_page(wiki_name, json_path)
+            
+        def build_payload(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                characters = json.load(f)
+            return app.json.dumps({
+                'success': True,
+                'wiki_name': wiki_name,
+                'character_count': len(characters),
+                'data': characters
+            }).encode('utf-8')
             
+        entry = wiki_response_cache.get(wiki_name, json_path, build_payload)
+        return cached_json_response(entry)
+        
+    except Exception as e:
+        return jsonify({
+            'error': 'Erreur lors de la récupération des données',
+            'details': str(e)
+        }), 500
+
+@app.route('/img/<wiki_name>/<path:char_id>', methods=['GET'])
+def get_thumbnail(wiki_name, char_id):
+    """Retourne la miniature d'un personnage (WebP si accepté, sinon JPEG) à la largeur `w`"""
+    json_path = os.path.join(ensure_data_directory(), f'{wiki_name}_characters.json')
+    if not os.path.exists(json_path):
+        return jsonify({
+            'error': 'Wiki non trouvé',
+            'details': f'Aucune donnée pour le wiki {wiki_name}'
+        }), 404
+        
+    character_db.sync(wiki_name, json_path)
+    image_url = character_db.image_url(wiki_name, char_id)
+    if not image_url:
+        return jsonify({
+            'error': 'Image non trouvée',
+            'details': f'Aucune image pour {char_id}'
+        }), 404
+        
+    width = thumbnail_width(request.args.get('w', type=int))
+    fmt = request.args.get('format')
+    if fmt not in FORMATS:
+        fmt = 'webp' if request.accept_mimetypes['image/webp'] else 'jpeg'
+        
+    try:
+        data, mimetype = thumbnail_store.thumbnail(image_url, width, fmt)
+    except ThumbnailError as e:
+        logger.warning(f"Thumbnail failed for {wiki_name}/{char_id}: {e}")
+        return jsonify({
+            'error': 'Image indisponible',
+            'details': str(e)
+        }), 502
+        
+    response = app.response_class(data, mimetype=mimetype)
+    # La clé change avec l'URL de l'image source
+    response.set_etag(f'{image_key(image_url)[:16]}-{width}-{fmt}')
+    response.cache_control.public = True
+    response.cache_control.max_age = THUMBNAIL_MAX_AGE
+    response.vary.add('Accept')
+    return response.make_conditional(request)
+
+@app.route('/search', methods=['GET'])
+def search():
+    """Recherche des personnages sur tous les wikis scrapés"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({
+            'error': 'Paramètres invalides',
+            'details': 'Le paramètre q est requis'
+        }), 400
+        
+    try:
+        limit = int(request.args.get('limit', 20))
+        offset = int(request.args.get('offset', 0))
+        if not 0 < limit <= MAX_SEARCH_LIMIT or offset < 0:
+            raise ValueError(f'limit doit être compris entre 1 et {MAX_SEARCH_LIMIT}')
+    except ValueError as e:
+        return jsonify({
+            'error': 'Paramètres invalides',
+            'details': str(e)
+        }), 400
+        
+    try:
+        sync_search_index()
+        total, results = search_index.search(query, limit, offset, wiki=request.args.get('wiki'))
+        next_offset = offset + len(results)
         return jsonify({
             'success': True,
-            'wiki_name': wiki_name,
-            'character_count': len(characters),
-            'data': characters
+            'query': query,
+            'total': total,
+            'results': results,
+            'next_offset': next_offset if next_offset < total else None
         })
         
     except Exception as e:
         return jsonify({
-            'error': 'Erreur lors de la récupération des données',
+            'error': 'Erreur lors de la recherche',
             'details': str(e)
         }), 500
 
 if __name__ == '__main__':
+    # Avec le rechargement automatique, le processus parent ne fait que surveiller
+    # les fichiers : seul le processus qui sert les requêtes démarre le reactor
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        crawler_host.start()
     app.run(debug=True, port=5000) 
\ No newline at end of file
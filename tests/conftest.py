@@ -0,0 +1,71 @@
+# Outils communs des tests : chemins du projet et crawls contre le serveur de fixtures
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRAPER_DIR = os.path.join(BASE_DIR, 'scraper')
+for path in (BASE_DIR, SCRAPER_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from benchmarks.standin import Fixture, StandIn  # noqa: E402
+from benchmarks.suite import CRAWL_SETTINGS, _crawler  # noqa: E402
+
+
+@pytest.fixture
+def standin_factory():
+    """Serveurs de fixtures démarrés pour le test, arrêtés à la fin"""
+    started = []
+
+    def start(characters=100, **kwargs):
+        standin = StandIn(Fixture(), characters=characters, **kwargs).start()
+        started.append(standin)
+        return standin
+
+    yield start
+    for standin in started:
+        standin.stop()
+
+
+@pytest.fixture
+def spider_factory(tmp_path):
+    """(crawler, spider) du projet sans moteur, pour appeler callbacks et middlewares directement"""
+    def create(settings=None, **spider_args):
+        spider_args.setdefault('fandom_url', 'http://benchwiki.fandom.com/')
+        return _crawler(settings, data_dir=str(tmp_path), **spider_args)
+    return create
+
+
+def crawl_command(standin, data_dir, settings=None, **spider_args):
+    """(commande, environnement) de `scrapy crawl fandom` à travers le serveur de fixtures"""
+    command = [sys.executable, '-m', 'scrapy', 'crawl', 'fandom', '-a', f'data_dir={data_dir}']
+    if 'fandom_urls' not in spider_args:
+        spider_args.setdefault('fandom_url', standin.wiki_url)
+    for name, value in spider_args.items():
+        command += ['-a', f'{name}={value}']
+    for name, value in {**CRAWL_SETTINGS, **(settings or {})}.items():
+        command += ['-s', f'{name}={int(value) if isinstance(value, bool) else value}']
+    return command, dict(os.environ, http_proxy=standin.url, HTTP_PROXY=standin.url)
+
+
+def crawl_results(standin, data_dir):
+    """(personnages, statistiques) écrits par un crawl du wiki de la fixture"""
+    wiki = standin.fixture.wiki
+    with open(os.path.join(data_dir, f'{wiki}_characters.json'), 'r', encoding='utf-8') as f:
+        characters = json.load(f)
+    with open(os.path.join(data_dir, f'{wiki}_stats.json'), 'r', encoding='utf-8') as f:
+        stats = json.load(f)['stats']
+    return characters, stats
+
+
+def run_crawl(standin, data_dir, settings=None, **spider_args):
+    """`scrapy crawl fandom` à travers le serveur de fixtures ; retourne (personnages, statistiques)"""
+    command, env = crawl_command(standin, data_dir, settings, **spider_args)
+    subprocess.run(command, cwd=SCRAPER_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=120)
+    return crawl_results(standin, data_dir)
@@ -0,0 +1,86 @@
+import json
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from scrapy.http import Request, TextResponse
+
+from scraper.items import CharacterItem
+from scraper.spiders.fandom_spider import API_BATCH_SIZE
+
+
+@pytest.fixture
+def spider(spider_factory):
+    return spider_factory(mode='api')[1]
+
+
+def api_response(pages, budget_pages=None):
+    url = 'http://benchwiki.fandom.com/api.php'
+    meta = {'wiki': 'benchwiki', 'with_content': True, 'budget_pages': budget_pages or len(pages)}
+    body = json.dumps({'query': {'pages': pages}}).encode('utf-8')
+    return TextResponse(url, body=body, encoding='utf-8', request=Request(url, meta=meta))
+
+
+def titles(request):
+    return parse_qs(urlsplit(request.url).query)['titles'][0].split('|')
+
+
+def test_infobox_wikitext_with_nested_templates_and_links(spider):
+    wikitext = """Intro {{Quote|not an infobox}}
+{{Infobox character
+|name = Aria
+|species = [[Human]] {{ref|chronicles}}
+|origin = [[Northreach]]<br/>[[Old Kingdom|the Old Kingdom]]
+|occupation = ''Knight''<br />Former [[Mercenary|mercenary]]
+|weapon = {{Weapon|Sword|Shield}} of light
+|First_Appearance = '''[[Chapter 1]]'''
+}}
+[[Category:Characters]]"""
+    assert spider.parse_infobox_wikitext(wikitext) == [
+        ('name', 'Aria'),
+        ('species', 'Human'),
+        ('origin', 'Northreach, the Old Kingdom'),
+        ('occupation', 'Knight, Former mercenary'),
+        ('weapon', 'of light'),
+        ('first appearance', 'Chapter 1'),
+    ]
+
+
+def test_wikitext_without_infobox(spider):
+    assert spider.parse_infobox_wikitext("'''Aria''' is a [[Paladin]]. {{Stub}}") == []
+    assert spider.parse_infobox_wikitext('') == []
+
+
+def test_api_pages_skip_missing_pages_and_pages_without_image(spider):
+    content = {'slots': {'main': {'content': '{{Infobox character|species = [[Elf]]|role = Archer}}'}}}
+    response = api_response([
+        {'title': 'Aria', 'fullurl': 'http://benchwiki.fandom.com/wiki/Aria',
+         'original': {'source': 'http://img.test/aria.png/revision/latest?cb=1'}, 'revisions': [content]},
+        {'title': 'Ghost', 'missing': True},
+        {'title': 'Faceless', 'fullurl': 'http://benchwiki.fandom.com/wiki/Faceless', 'revisions': [content]},
+        {'title': 'Bran', 'original': {'source': 'http://img.test/bran.png'}},
+    ])
+    output = list(spider.parse_api_pages(response))
+    items = [item for item in output if isinstance(item, CharacterItem)]
+
+    assert [item['name'] for item in items] == ['Aria', 'Bran']
+    assert items[0]['image_url'] == 'http://img.test/aria.png'
+    assert items[0]['type'] == 'Elf' and items[0]['role'] == 'Archer'
+    # Sans fullurl, l'URL est construite depuis le titre
+    assert items[1]['url'] == 'http://benchwiki.fandom.com/wiki/Bran'
+    target = spider.wikis['benchwiki']
+    assert target.character_count == 2
+    assert target.budget.pages == 4 and target.budget.hits == 2
+
+
+@pytest.mark.parametrize('budget, expected', [(False, [50, 50, 20]), (True, [50, 10])])
+def test_titles_are_requested_in_batches_of_50(spider_factory, budget, expected):
+    _, spider = spider_factory({'CRAWL_BUDGET_ENABLED': budget, 'CRAWL_BUDGET_SLACK': 1.2},
+                               mode='api', character_limit=50)
+    target = spider.wikis['benchwiki']
+    target.budget.add([f'Character {i}' for i in range(120)])
+    requests = list(spider.schedule(target))
+
+    assert [len(titles(request)) for request in requests] == expected
+    assert all(len(titles(request)) <= API_BATCH_SIZE for request in requests)
+    assert [request.meta['budget_pages'] for request in requests] == expected
+    assert titles(requests[0])[0] == 'Character 0'
@@ -0,0 +1,66 @@
+import pytest
+from scrapy import Request
+
+from conftest import run_crawl
+from scraper.budget import CrawlBudget
+
+
+def test_release_follows_remaining_quota():
+    budget = CrawlBudget(slack=1.0)
+    budget.add(range(10))
+    entries, listings = budget.release(3)
+    assert entries == [0, 1, 2]
+    assert listings == []
+    # Tant que les pages sont en cours, rien de plus n'est libéré
+    assert budget.release(3) == ([], [])
+
+
+def test_listing_released_once_backlog_is_empty():
+    budget = CrawlBudget(slack=1.0)
+    low = Request('http://wiki.fandom.com/wiki/Category:Minor_characters', priority=30)
+    high = Request('http://wiki.fandom.com/wiki/Category:Characters?from=200', priority=100)
+    budget.add_listing(low)
+    budget.add_listing(high)
+    budget.add([0])
+    assert budget.release(5) == ([0], [high])
+
+
+def test_yield_rate_accounts_for_dropped_items():
+    budget = CrawlBudget(slack=1.0)
+    budget.add(range(10))
+    budget.release(4)
+    budget.done(4, 4)
+    budget.dropped(2)
+    assert budget.hits == 2
+    assert budget.wanted(2) > 2
+
+
+def test_requeue_puts_pages_back_in_front():
+    budget = CrawlBudget(slack=1.0)
+    budget.add(range(5))
+    entries, _ = budget.release(2)
+    budget.requeue(entries)
+    assert budget.in_flight == 0
+    assert list(budget.backlog) == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize('mode', ['html', 'api'])
+def test_limit_counts_items_kept_by_pipelines(standin_factory, tmp_path, mode):
+    # Une image sur trois répond 404 : ces personnages sont écartés par l'étape image
+    standin = standin_factory(characters=60, broken_images=3)
+    characters, stats = run_crawl(standin, tmp_path, mode=mode, character_limit=20)
+
+    assert len(characters) == 20
+    assert stats['processing/dropped/image'] > 0
+    assert stats['finish_reason'] == 'character_limit'
+    assert stats['downloader/request_count'] < 60
+    # Aucune page n'est téléchargée deux fois, même quand des personnages sont écartés
+    assert set(count for path, count in standin.paths.items() if not path.startswith('/images/')) == {1}
+
+
+def test_short_wiki_finishes_normally(standin_factory, tmp_path):
+    standin = standin_factory(characters=9, broken_images=3)
+    characters, stats = run_crawl(standin, tmp_path, character_limit=20)
+
+    assert len(characters) == 6
+    assert stats['finish_reason'] == 'finished'
@@ -0,0 +1,44 @@
+import json
+import os
+
+from scraper.catalog import WikiCatalog
+
+
+def write(catalog, wiki_name, count):
+    items = [{'name': f'Character {i}', 'image_url': f'http://img/{i}.png' if i % 2 else None} for i in range(count)]
+    with open(catalog.data_path(wiki_name), 'w', encoding='utf-8') as f:
+        json.dump(items, f)
+    return items
+
+
+def test_refresh_sees_files_rewritten_in_place(tmp_path):
+    catalog = WikiCatalog(str(tmp_path))
+    write(catalog, 'testwiki', 1)
+    assert catalog.get('testwiki')['character_count'] == 1
+
+    # Réécriture sur place : la date du dossier ne change pas
+    dir_mtime_ns = os.stat(tmp_path).st_mtime_ns
+    write(catalog, 'testwiki', 3)
+    assert os.stat(tmp_path).st_mtime_ns == dir_mtime_ns
+    entry = catalog.get('testwiki')
+    assert entry['character_count'] == 3
+    assert entry['field_coverage'] == {'name': 3, 'image_url': 1}
+
+
+def test_refresh_adds_and_removes_wikis(tmp_path):
+    catalog = WikiCatalog(str(tmp_path))
+    write(catalog, 'testwiki', 2)
+    write(catalog, 'otherwiki', 1)
+    assert [entry['name'] for entry in catalog.list()] == ['otherwiki', 'testwiki']
+
+    os.remove(catalog.data_path('otherwiki'))
+    assert [entry['name'] for entry in catalog.list()] == ['testwiki']
+
+
+def test_record_is_shared_through_the_catalog_file(tmp_path):
+    catalog = WikiCatalog(str(tmp_path))
+    items = write(catalog, 'testwiki', 4)
+    WikiCatalog(str(tmp_path)).record('testwiki', items)
+    entry = catalog.get('testwiki')
+    assert entry['character_count'] == 4
+    assert entry['last_scraped'] > 0
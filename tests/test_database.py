@@ -0,0 +1,123 @@
+import json
+import os
+
+import pytest
+
+import server
+from scraper.database import CharacterDatabase
+
+# type vide ou absent : stocké à NULL, donc en fin de tri
+TYPES = ['human', 'Elf', None, 'dwarf', '', None]
+ITEMS = [
+    {'name': f'Character {i}', 'url': f'http://benchwiki.fandom.com/wiki/Character_{i}', 'type': value}
+    for i, value in enumerate(TYPES)
+]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = CharacterDatabase.for_data_dir(str(tmp_path))
+    db.replace_wiki('benchwiki', ITEMS)
+    yield db
+    db.close()
+
+
+def positions(items):
+    return [int(item['name'].split()[-1]) for item in items]
+
+
+def test_default_order_seeks_by_position(db):
+    assert positions(db.page('benchwiki', offset=1, limit=2)) == [1, 2]
+    assert positions(db.page('benchwiki', offset=5, limit=2)) == [5]
+    assert db.page('benchwiki', offset=6, limit=2) == []
+
+
+def test_descending_order_seeks_from_the_last_position(db):
+    assert positions(db.page('benchwiki', offset=0, limit=2, descending=True)) == [5, 4]
+    assert positions(db.page('benchwiki', offset=4, limit=5, descending=True)) == [1, 0]
+
+
+@pytest.mark.parametrize('descending, order', [(False, [3, 1, 0]), (True, [0, 1, 3])])
+def test_sort_is_case_insensitive_with_missing_values_last(db, descending, order):
+    # Les personnages sans type restent en fin de liste, dans l'ordre du crawl
+    assert positions(db.page('benchwiki', limit=10, sort='type', descending=descending)) == order + [2, 4, 5]
+
+
+@pytest.mark.parametrize('offset, limit, expected', [
+    (2, 2, [0, 2]),   # fin des valeurs renseignées puis début des valeurs manquantes
+    (3, 2, [2, 4]),   # juste après les valeurs renseignées
+    (4, 2, [4, 5]),   # missing_offset = 4 - 3 valeurs renseignées
+    (5, 2, [5]),
+    (6, 2, []),
+])
+def test_sorted_pages_continue_into_missing_values(db, offset, limit, expected):
+    assert positions(db.page('benchwiki', offset=offset, limit=limit, sort='type')) == expected
+
+
+def test_filters_ignore_case(db):
+    assert positions(db.page('benchwiki', filters={'type': 'HUMAN'})) == [0]
+    assert positions(db.page('benchwiki', filters={'type': 'elf'}, sort='type')) == [1]
+    assert db.count('benchwiki', {'type': 'Dwarf'}) == 1
+    assert db.count('benchwiki') == len(ITEMS)
+
+
+def test_unknown_fields_are_rejected(db):
+    with pytest.raises(ValueError):
+        db.page('benchwiki', filters={'data': 'x'})
+    with pytest.raises(ValueError):
+        db.page('benchwiki', sort='url')
+
+
+def test_sync_reimports_a_file_changed_outside_a_crawl(tmp_path):
+    db = CharacterDatabase.for_data_dir(str(tmp_path))
+    json_path = tmp_path / 'benchwiki_characters.json'
+    json_path.write_text(json.dumps(ITEMS[:2]), encoding='utf-8')
+    assert db.sync('benchwiki', str(json_path))
+    assert db.count('benchwiki') == 2
+
+    # Même taille et même date : le fichier n'est pas relu
+    stat = json_path.stat()
+    json_path.write_text(json.dumps(ITEMS[:2]).replace('human', 'HUMAN'), encoding='utf-8')
+    os.utime(json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    db.sync('benchwiki', str(json_path))
+    assert db.items('benchwiki')[0]['type'] == 'human'
+
+    json_path.write_text(json.dumps(ITEMS), encoding='utf-8')
+    assert db.sync('benchwiki', str(json_path))
+    assert db.count('benchwiki') == len(ITEMS)
+    assert db.source('benchwiki')[1] == json_path.stat().st_size
+
+    json_path.unlink()
+    assert not db.sync('benchwiki', str(json_path))
+    assert db.count('benchwiki') == 0 and db.source('benchwiki') is None
+    db.close()
+
+
+def test_wiki_pages_follow_the_cursor_in_descending_order(tmp_path, monkeypatch):
+    (tmp_path / 'benchwiki_characters.json').write_text(json.dumps(ITEMS), encoding='utf-8')
+    monkeypatch.setenv('DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(server, 'character_db', CharacterDatabase.for_data_dir(str(tmp_path)))
+    client = server.app.test_client()
+
+    names, cursor, pages = [], None, 0
+    while True:
+        query = {'sort': '-type', 'limit': 2, 'fields': 'name,type'}
+        if cursor:
+            query['cursor'] = cursor
+        response = client.get('/wiki/benchwiki', query_string=query)
+        assert response.status_code == 200
+        assert response.json['character_count'] == len(ITEMS)
+        names += [character['name'] for character in response.json['data']]
+        pages += 1
+        cursor = response.json['next_cursor']
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert positions([{'name': name} for name in names]) == [0, 1, 3, 2, 4, 5]
+
+    # Un curseur n'est valable que pour le tri qui l'a produit
+    cursor = server.encode_cursor(2, '-type')
+    response = client.get('/wiki/benchwiki', query_string={'sort': 'type', 'cursor': cursor})
+    assert response.status_code == 400
+    server.character_db.close()
@@ -0,0 +1,87 @@
+import os
+
+from scrapy import Request
+
+from scraper.dedupe import SEEN_FILENAME, BloomDupeFilter, ScalableBloomFilter, SeenFilter
+
+
+def keys(prefix, count):
+    return [f'{prefix}:{i}' for i in range(count)]
+
+
+def filled(capacity=1000, error_rate=0.01, count=7000):
+    bloom = ScalableBloomFilter(capacity, error_rate)
+    duplicates = sum(bloom.add(key) for key in keys('in', count))
+    return bloom, duplicates
+
+
+def test_filters_are_added_as_the_previous_one_fills():
+    bloom, duplicates = filled()
+    # 1000 + 2000 + 4000 clés, chaque filtre deux fois plus strict que le précédent
+    assert [b.capacity for b in bloom.filters] == [1000, 2000, 4000]
+    assert [b.error_rate for b in bloom.filters] == [0.005, 0.0025, 0.00125]
+    assert all(b.count <= b.capacity for b in bloom.filters)
+    assert len(bloom) == 7000 - duplicates
+    assert duplicates < 7000 * 0.01
+    # Pas de faux négatif
+    assert all(key in bloom for key in keys('in', 7000))
+
+
+def test_false_positive_rate_stays_under_the_bound():
+    bloom, _ = filled()
+    false_positives = sum(key in bloom for key in keys('out', 20000))
+    # Borne globale : error_rate / (1 - TIGHTENING)
+    assert false_positives / 20000 <= 0.01 / (1 - ScalableBloomFilter.TIGHTENING)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    bloom, _ = filled(count=3500)
+    path = str(tmp_path / SEEN_FILENAME)
+    bloom.save(path)
+    loaded = ScalableBloomFilter.load(path)
+
+    assert (loaded.capacity, loaded.error_rate, len(loaded)) == (bloom.capacity, bloom.error_rate, len(bloom))
+    assert [b.bits for b in loaded.filters] == [b.bits for b in bloom.filters]
+    assert all(key in loaded for key in keys('in', 3500))
+    # Le dernier filtre n'est pas plein : les ajouts continuent dedans
+    assert not loaded.add('in:new') and len(loaded.filters) == 3
+    assert os.listdir(tmp_path) == [SEEN_FILENAME]
+
+
+def test_seen_filter_is_shared_and_resumed_from_jobdir(spider_factory, tmp_path):
+    settings = {'JOBDIR': str(tmp_path / 'job'), 'DEDUPE_CAPACITY': 100, 'DEDUPE_ERROR_RATE': 0.001}
+    crawler, spider = spider_factory(settings)
+    seen = SeenFilter.from_crawler(crawler)
+    assert SeenFilter.from_crawler(crawler) is seen
+    assert seen.bloom.capacity == 100
+
+    assert not seen.add('link', 'http://benchwiki.fandom.com/wiki/Category:Characters')
+    assert seen.add('link', 'http://benchwiki.fandom.com/wiki/Category:Characters')
+    # Chaque espace de noms a ses propres clés
+    assert not seen.add('item', 'http://benchwiki.fandom.com/wiki/Category:Characters')
+
+    dupefilter = BloomDupeFilter.from_crawler(crawler)
+    assert dupefilter.seen is seen
+    assert not dupefilter.request_seen(Request('http://benchwiki.fandom.com/wiki/Aria'))
+    assert dupefilter.request_seen(Request('http://benchwiki.fandom.com/wiki/Aria#Biography'))
+
+    seen.spider_closed(spider, 'shutdown')
+    assert os.path.exists(tmp_path / 'job' / SEEN_FILENAME)
+    assert crawler.stats.get_value('dedupe/keys') == 3
+
+    # Un nouveau crawl avec le même JOBDIR reprend les clés vues
+    crawler, _ = spider_factory(settings)
+    resumed = SeenFilter.from_crawler(crawler)
+    assert resumed is not seen and len(resumed.bloom) == 3
+    assert resumed.add('item', 'http://benchwiki.fandom.com/wiki/Category:Characters')
+    assert BloomDupeFilter.from_crawler(crawler).request_seen(Request('http://benchwiki.fandom.com/wiki/Aria'))
+    assert not resumed.add('link', 'http://benchwiki.fandom.com/wiki/Bran')
+
+
+def test_seen_filter_without_jobdir_is_not_saved(spider_factory, tmp_path):
+    crawler, spider = spider_factory()
+    seen = SeenFilter.from_crawler(crawler)
+    seen.add('link', 'x')
+    seen.spider_closed(spider, 'finished')
+    assert seen.path is None
+    assert crawler.stats.get_value('dedupe/bytes') == seen.bloom.nbytes
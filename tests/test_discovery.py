@@ -0,0 +1,107 @@
+import json
+
+import pytest
+from scrapy.http import HtmlResponse
+
+from conftest import run_crawl
+from scraper.discovery import (ARTICLE_SCORE, EXACT_SCORE, NAMED_SCORE, RELATED_SCORE, SUBCATEGORY_SCORE,
+                               DiscoveryState, category_candidates, category_score)
+
+WIKI = 'http://benchwiki.fandom.com'
+
+
+@pytest.mark.parametrize('path, subcategory, score', [
+    ('/wiki/Category:Characters', False, EXACT_SCORE),
+    ('/wiki/Category:characters', False, EXACT_SCORE),
+    ('/wiki/Category:Playable_characters', False, NAMED_SCORE),
+    ('/wiki/Category:Characters_(Saga)', False, NAMED_SCORE),
+    ('/wiki/Category:Character_relationships', False, RELATED_SCORE),
+    ('/wiki/Category:Heroes', True, SUBCATEGORY_SCORE),
+    ('/wiki/Category:Heroes', False, None),
+    ('/wiki/Characters', False, ARTICLE_SCORE),
+    ('/wiki/List_of_characters', False, ARTICLE_SCORE),
+    ('/wiki/Characters', True, None),
+    ('/wiki/Aria', False, None),
+    ('/wiki/Special:Characters', False, None),
+    ('/f/Characters', False, None),
+])
+def test_category_score_tiers(path, subcategory, score):
+    assert category_score(WIKI + path, subcategory=subcategory) == score
+
+
+@pytest.mark.parametrize('path', [
+    '/wiki/Category:Character_images',
+    '/wiki/Category:Character_stubs',
+    '/wiki/Category:Character_templates',
+    '/wiki/Category:Character_galleries',
+    '/wiki/Category:Characters?action=edit',
+    '/wiki/Category:Characters?oldid=12',
+])
+def test_category_score_ignores_excluded_words_and_edit_links(path):
+    assert category_score(WIKI + path) is None
+    assert category_score(WIKI + path, subcategory=True) is None
+
+
+def test_category_score_uses_the_requested_category():
+    assert category_score(WIKI + '/wiki/Category:Personnages', 'Personnages') == EXACT_SCORE
+    assert category_score(WIKI + '/wiki/Category:Personnages_jouables', 'Personnages') == RELATED_SCORE
+    assert category_score(WIKI + '/wiki/Category:Characters', 'Personnages') is None
+
+
+def test_category_candidates_keep_the_best_links_of_the_same_wiki():
+    links = [
+        '/wiki/Category:Locations',
+        '/wiki/List_of_characters',
+        '/wiki/Category:Playable_characters#top',
+        'http://otherwiki.fandom.com/wiki/Category:Characters',
+        '/wiki/Category:Character_relationships',
+        '/wiki/Category:Characters',
+        '/wiki/Category:Playable_characters',
+    ]
+    body = ''.join(f'<a href="{href}">x</a>' for href in links)
+    response = HtmlResponse(WIKI + '/wiki/Main_Page', body=f'<html><body>{body}</body></html>', encoding='utf-8')
+
+    assert category_candidates(response, 'Characters', 3) == [
+        (WIKI + '/wiki/Category:Characters', EXACT_SCORE),
+        (WIKI + '/wiki/Category:Playable_characters', NAMED_SCORE),
+        (WIKI + '/wiki/Category:Character_relationships', RELATED_SCORE),
+    ]
+    assert len(category_candidates(response, 'Characters', 10)) == 4
+
+
+def test_discovery_state_save_keeps_entries_written_by_other_crawls(tmp_path):
+    first = DiscoveryState.for_data_dir(str(tmp_path))
+    first.remember('benchwiki', WIKI + '/wiki/Category:Characters')
+    first.remember('gonewiki', 'http://gonewiki.fandom.com/wiki/Category:Characters')
+    first.save()
+
+    # Deux crawls chargent le même état puis le sauvegardent l'un après l'autre
+    second = DiscoveryState.for_data_dir(str(tmp_path))
+    third = DiscoveryState.for_data_dir(str(tmp_path))
+    second.forget('gonewiki')
+    second.save()
+    third.remember('otherwiki', 'http://otherwiki.fandom.com/wiki/Category:Heroes')
+    third.save()
+
+    with open(third.path, 'r', encoding='utf-8') as f:
+        saved = json.load(f)
+    assert sorted(saved) == ['benchwiki', 'otherwiki']
+    assert DiscoveryState.for_data_dir(str(tmp_path)).get('benchwiki') == WIKI + '/wiki/Category:Characters'
+
+
+def test_missing_category_falls_back_to_the_homepage_then_is_remembered(standin_factory, tmp_path):
+    standin = standin_factory(20, category_path='/wiki/Category:Playable_characters')
+    characters, stats = run_crawl(standin, str(tmp_path))
+    assert len(characters) == 20
+    assert stats['discovery/fallback'] == 1
+    assert 'discovery/remembered' not in stats
+    remembered = DiscoveryState.for_data_dir(str(tmp_path)).get('benchwiki')
+    assert category_score(remembered) == NAMED_SCORE and 'Playable' in remembered
+
+    characters, stats = run_crawl(standin, str(tmp_path))
+    assert len(characters) == 20
+    assert stats['discovery/remembered'] == 1
+    assert 'discovery/fallback' not in stats
+    # La catégorie standard n'est demandée qu'au premier crawl, la page d'accueil aussi
+    assert standin.paths['/wiki/Category:Characters'] == 1
+    assert standin.paths['/'] == 1
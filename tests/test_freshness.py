@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import server
+from conftest import run_crawl
+from scraper.catalog import WikiCatalog
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    catalog = WikiCatalog(str(tmp_path))
+    monkeypatch.setattr(server, 'wiki_catalog', catalog)
+    return catalog
+
+
+def record(catalog, count, character_limit, finish_reason):
+    items = [{'name': f'Character {i}', 'url': f'http://testwiki.fandom.com/wiki/Character_{i}'} for i in range(count)]
+    with open(catalog.data_path('testwiki'), 'w', encoding='utf-8') as f:
+        json.dump(items, f)
+    catalog.record('testwiki', items)
+    catalog.record_run('testwiki', character_limit, finish_reason)
+
+
+def test_short_wiki_crawled_to_the_end_is_fresh(catalog):
+    # Le wiki n'a que 6 personnages : le résultat est complet malgré la limite de 50
+    record(catalog, 6, 50, 'finished')
+    result = server.fresh_result('testwiki')
+    assert result is not None
+    assert len(result['data']) == 6
+
+
+def test_interrupted_crawl_is_not_fresh(catalog):
+    record(catalog, 6, 50, 'shutdown')
+    assert server.fresh_result('testwiki') is None
+
+
+def test_smaller_previous_limit_is_not_fresh(catalog):
+    record(catalog, 5, 5, 'character_limit')
+    assert server.fresh_result('testwiki', 5) is not None
+    assert server.fresh_result('testwiki', 20) is None
+    assert server.fresh_result('testwiki') is None
+
+
+def test_file_changed_outside_a_crawl_is_not_fresh(catalog):
+    items = [{'name': 'Character 0', 'url': 'http://testwiki.fandom.com/wiki/Character_0'}]
+    with open(catalog.data_path('testwiki'), 'w', encoding='utf-8') as f:
+        json.dump(items, f)
+    assert catalog.get('testwiki') is not None
+    assert server.fresh_result('testwiki', 1) is None
+
+
+def test_crawl_records_its_limit_and_finish_reason(standin_factory, tmp_path):
+    standin = standin_factory(characters=8)
+    run_crawl(standin, tmp_path, character_limit=20)
+    entry = WikiCatalog(str(tmp_path)).get(standin.fixture.wiki)
+    assert entry['character_count'] == 8
+    assert entry['character_limit'] == 20
+    assert entry['finish_reason'] == 'finished'
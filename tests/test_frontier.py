@@ -0,0 +1,63 @@
+import subprocess
+
+from conftest import SCRAPER_DIR, crawl_command, crawl_results
+from scraper.frontier import SqliteFrontier
+
+FRONTIER_SETTINGS = {
+    'SCHEDULER': 'scraper.frontier.SharedScheduler',
+}
+
+
+def test_fingerprints_are_shared_between_connections(tmp_path):
+    path = str(tmp_path / 'frontier.sqlite')
+    first, second = SqliteFrontier(path), SqliteFrontier(path)
+    assert not first.mark_seen('abc', 'testwiki')
+    assert second.mark_seen('abc', 'testwiki')
+    assert first.mark_seen('abc', 'testwiki')
+
+
+def test_each_request_is_popped_once(tmp_path):
+    path = str(tmp_path / 'frontier.sqlite')
+    first, second = SqliteFrontier(path), SqliteFrontier(path)
+    for i in range(10):
+        first.push('testwiki', i % 3, str(i).encode())
+    popped = []
+    while True:
+        data = [frontier.pop(['testwiki']) for frontier in (first, second)]
+        popped += [value for value in data if value is not None]
+        if None in data:
+            break
+    assert sorted(popped, key=int) == [str(i).encode() for i in range(10)]
+    assert first.pending(['testwiki']) == 0
+
+
+def test_join_resets_a_wiki_nobody_crawls(tmp_path):
+    path = str(tmp_path / 'frontier.sqlite')
+    frontier = SqliteFrontier(path)
+    frontier.mark_seen('abc', 'testwiki')
+    frontier.add_item('testwiki', {'url': 'http://testwiki.fandom.com/wiki/A'})
+    assert frontier.join('worker-1', ['testwiki']) == ['testwiki']
+    assert frontier.count_items('testwiki') == 0
+    assert not frontier.mark_seen('abc', 'testwiki')
+    # Un second processus rejoint le crawl en cours sans rien effacer
+    assert frontier.join('worker-2', ['testwiki']) == []
+    assert frontier.mark_seen('abc', 'testwiki')
+
+
+def test_shared_crawl_fetches_each_page_once(standin_factory, tmp_path):
+    standin = standin_factory(characters=40)
+    settings = dict(FRONTIER_SETTINGS, FRONTIER_PATH=str(tmp_path / 'frontier.sqlite'))
+    data_dirs = [tmp_path / 'worker-1', tmp_path / 'worker-2']
+    processes = []
+    for data_dir in data_dirs:
+        command, env = crawl_command(standin, data_dir, settings, character_limit=1000)
+        processes.append(subprocess.Popen(command, cwd=SCRAPER_DIR, env=env,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    for process in processes:
+        assert process.wait(timeout=120) == 0
+
+    pages = {path: count for path, count in standin.paths.items() if path.startswith('/wiki/Character_')}
+    assert len(pages) == 40
+    assert set(pages.values()) == {1}
+    # Le dernier processus à terminer écrit tous les personnages
+    assert max(len(crawl_results(standin, data_dir)[0]) for data_dir in data_dirs) == 40
@@ -0,0 +1,143 @@
+import os
+import sqlite3
+import subprocess
+import sys
+from time import time
+
+import pytest
+from scrapy.http import HtmlResponse, Request
+
+from conftest import SCRAPER_DIR
+from scraper.httpcache import SqliteCacheStorage, compact, evict
+
+URL = 'http://benchwiki.fandom.com/wiki/Character_{}'
+
+
+@pytest.fixture
+def cache(spider_factory, tmp_path):
+    """Ouvre un stockage dans tmp_path/httpcache ; fermé à la fin du test s'il ne l'est pas déjà"""
+    opened = []
+
+    def open_storage(**settings):
+        crawler, spider = spider_factory({'HTTPCACHE_DIR': str(tmp_path / 'httpcache'), **settings})
+        storage = SqliteCacheStorage(crawler.settings)
+        storage.open_spider(spider)
+        opened.append(storage)
+        return storage, spider
+
+    yield open_storage
+    for storage in opened:
+        try:
+            storage.conn.close()
+        except sqlite3.ProgrammingError:
+            pass
+
+
+def store(storage, spider, index, body=None):
+    request = Request(URL.format(index))
+    body = body if body is not None else f'<html><body>Character {index}</body></html>'.encode('utf-8')
+    response = HtmlResponse(request.url, status=200, body=body,
+                            headers={'Content-Type': 'text/html; charset=utf-8', 'ETag': f'"{index}"'})
+    storage.store_response(spider, request, response)
+    return request
+
+
+def cached_urls(storage):
+    return {url for url, in storage.conn.execute('SELECT url FROM responses')}
+
+
+def test_store_and_retrieve_round_trip(cache):
+    storage, spider = cache()
+    store(storage, spider, 1)
+
+    response = storage.retrieve_response(spider, Request(URL.format(1)))
+    assert isinstance(response, HtmlResponse)
+    assert (response.url, response.status) == (URL.format(1), 200)
+    assert response.body == b'<html><body>Character 1</body></html>'
+    assert response.headers['ETag'] == b'"1"'
+    assert storage.retrieve_response(spider, Request(URL.format(2))) is None
+
+    # Le corps est compressé dans la base
+    raw, = storage.conn.execute('SELECT body FROM responses').fetchone()
+    assert raw != response.body
+
+
+def test_retrieve_marks_the_cache_timestamp(cache):
+    storage, spider = cache()
+    store(storage, spider, 1)
+    request = Request(URL.format(1))
+    storage.retrieve_response(spider, request)
+    assert time() - request.meta['cache_timestamp'] < 60
+
+
+def test_expired_responses_are_ignored_then_removed(cache):
+    storage, spider = cache(HTTPCACHE_EXPIRATION_SECS=60)
+    store(storage, spider, 1)
+    store(storage, spider, 2)
+    storage.conn.execute('UPDATE responses SET stored_at = ? WHERE url = ?', (time() - 120, URL.format(1)))
+
+    assert storage.retrieve_response(spider, Request(URL.format(1))) is None
+    assert storage.retrieve_response(spider, Request(URL.format(2))) is not None
+    storage.close_spider(spider)
+
+    storage, spider = cache(HTTPCACHE_EXPIRATION_SECS=60)
+    assert cached_urls(storage) == {URL.format(2)}
+
+
+def test_least_recently_read_responses_are_evicted(cache):
+    storage, spider = cache(HTTPCACHE_SQLITE_MAX_BYTES=0)
+    for i in range(10):
+        store(storage, spider, i, body=os.urandom(1000))
+        storage.conn.execute('UPDATE responses SET accessed_at = ? WHERE url = ?', (1000 + i, URL.format(i)))
+    # Une lecture rend l'entrée la plus ancienne récente
+    storage.retrieve_response(spider, Request(URL.format(0)))
+    sizes = dict(storage.conn.execute('SELECT url, size FROM responses'))
+    max_bytes = sum(sizes.values()) - 1
+
+    removed = evict(storage.conn, max_bytes)
+    # Descente à 90 % du budget : les deux entrées les moins récemment lues partent
+    assert removed == 2
+    assert cached_urls(storage) == {URL.format(i) for i in (0, *range(3, 10))}
+    total, = storage.conn.execute('SELECT SUM(size) FROM responses').fetchone()
+    assert total <= max_bytes * 0.9
+
+
+def test_writes_evict_once_the_budget_is_exceeded(cache):
+    storage, spider = cache(HTTPCACHE_SQLITE_MAX_BYTES=20000)
+    for i in range(40):
+        store(storage, spider, i, body=os.urandom(1000))
+    total, = storage.conn.execute('SELECT SUM(size) FROM responses').fetchone()
+    assert total <= 20000
+    assert URL.format(39) in cached_urls(storage)
+
+
+def test_compact_reclaims_space(cache, tmp_path):
+    storage, spider = cache(HTTPCACHE_SQLITE_MAX_BYTES=0)
+    for i in range(50):
+        store(storage, spider, i, body=os.urandom(4000))
+    storage.close_spider(spider)
+    path = str(tmp_path / 'httpcache' / 'cache.sqlite')
+
+    removed, before, after = compact(path, max_bytes=50000)
+    assert removed > 0 and after < before
+    assert not os.path.exists(path + '-wal') or os.path.getsize(path + '-wal') == 0
+
+
+def compactcache(tmp_path, *args):
+    command = [sys.executable, '-m', 'scrapy', 'compactcache', '-s', f'HTTPCACHE_DIR={tmp_path / "httpcache"}', *args]
+    return subprocess.run(command, cwd=SCRAPER_DIR, check=True, capture_output=True, text=True, timeout=60).stdout
+
+
+def test_compactcache_command(cache, tmp_path):
+    assert 'Aucun cache à compacter' in compactcache(tmp_path)
+
+    storage, spider = cache(HTTPCACHE_SQLITE_MAX_BYTES=0)
+    for i in range(20):
+        store(storage, spider, i, body=os.urandom(4000))
+    storage.close_spider(spider)
+
+    output = compactcache(tmp_path, '--max-bytes', '40000')
+    assert 'réponses supprimées' in output
+    storage, spider = cache()
+    total, = storage.conn.execute('SELECT SUM(size) FROM responses').fetchone()
+    assert total <= 40000 * 0.9
@@ -0,0 +1,64 @@
+import json
+import os
+
+from scrapy.http import Request
+
+from conftest import run_crawl
+from scraper.middlewares import IncrementalRecrawlMiddleware
+
+PAGE_URL = 'http://benchwiki.fandom.com/wiki/Character_1'
+
+
+def by_url(characters):
+    return sorted(characters, key=lambda character: character['url'])
+
+
+def test_conditional_headers_come_from_the_recrawl_state(spider_factory):
+    crawler, spider = spider_factory(incremental=1)
+    spider.wikis['benchwiki'].recrawl_state.update(
+        PAGE_URL, etag='"abc"', last_modified='Mon, 02 Jan 2023 10:00:00 GMT'
+    )
+    middleware = IncrementalRecrawlMiddleware.from_crawler(crawler)
+
+    request = Request(PAGE_URL, meta={'wiki': 'benchwiki', 'recrawl_key': PAGE_URL})
+    middleware.process_request(request, spider)
+    assert request.headers['If-None-Match'] == b'"abc"'
+    assert request.headers['If-Modified-Since'] == b'Mon, 02 Jan 2023 10:00:00 GMT'
+    assert request.meta['dont_cache']
+
+    # Page jamais vue : pas de condition, mais toujours hors cache HTTP
+    other = Request(PAGE_URL + '0', meta={'wiki': 'benchwiki', 'recrawl_key': PAGE_URL + '0'})
+    middleware.process_request(other, spider)
+    assert b'If-None-Match' not in other.headers and other.meta['dont_cache']
+
+
+def test_second_crawl_reuses_items_of_unmodified_pages(standin_factory, tmp_path):
+    standin = standin_factory(20, etags=True)
+    first, stats = run_crawl(standin, str(tmp_path), incremental=1)
+    assert len(first) == 20
+    assert stats['incremental/changed'] == 20
+    assert 'incremental/reused_items' not in stats
+    with open(tmp_path / '.state' / 'benchwiki_pages.json', 'r', encoding='utf-8') as f:
+        pages = json.load(f)
+    assert all(page['etag'] for page in pages.values()) and len(pages) == 20
+
+    second, stats = run_crawl(standin, str(tmp_path), incremental=1)
+    # Chaque page de personnage répond 304 à sa requête conditionnelle
+    assert standin.counts['304 wiki'] == 20
+    assert stats['incremental/not_modified'] == 20
+    assert stats['incremental/reused_items'] == 20
+    assert by_url(second) == by_url(first)
+
+
+def test_api_crawl_reuses_items_of_unchanged_revisions(standin_factory, tmp_path):
+    standin = standin_factory(20)
+    first, _ = run_crawl(standin, str(tmp_path), mode='api', incremental=1)
+    assert len(first) == 20
+    content_requests = sum(count for path, count in standin.paths.items() if 'revisions' in path)
+
+    second, stats = run_crawl(standin, str(tmp_path), mode='api', incremental=1)
+    assert stats['incremental/reused_items'] == 20
+    # Même lastrevid : le contenu des pages n'est pas redemandé
+    assert sum(count for path, count in standin.paths.items() if 'revisions' in path) == content_requests
+    assert by_url(second) == by_url(first)
+    assert os.path.exists(tmp_path / '.state' / 'benchwiki_pages.json')
@@ -0,0 +1,74 @@
+from scrapy.http import HtmlResponse, Request
+
+from benchmarks.standin import Fixture
+from scraper.infobox import InfoboxExtractor
+from scraper.items import CharacterItem
+
+FIXTURE = Fixture()
+IMAGE_URL = 'http://img.test/7.png'
+
+
+def character_page(index):
+    url = f'http://benchwiki.fandom.com/wiki/{Fixture.slug(index)}'
+    return HtmlResponse(url, body=FIXTURE.character_page(index, IMAGE_URL).encode('utf-8'), encoding='utf-8',
+                        request=Request(url, meta={'wiki': 'benchwiki'}))
+
+
+def test_english_infobox_fields_and_attributes():
+    fields, attributes, image_url = InfoboxExtractor().extract(character_page(0))
+    assert fields == {'type': 'Human', 'origin': 'Northreach , Old Kingdom',
+                      'role': 'Knight-commander Former mercenary', 'class_name': 'Paladin'}
+    assert attributes == {'born': '312 SA', 'gender': 'Female', 'affiliation': 'Order of Dawn',
+                          'first': 'Chapter 1', 'voice': 'Jane Doe'}
+    assert image_url.startswith(IMAGE_URL)
+
+
+def test_french_infobox_uses_french_keywords():
+    fields, attributes, _ = InfoboxExtractor().extract(character_page(1))
+    assert fields == {'type': 'Elfe', 'origin': 'Sylvanor', 'role': 'Marchande'}
+    assert attributes == {}
+
+
+def test_data_source_wins_over_an_unknown_label():
+    # « Homeworld » n'est pas un mot-clé, mais data-source="from" l'est
+    fields, attributes, _ = InfoboxExtractor().extract(character_page(2))
+    assert fields['origin'] == 'Netherrealm'
+    assert attributes == {'status': 'Deceased (formerly)', 'weapon': 'Twin blades',
+                          'fighting_style': 'Shadow arts'}
+
+
+def test_exact_match_then_keyword_search_by_field_priority():
+    extractor = InfoboxExtractor()
+    assert extractor.map_label('Espèce') == 'type'
+    assert extractor.map_label('Home planet', data_source='birthplace') == 'origin'
+    assert extractor.map_label('Primary occupation') == 'role'
+    # Deux mots-clés : le champ le plus prioritaire de la table l'emporte
+    assert extractor.map_label('Class of origin') == 'class_name'
+    assert extractor.map_label('Weapon') is None
+
+
+def test_first_value_wins_and_later_ones_become_attributes():
+    extractor = InfoboxExtractor()
+    character, attributes = {}, {}
+    extractor.assign(character, attributes, 'Species', 'Human', data_source='species')
+    extractor.assign(character, attributes, 'Race', 'Elf', data_source='race')
+    extractor.assign(character, attributes, 'Gender', '', data_source='gender')
+    assert character == {'type': 'Human'}
+    assert attributes == {'race': 'Elf'}
+
+
+def test_custom_field_map_replaces_the_keywords_of_a_field():
+    extractor = InfoboxExtractor({'type': ['faction']})
+    assert extractor.map_label('Faction') == 'type'
+    assert extractor.map_label('Species') is None
+    assert extractor.map_label('Occupation') == 'role'
+
+
+def test_spider_uses_the_field_map_of_its_wiki(spider_factory):
+    crawler, spider = spider_factory({'INFOBOX_FIELD_MAPS': {'benchwiki': {'type': ['gender']}}})
+    target = spider.wikis['benchwiki']
+    output = spider.parse_character_page(character_page(0), {'name': 'Character 0', 'url': 'x'})
+    items = [item for item in output if isinstance(item, CharacterItem)]
+    assert items[0]['type'] == 'Female'
+    assert items[0]['attributes']['species'] == 'Human'
+    assert target.infobox is spider.infobox(target)
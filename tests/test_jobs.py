@@ -0,0 +1,76 @@
+import threading
+
+from jobs import DONE, JobManager, WikiLocks
+
+
+def blocking_manager():
+    release = threading.Event()
+    runs = []
+
+    def run_job(job):
+        runs.append(job.id)
+        release.wait(5)
+        return {'message': 'ok', 'data': []}
+
+    return JobManager(run_job, max_workers=2), release, runs
+
+
+def wait_done(job):
+    closed = False
+    while not closed:
+        _, closed = job.events.read(len(job.events.events), timeout=5)
+
+
+def test_identical_requests_share_the_active_job():
+    manager, release, runs = blocking_manager()
+    key = ('scrape', 'testwiki', 'html', False, None)
+    first = manager.submit('http://testwiki.fandom.com/', 'testwiki', key=key)
+    second = manager.submit('http://testwiki.fandom.com/', 'testwiki', key=key)
+    other = manager.submit('http://testwiki.fandom.com/', 'testwiki', key=('scrape', 'testwiki', 'html', False, 5))
+
+    assert second is first
+    assert first.to_dict()['coalesced']
+    assert other is not first
+    release.set()
+    wait_done(first)
+    wait_done(other)
+    assert len(runs) == 2
+
+
+def test_finished_job_is_not_shared():
+    manager, release, runs = blocking_manager()
+    release.set()
+    key = ('scrape', 'testwiki', 'html', False, None)
+    first = manager.submit('http://testwiki.fandom.com/', 'testwiki', key=key)
+    wait_done(first)
+    second = manager.submit('http://testwiki.fandom.com/', 'testwiki', key=key)
+    assert second is not first
+    wait_done(second)
+
+
+def test_recorded_job_is_done_with_closed_events():
+    manager, _, runs = blocking_manager()
+    job = manager.record('http://testwiki.fandom.com/', 'testwiki', {}, {'message': 'ok', 'data': [1]})
+    events, closed = job.events.read(0)
+    assert job.status == DONE
+    assert closed
+    assert events[-1] == ('status', dict(job.to_dict(), result={'message': 'ok'}))
+    assert runs == []
+
+
+def test_wiki_locks_serialize_the_same_wiki():
+    locks = WikiLocks()
+    order = []
+
+    def hold_b():
+        with locks.hold(['b']):
+            order.append('b')
+
+    with locks.hold(['a', 'b']):
+        thread = threading.Thread(target=hold_b)
+        thread.start()
+        thread.join(0.2)
+        assert order == []
+        order.append('a')
+    thread.join(5)
+    assert order == ['a', 'b']
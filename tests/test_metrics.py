@@ -0,0 +1,63 @@
+import asyncio
+import inspect
+
+import pytest
+from scrapy import Spider
+from scrapy.exceptions import DropItem
+from scrapy.utils.test import get_crawler
+
+from conftest import run_crawl
+from scraper.metrics import timed_pipeline
+
+
+@timed_pipeline
+class SyncPipeline:
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls()
+
+    def process_item(self, item, spider):
+        if item.get('drop'):
+            raise DropItem('écarté')
+        return item
+
+
+@timed_pipeline
+class AsyncPipeline:
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls()
+
+    async def process_item(self, item):
+        await asyncio.sleep(0)
+        return item
+
+
+def test_pipelines_are_timed_without_changing_their_signature():
+    crawler = get_crawler(Spider)
+    crawler.stats.open_spider()
+    sync, coroutine = SyncPipeline.from_crawler(crawler), AsyncPipeline.from_crawler(crawler)
+
+    assert list(inspect.signature(sync.process_item).parameters) == ['item', 'spider']
+    assert inspect.iscoroutinefunction(coroutine.process_item)
+    assert sync.process_item({'name': 'a'}, None) == {'name': 'a'}
+    with pytest.raises(DropItem):
+        sync.process_item({'drop': True}, None)
+    assert asyncio.run(coroutine.process_item({'name': 'b'})) == {'name': 'b'}
+
+    stats = crawler.stats.get_stats()
+    assert stats['timing/pipeline/SyncPipeline/count'] == 2
+    assert stats['timing/pipeline/AsyncPipeline/count'] == 1
+
+
+def test_metrics_can_be_disabled():
+    crawler = get_crawler(Spider, {'METRICS_ENABLED': False})
+    pipeline = SyncPipeline.from_crawler(crawler)
+    assert not hasattr(pipeline.process_item, '__wrapped__')
+
+
+def test_crawl_times_each_project_pipeline(standin_factory, tmp_path):
+    standin = standin_factory(characters=5)
+    characters, stats = run_crawl(standin, tmp_path, character_limit=5)
+    for name in ('ProcessingPipeline', 'ThumbnailWarmPipeline', 'StreamingStoragePipeline'):
+        assert stats[f'timing/pipeline/{name}/count'] == len(characters)
@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from scrapy import Spider
+from scrapy.exceptions import DropItem
+from scrapy.utils.test import get_crawler
+
+from scraper.items import CharacterItem
+from scraper.pipelines import ProcessingPipeline, Stage
+
+SPIDER = SimpleNamespace(clean_image_url=lambda url: url.split('?')[0])
+
+
+def pipeline(stages=None, **settings):
+    settings.setdefault('IMAGE_VALIDATION_ENABLED', False)
+    if stages is not None:
+        settings['PROCESSING_STAGES'] = stages
+    crawler = get_crawler(Spider, settings)
+    crawler.stats.open_spider()
+    processing = ProcessingPipeline.from_crawler(crawler)
+    processing.open_spider(SPIDER)
+    return processing, crawler.stats
+
+
+def character(name, index=1, image='http://img.test/1.png'):
+    return CharacterItem(name=name, url=f'http://testwiki.fandom.com/wiki/Foo?oldid={index}', image_url=image)
+
+
+def process_all(processing, items):
+    """Résultats (item ou DropItem) de process_item pour des items envoyés ensemble"""
+    async def run():
+        results = await asyncio.gather(*(processing.process_item(item, SPIDER) for item in items),
+                                       return_exceptions=True)
+        await processing.close_spider(SPIDER)
+        return results
+    return asyncio.run(run())
+
+
+def test_cleaning_runs_before_dedupe():
+    processing, stats = pipeline()
+    results = process_all(processing, [character('Foo (Character)', 1), character('Foo', 2)])
+    assert results[0]['name'] == 'Foo'
+    assert results[0]['url'] == 'http://testwiki.fandom.com/wiki/Foo'
+    assert isinstance(results[1], DropItem)
+    assert stats.get_value('processing/dropped/dedupe') == 1
+
+
+def test_stage_order_does_not_depend_on_the_setting():
+    processing, _ = pipeline(['image', 'dedupe', 'clean'])
+    assert [stage.name for stage in processing.stages] == ['clean', 'dedupe', 'image']
+
+
+def test_disabled_stages_do_not_run():
+    processing, stats = pipeline(['clean', 'validate'])
+    results = process_all(processing, [character('Foo'), character('Foo'), character('Bar', image=None)])
+    # Sans déduplication ni vérification d'image, tout passe
+    assert not any(isinstance(result, DropItem) for result in results)
+    assert stats.get_value('processing/items') == 3
+
+
+def test_unknown_stage_is_rejected():
+    with pytest.raises(ValueError, match='inconnues : thumbnails'):
+        pipeline(['clean', 'thumbnails'])
+
+
+def test_drops_are_counted_per_stage():
+    processing, stats = pipeline()
+    results = process_all(processing, [
+        character('Foo'),
+        character('Foo', 2),
+        CharacterItem(name='', url='http://testwiki.fandom.com/wiki/Empty', image_url='http://img.test/2.png'),
+        character('Bar', 3, image='http://img.test/bar.txt'),
+    ])
+    assert [isinstance(result, DropItem) for result in results] == [False, True, True, True]
+    assert stats.get_value('processing/dropped/dedupe') == 1
+    assert stats.get_value('processing/dropped/validate') == 1
+    assert stats.get_value('processing/dropped/image') == 1
+
+
+def test_full_batch_is_flushed_without_waiting_for_the_delay():
+    processing, stats = pipeline(PROCESSING_BATCH_SIZE=3, PROCESSING_BATCH_DELAY=60)
+    results = process_all(processing, [character(f'Foo {i}', i) for i in range(3)])
+    assert all(isinstance(result, CharacterItem) for result in results)
+    assert stats.get_value('processing/batches') == 1
+
+
+def test_partial_batch_waits_for_the_delay():
+    processing, stats = pipeline(PROCESSING_BATCH_SIZE=3, PROCESSING_BATCH_DELAY=0.01)
+    results = process_all(processing, [character(f'Foo {i}', i) for i in range(4)])
+    assert all(isinstance(result, CharacterItem) for result in results)
+    assert stats.get_value('processing/batches') == 2
+
+
+def test_base_stage_keeps_every_item():
+    kept = asyncio.run(Stage().run([(None, {'name': 'Foo'}, None)], drop=None))
+    assert kept == [(None, {'name': 'Foo'}, None)]
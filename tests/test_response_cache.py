@@ -0,0 +1,123 @@
+import gzip
+import json
+import os
+
+import pytest
+
+import server
+from response_cache import ResponseCache
+
+CHARACTERS = [{'name': f'Character {i}', 'type': 'Human'} for i in range(20)]
+
+
+class Builder:
+    """build(path) qui compte ses appels"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+@pytest.fixture
+def json_path(tmp_path):
+    path = tmp_path / 'benchwiki_characters.json'
+    path.write_text(json.dumps(CHARACTERS), encoding='utf-8')
+    return path
+
+
+def test_entries_are_reused_until_the_file_changes(json_path):
+    cache, build = ResponseCache(), Builder()
+    entry = cache.get('benchwiki', str(json_path), build)
+    assert cache.get('benchwiki', str(json_path), build) is entry
+    assert build.calls == 1
+    assert gzip.decompress(entry.gzipped) == entry.body
+
+    # Même taille, autre date de modification
+    stat = json_path.stat()
+    os.utime(json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    changed = cache.get('benchwiki', str(json_path), build)
+    assert build.calls == 2 and changed.etag != entry.etag
+
+    # Même date de modification, autre taille
+    stat = json_path.stat()
+    json_path.write_text(json.dumps(CHARACTERS[:5]), encoding='utf-8')
+    os.utime(json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    resized = cache.get('benchwiki', str(json_path), build)
+    assert build.calls == 3 and resized.etag != changed.etag
+    assert json.loads(resized.body) == CHARACTERS[:5]
+
+    cache.invalidate('benchwiki')
+    assert cache.entries == {} and cache.total_bytes == 0
+    cache.get('benchwiki', str(json_path), build)
+    assert build.calls == 4
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    paths = {}
+    for name in ('a', 'b', 'c'):
+        paths[name] = tmp_path / f'{name}.json'
+        paths[name].write_bytes(os.urandom(1000))
+    entry_size = ResponseCache().get('a', str(paths['a']), Builder()).nbytes
+    cache, build = ResponseCache(max_bytes=2 * entry_size), Builder()
+
+    cache.get('a', str(paths['a']), build)
+    cache.get('b', str(paths['b']), build)
+    cache.get('a', str(paths['a']), build)
+    cache.get('c', str(paths['c']), build)
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.total_bytes == sum(entry.nbytes for entry in cache.entries.values())
+
+    # Une réponse plus grande que le budget est servie sans être gardée
+    small = ResponseCache(max_bytes=entry_size - 1)
+    assert small.get('a', str(paths['a']), build).body == paths['a'].read_bytes()
+    assert small.entries == {} and small.total_bytes == 0
+
+
+@pytest.fixture
+def client(json_path, monkeypatch):
+    monkeypatch.setenv('DATA_DIR', str(json_path.parent))
+    monkeypatch.setattr(server, 'wiki_response_cache', ResponseCache())
+    return server.app.test_client()
+
+
+def test_etag_and_not_modified(client):
+    response = client.get('/wiki/benchwiki')
+    assert response.status_code == 200
+    assert response.json['character_count'] == len(CHARACTERS)
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+    etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+
+    response = client.get('/wiki/benchwiki', headers={'If-None-Match': etag})
+    assert response.status_code == 304 and response.data == b''
+
+    response = client.get('/wiki/benchwiki', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+
+
+def test_gzip_and_identity_have_different_etags(client):
+    identity = client.get('/wiki/benchwiki')
+    gzipped = client.get('/wiki/benchwiki', headers={'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(gzipped.data) == identity.data
+    assert gzipped.headers['ETag'] == identity.headers['ETag'][:-1] + '-gz"'
+
+    # L'ETag d'un encodage ne valide pas l'autre
+    response = client.get('/wiki/benchwiki', headers={'Accept-Encoding': 'gzip', 'If-None-Match': identity.headers['ETag']})
+    assert response.status_code == 200
+    response = client.get('/wiki/benchwiki', headers={'Accept-Encoding': 'gzip', 'If-None-Match': gzipped.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_changed_file_is_served_with_a_new_etag(client, json_path):
+    first = client.get('/wiki/benchwiki')
+    json_path.write_text(json.dumps(CHARACTERS[:3]), encoding='utf-8')
+
+    response = client.get('/wiki/benchwiki', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+    assert response.json['character_count'] == 3
+    assert response.headers['ETag'] != first.headers['ETag']
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+import server
+from scraper.catalog import WikiCatalog
+from scraper.database import CharacterDatabase
+from scraper.search import SearchIndex, trigrams
+
+CHARACTERS = [
+    {'name': 'Aria Stormblade', 'type': 'Human', 'class_name': 'Paladin'},
+    {'name': 'Paladin Bran', 'type': 'Dwarf'},
+    {'name': 'Arya', 'type': 'Elf'},
+    {'name': 'Éloïse', 'origin': 'Sylvanor'},
+]
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.update_wiki('benchwiki', CHARACTERS, version=(1, 1))
+    return index
+
+
+def ranking(index, query, **kwargs):
+    total, results = index.search(query, **kwargs)
+    assert total >= len(results)
+    return [(result['name'], result['score']) for result in results]
+
+
+def test_trigrams_are_padded():
+    assert trigrams('cat') == {'  c', ' ca', 'cat', 'at '}
+
+
+def test_name_matches_rank_above_other_fields(index):
+    assert ranking(index, 'paladin') == [('Paladin Bran', 3.0), ('Aria Stormblade', 1.0)]
+
+
+def test_prefixes_match_fully(index):
+    assert ranking(index, 'pal') == [('Paladin Bran', 3.0), ('Aria Stormblade', 1.0)]
+    assert ranking(index, 'sylv') == [('Éloïse', 1.0)]
+
+
+def test_close_words_are_scored_by_dice_coefficient(index):
+    # aria / arya : 2 trigrammes communs sur 5 + 5
+    assert ranking(index, 'aria') == [('Aria Stormblade', 3.0), ('Arya', 1.2)]
+    # palatin / paladin : 5 trigrammes communs sur 8 + 8
+    assert ranking(index, 'palatin') == [('Paladin Bran', 1.875), ('Aria Stormblade', 0.625)]
+    assert ranking(index, 'zzzz') == []
+
+
+def test_words_of_a_query_add_up_without_accents_or_case(index):
+    assert ranking(index, 'ARIA human')[0] == ('Aria Stormblade', 4.0)
+    assert ranking(index, 'eloise') == [('Éloïse', 3.0)]
+
+
+def test_update_and_remove_wiki_leave_other_wikis_alone(index):
+    index.update_wiki('otherwiki', [{'name': 'Arianne', 'type': 'Human'}], version=(2, 2))
+    assert index.search('human')[0] == 2
+    assert [r['name'] for r in index.search('human', wiki='otherwiki')[1]] == ['Arianne']
+
+    # Réindexer un wiki remplace ses documents
+    index.update_wiki('benchwiki', [{'name': 'Bran', 'type': 'Dwarf'}], version=(1, 2))
+    assert ranking(index, 'human') == [('Arianne', 1.0)]
+    assert index.versions == {'benchwiki': (1, 2), 'otherwiki': (2, 2)}
+
+    index.remove_wiki('otherwiki')
+    index.remove_wiki('benchwiki')
+    assert index.search('human') == (0, [])
+    # Les mots et trigrammes qui n'indexent plus rien sont supprimés
+    assert index.docs == {} and index.postings == {} and index.grams == {} and index.versions == {}
+
+
+def test_search_endpoint_paginates(tmp_path, monkeypatch):
+    characters = [{'name': f'Paladin {i}', 'url': f'http://benchwiki.fandom.com/wiki/Paladin_{i}'} for i in range(3)]
+    (tmp_path / 'benchwiki_characters.json').write_text(json.dumps(characters), encoding='utf-8')
+    monkeypatch.setattr(server, 'wiki_catalog', WikiCatalog(str(tmp_path)))
+    monkeypatch.setattr(server, 'character_db', CharacterDatabase.for_data_dir(str(tmp_path)))
+    monkeypatch.setattr(server, 'search_index', SearchIndex())
+    client = server.app.test_client()
+
+    first = client.get('/search', query_string={'q': 'paladin', 'limit': 2}).json
+    assert first['total'] == 3 and first['next_offset'] == 2
+    assert [r['name'] for r in first['results']] == ['Paladin 0', 'Paladin 1']
+    assert all(r['wiki'] == 'benchwiki' for r in first['results'])
+
+    last = client.get('/search', query_string={'q': 'paladin', 'limit': 2, 'offset': 2}).json
+    assert last['total'] == 3 and last['next_offset'] is None
+    assert [r['name'] for r in last['results']] == ['Paladin 2']
+
+    assert client.get('/search', query_string={'q': 'paladin', 'wiki': 'otherwiki'}).json['total'] == 0
+    assert client.get('/search').status_code == 400
+    assert client.get('/search', query_string={'q': 'paladin', 'limit': 0}).status_code == 400
+    server.character_db.close()
@@ -0,0 +1,36 @@
+import pytest
+
+import server
+from jobs import JobManager
+
+
+@pytest.fixture
+def client():
+    return server.app.test_client()
+
+
+@pytest.mark.parametrize('limit', [True, False, 0, -3, 2.5, '10'])
+def test_scrape_rejects_invalid_limits(client, limit):
+    response = client.post('/scrape', json={'url': 'http://testwiki.fandom.com/', 'limit': limit})
+    assert response.status_code == 400
+    assert response.json['error'] == 'La limite doit être un entier positif'
+
+
+@pytest.mark.parametrize('limit', [True, False, 0, '10'])
+def test_batch_rejects_invalid_limits(client, limit):
+    response = client.post('/scrape/batch', json={'wikis': [{'url': 'http://testwiki.fandom.com/', 'limit': limit}]})
+    assert response.status_code == 400
+    assert response.json['error'] == 'La limite doit être un entier positif'
+
+
+def test_batch_job_lists_its_wikis_in_separate_fields(client, monkeypatch):
+    runs = []
+    monkeypatch.setattr(server, 'job_manager', JobManager(runs.append, max_workers=1))
+    response = client.post('/scrape/batch', json={'wikis': [
+        'http://testwiki.fandom.com/', {'url': 'http://otherwiki.fandom.com/', 'limit': 5}
+    ]})
+    assert response.status_code == 202
+    job = client.get(f"/jobs/{response.json['job_id']}").json
+    assert job['url'] is None and job['wiki_name'] is None
+    assert job['urls'] == ['http://testwiki.fandom.com/', 'http://otherwiki.fandom.com/']
+    assert job['wiki_names'] == ['testwiki', 'otherwiki']
@@ -0,0 +1,104 @@
+import json
+import threading
+
+import pytest
+
+import server
+from jobs import JobManager, ScrapeJob
+
+
+@pytest.fixture
+def job(monkeypatch):
+    """Job enregistré sans être lancé : ses événements sont publiés par le test"""
+    manager = JobManager(lambda job: None, max_workers=1)
+    job = ScrapeJob('http://benchwiki.fandom.com/', 'benchwiki')
+    manager.jobs[job.id] = job
+    monkeypatch.setattr(server, 'job_manager', manager)
+    return job
+
+
+@pytest.fixture
+def client():
+    return server.app.test_client()
+
+
+def publish(job, count):
+    for i in range(count):
+        job.events.publish('character', {'name': f'Character {i}'})
+
+
+def sse_events(body):
+    events = []
+    for block in body.split('\n\n'):
+        if not block or block.startswith(':'):
+            continue
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_sse_framing_until_the_job_ends(client, job):
+    publish(job, 2)
+    job.events.close()
+    response = client.get(f'/jobs/{job.id}/stream')
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert response.headers['X-Accel-Buffering'] == 'no'
+    body = response.get_data(as_text=True)
+    assert body == (
+        'id: 0\nevent: character\ndata: {"name": "Character 0"}\n\n'
+        'id: 1\nevent: character\ndata: {"name": "Character 1"}\n\n'
+    )
+
+
+@pytest.mark.parametrize('options', [
+    {'query_string': {'format': 'ndjson'}},
+    {'headers': {'Accept': 'application/x-ndjson'}},
+])
+def test_ndjson_framing(client, job, options):
+    publish(job, 2)
+    job.events.close()
+    response = client.get(f'/jobs/{job.id}/stream', **options)
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {'id': 0, 'event': 'character', 'data': {'name': 'Character 0'}},
+        {'id': 1, 'event': 'character', 'data': {'name': 'Character 1'}},
+    ]
+
+
+@pytest.mark.parametrize('options', [
+    {'headers': {'Last-Event-ID': '2'}},
+    {'query_string': {'last_event_id': '2'}},
+])
+def test_resume_after_the_last_event_id(client, job, options):
+    publish(job, 5)
+    job.events.close()
+    body = client.get(f'/jobs/{job.id}/stream', **options).get_data(as_text=True)
+    assert [event[0] for event in sse_events(body)] == [3, 4]
+    assert sse_events(body)[0][2] == {'name': 'Character 3'}
+
+
+def test_invalid_last_event_id_and_unknown_job(client, job):
+    response = client.get(f'/jobs/{job.id}/stream', headers={'Last-Event-ID': 'abc'})
+    assert response.status_code == 400
+    assert client.get('/jobs/unknown/stream').status_code == 404
+
+
+@pytest.mark.parametrize('ndjson, keepalive', [(False, b': keep-alive\n\n'), (True, b'\n')])
+def test_keepalive_while_the_job_is_silent(client, job, monkeypatch, ndjson, keepalive):
+    monkeypatch.setattr(server, 'STREAM_KEEPALIVE', 0.05)
+    query = {'format': 'ndjson'} if ndjson else {}
+    response = client.get(f'/jobs/{job.id}/stream', query_string=query, buffered=False)
+    chunks = iter(response.response)
+    try:
+        assert next(chunks) == keepalive
+        publish(job, 1)
+        assert b'Character 0' in next(chunks)
+
+        # La fin du job, même pendant l'attente, termine le flux
+        threading.Timer(0.01, job.events.close).start()
+        remaining = list(chunks)
+        assert all(chunk == keepalive for chunk in remaining)
+    finally:
+        response.close()
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import pytest
+from scrapy.http import Request, Response
+
+from scraper.middlewares import AdaptiveThrottleMiddleware
+
+HOST = 'benchwiki.fandom.com'
+SETTINGS = {
+    'ADAPTIVE_THROTTLE_ENABLED': True,
+    'ADAPTIVE_TARGET_LATENCY': 1.0,
+    'ADAPTIVE_MIN_CONCURRENCY': 1,
+    'ADAPTIVE_MAX_CONCURRENCY': 4,
+    'ADAPTIVE_MAX_DELAY': 300.0,
+}
+
+
+@pytest.fixture
+def throttle(spider_factory):
+    """Middleware branché sur un faux téléchargeur avec un slot pour l'hôte"""
+    crawler, spider = spider_factory(SETTINGS)
+    slot = SimpleNamespace(concurrency=2, delay=0.0)
+    crawler.engine = SimpleNamespace(downloader=SimpleNamespace(slots={HOST: slot}))
+    middleware = AdaptiveThrottleMiddleware.from_crawler(crawler)
+    return SimpleNamespace(middleware=middleware, slot=slot, spider=spider, stats=crawler.stats)
+
+
+def respond(throttle, status=200, latency=0.1, headers=None, flags=None, slot=HOST):
+    request = Request(f'http://{HOST}/wiki/Aria', meta={'download_slot': slot, 'download_latency': latency})
+    response = Response(request.url, status=status, headers=headers, flags=flags, request=request)
+    return throttle.middleware.process_response(request, response, throttle.spider)
+
+
+def test_fast_responses_add_one_request_per_full_window(throttle):
+    respond(throttle)
+    assert throttle.slot.concurrency == 2
+    respond(throttle)
+    assert throttle.slot.concurrency == 3
+    for _ in range(3 + 4 + 4):
+        respond(throttle)
+    assert throttle.slot.concurrency == 4
+    assert throttle.stats.get_value(f'adaptive/{HOST}/concurrency') == 4
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_throttle_codes_halve_concurrency_and_grow_the_delay(throttle, status):
+    throttle.slot.concurrency = 4
+    respond(throttle, status)
+    assert (throttle.slot.concurrency, throttle.slot.delay) == (2, 0.25)
+    respond(throttle, status)
+    assert (throttle.slot.concurrency, throttle.slot.delay) == (1, 0.375)
+    respond(throttle, status)
+    assert (throttle.slot.concurrency, throttle.slot.delay) == (1, 0.5625)
+    assert throttle.stats.get_value('adaptive/backoff') == 3
+    assert throttle.stats.get_value('adaptive/retry_after') is None
+
+
+def test_recovery_removes_the_delay_before_adding_concurrency(throttle):
+    throttle.slot.concurrency, throttle.slot.delay = 1, 1.0
+    respond(throttle)
+    # Débit 1/s + RATE_STEP
+    assert throttle.slot.delay == pytest.approx(1 / 1.2)
+    assert throttle.slot.concurrency == 1
+
+    delays = [throttle.slot.delay]
+    while throttle.slot.delay > 0:
+        respond(throttle)
+        delays.append(throttle.slot.delay)
+        assert throttle.slot.concurrency == 1
+    assert delays == sorted(delays, reverse=True)
+    assert delays[-2] > AdaptiveThrottleMiddleware.MIN_DELAY
+
+    respond(throttle)
+    assert throttle.slot.concurrency == 2
+
+
+def test_slow_host_loses_concurrency_and_gets_a_delay(throttle):
+    throttle.slot.concurrency = 3
+    respond(throttle, latency=5.0)
+    assert throttle.slot.concurrency == 2
+    assert throttle.slot.delay == pytest.approx(2.5)
+    assert throttle.stats.get_value(f'adaptive/{HOST}/latency') == 5.0
+
+
+def test_retry_after_in_seconds(throttle):
+    respond(throttle, 429, headers={'Retry-After': '30'})
+    assert throttle.slot.delay == 30.0
+    assert throttle.stats.get_value('adaptive/retry_after') == 1
+
+
+def test_retry_after_as_http_date(throttle):
+    when = datetime.now(timezone.utc) + timedelta(seconds=120)
+    respond(throttle, 503, headers={'Retry-After': format_datetime(when, usegmt=True)})
+    assert 115 <= throttle.slot.delay <= 120
+    assert throttle.stats.get_value('adaptive/retry_after') == 1
+
+
+@pytest.mark.parametrize('value', [
+    format_datetime(datetime(2000, 1, 1, tzinfo=timezone.utc), usegmt=True),
+    'soon',
+])
+def test_past_or_invalid_retry_after_keeps_the_default_backoff(throttle, value):
+    respond(throttle, 429, headers={'Retry-After': value})
+    assert throttle.slot.delay == 0.25
+
+
+def test_retry_after_is_capped_by_the_max_delay(throttle):
+    throttle.middleware.max_delay = 60.0
+    respond(throttle, 429, headers={'Retry-After': '3600'})
+    assert throttle.slot.delay == 60.0
+
+
+def test_network_errors_back_off(throttle):
+    throttle.slot.concurrency = 4
+    request = Request(f'http://{HOST}/wiki/Aria', meta={'download_slot': HOST})
+    assert throttle.middleware.process_exception(request, TimeoutError(), throttle.spider) is None
+    assert (throttle.slot.concurrency, throttle.slot.delay) == (2, 0.25)
+
+
+def test_cached_responses_and_unknown_slots_are_ignored(throttle):
+    respond(throttle, 429, flags=['cached'])
+    respond(throttle, 429, slot='otherwiki.fandom.com')
+    assert (throttle.slot.concurrency, throttle.slot.delay) == (2, 0.0)
+    assert throttle.stats.get_value('adaptive/backoff') is None